@@ -1,147 +1,102 @@
-from selenium import webdriver 
-from bs4 import BeautifulSoup
 import pandas as pd
-import time
-from io import StringIO
+import argparse
 import os
-
-driver = webdriver.Chrome() 
+import re
+from fetcher import add_fetch_arguments, make_fetcher
+from table_parser import read_table
+from table_join import join_stat_tables
+from results_store import RESULTS_COLUMNS, write_results, write_partition
+from player_index import PlayerIndex, fbref_keys
+from profiling import add_trace_arguments, start_tracing, section, count, count_files
+
+# fbref competitions (id in the url : name in the url)
+COMPETITIONS = {9 : "Premier-League", 12 : "La-Liga", 11 : "Serie-A", 20 : "Bundesliga", 13 : "Ligue-1"}
+CURRENT_SEASON = "2024-2025" # Read from the pages without a season in their url
+
+parser = argparse.ArgumentParser(description = "Collect the player statistics of a competition and season from fbref")
+add_fetch_arguments(parser)
+parser.add_argument("--comp", type = int, choices = sorted(COMPETITIONS), default = 9,
+                    help = "fbref competition id (9 : Premier League, 12 : La Liga, 11 : Serie A, 20 : Bundesliga, 13 : Ligue 1)")
+parser.add_argument("--season", default = CURRENT_SEASON, help = "season, e.g. 2023-2024")
+add_trace_arguments(parser)
+args = parser.parse_args()
+if not re.fullmatch(r"\d{4}-\d{4}", args.season) :
+    parser.error(f"the season must look like {CURRENT_SEASON}, not {args.season}")
+start_tracing(args) # Time and memory of every stage with --trace
+
+fetcher = make_fetcher(args) # HTTP client by default, saved pages with --pages
 
 ## Get the fbref page containing detailed player statistics
 
-# Get the links to the statistical tables
-links = { 
-    "stats_standard" : "https://fbref.com/en/comps/9/stats/Premier-League-Stats",
-    "stats_keeper" : "https://fbref.com/en/comps/9/keepers/Premier-League-Stats",
-    "stats_shooting" : "https://fbref.com/en/comps/9/shooting/Premier-League-Stats",
-    "stats_passing" : "https://fbref.com/en/comps/9/passing/Premier-League-Stats", 
-    "stats_gca" : "https://fbref.com/en/comps/9/gca/Premier-League-Stats",
-    "stats_defense" : "https://fbref.com/en/comps/9/defense/Premier-League-Stats",
-    "stats_possession" : "https://fbref.com/en/comps/9/possession/Premier-League-Stats",
-    "stats_misc" : "https://fbref.com/en/comps/9/misc/Premier-League-Stats"
+# Get the links to the statistical tables (page of each table id in the url)
+pages_of_tables = { 
+    "stats_standard" : "stats",
+    "stats_keeper" : "keepers",
+    "stats_shooting" : "shooting",
+    "stats_passing" : "passing", 
+    "stats_gca" : "gca",
+    "stats_defense" : "defense",
+    "stats_possession" : "possession",
+    "stats_misc" : "misc"
     }
+# e.g. https://fbref.com/en/comps/9/stats/Premier-League-Stats for the current season
+# and https://fbref.com/en/comps/9/2023-2024/stats/2023-2024-Premier-League-Stats for a past season
+name = COMPETITIONS[args.comp]
+if args.season == CURRENT_SEASON :
+    links = {id : f"https://fbref.com/en/comps/{args.comp}/{page}/{name}-Stats" for id, page in pages_of_tables.items()}
+else :
+    links = {id : f"https://fbref.com/en/comps/{args.comp}/{args.season}/{page}/{args.season}-{name}-Stats"
+             for id, page in pages_of_tables.items()}
 
 
-## Use BeautifulSoup to parse HTML + Pandas to extract data
+## Use the streaming table parser to extract data
 
 data = {} # Store data
 
-for id, link in links.items() : 
-    driver.get(link) # Open the web page
-    time.sleep(3)
-    
-    html = driver.page_source # Get the entire HTML source of the current page
-    soup = BeautifulSoup(html, "html.parser") 
-    
-    table = soup.find("table", {"id" : id}) # Find the table using its id
+section("fetch")
+pages = fetcher.fetch_all(links) # Download all the pages concurrently
+fetcher.close()
+
+section("parse")
+for id, html in pages.items() : 
+    # Read only the table with this id (also when fbref hides it in an HTML comment),
+    # header_row = 1 skips the unnecessary first row, the repeated header rows are skipped while parsing
+    # The fbref player id (data-append-csv of the player cell) is kept from the main table
+    attributes = {"fbref_id" : ("player", "data-append-csv")} if id == "stats_standard" else None
+    df = read_table(html, id, header_row = 1, attributes = attributes) 
     
-    if table : 
-        df = pd.read_html(StringIO(str(table)), header = 1)[0] 
-        # Convert the table to a DataFrame, get the first table, header=1 skips the unnecessary first row
-
+    if df is not None : 
         df.drop(df.columns[0], axis = 1, inplace = True) # Delete the first column
         
         data[id] = df # Store the DataFrame in the data dictionary
-
-driver.quit() # Close all web browsers
+        count(rows_out = len(df))
 
 
 ## Extract data according to requirements
 
-df_result = data["stats_standard"] # Use the stats_standard table as the main table
+columns_to_keep = RESULTS_COLUMNS # 78 main columns, declared with their types in results_store.py
+
+## Combine the tables
+
+section("join", rows_in = sum(len(df) for df in data.values()))
+
+# Use the stats_standard table as the main table and join the remaining tables on it in one pass.
+# The columns of the other tables are renamed "{id}_{column}" to avoid column name conflicts
+df_result, duplicates = join_stat_tables(data, "stats_standard", columns_to_keep + ["fbref_id"], key = ["Player", "Nation", "Squad", "Pos"])
+
+# A player listed twice with the same Player, Nation, Squad, Pos would duplicate rows, only the first row is joined
+for _, row in duplicates.iterrows() : 
+    print(f"Duplicate key skipped in {row['Table']} : {row['Player']}, {row['Nation']}, {row['Squad']}, {row['Pos']}")
 
-# Combine the remaining tables into df_result
-for id, df_tmp in data.items():
-    if id != "stats_standard":
-        # Remove the duplicate Player column like on the website
-        df_tmp = df_tmp[ df_tmp['Player'] != 'Player' ] 
-        
-         # Rename columns, avoiding column name conflicts
-        df_tmp = df_tmp.rename(columns = lambda x : x if x in ["Player", "Nation", "Squad", "Pos"] else f"{id}_{x}")
-        
-        # Merge the data into df_result
-        df_result = pd.merge(df_result, df_tmp, on = ["Player", "Nation", "Squad", "Pos"], how = "left")
-
-
-# 78 main columns
-columns_to_keep = [ 
-        ## Standard: 
-        "Player", "Nation", "Squad", "Pos", "Age",            
-        # Playing Time : matches played, starts, minutes 
-        "MP", "Starts", "Min",
-        # Performance : goals, assists, yellow cards, red cards 
-        "Gls", "Ast", "CrdY", "CrdR",
-        # Expected: expected goals (xG), expedted Assist Goals (xAG) 
-        "xG", "xAG",
-        # Progression: PrgC, PrgP, Prg 
-        "PrgC", "PrgP", "PrgR",
-        # Per 90 minutes: Gls, Ast, xG, xGA 
-        "Gls.1", "Ast.1", "xG.1", "xAG.1",
-    
-        ## Goalkeeping: 
-        # Performance: goals against per 90mins (GA90), Save%, CS% 
-        # Penalty Kicks: penalty kicks Save% 
-        "stats_keeper_GA90", "stats_keeper_Save%", "stats_keeper_CS%", 
-        "stats_keeper_Save%.1",  
-         
-        ## Shooting: 
-        # Standard: shoots on target percentage (SoT%), Shoot on Target per 90min (SoT/90),
-        # goals/shot (G/sh), average shoot distance (Dist) 
-        "stats_shooting_SoT%", "stats_shooting_SoT/90", "stats_shooting_G/Sh", "stats_shooting_Dist",
-        
-        ## Passing:
-        # Total: passes completed (Cmp),Pass completion (Cmp%), progressive
-        # passing distance (TotDist) 
-        # Short: Pass completion (Cmp%),
-        # Medium: Pass completion (Cmp%),
-        # Long: Pass completion (Cmp%),
-        # Expected: key passes (KP), pass into final third (1/3), pass into penalty
-        # area (PPA), CrsPA, PrgP
-        "stats_passing_Cmp", "stats_passing_Cmp%", "stats_passing_TotDist", 
-        "stats_passing_Cmp%.1", 
-        "stats_passing_Cmp%.2", 
-        "stats_passing_Cmp%.3", 
-        "stats_passing_KP", "stats_passing_1/3", "stats_passing_PPA", "stats_passing_CrsPA", "stats_passing_PrgP", 
-        
-        ## Goal and Shot Creation:
-        # SCA: SCA, SCA90
-        # GCA: GCA, GCA90
-        "stats_gca_SCA", "stats_gca_SCA90",
-        "stats_gca_GCA", "stats_gca_GCA90",
-        
-        ## Defensive Actions:
-        # Tackles: Tkl, TklW
-        # Challenges: Att, Lost
-        # Blocks: Blocks, Sh, Pass, Int
-        "stats_defense_Tkl", "stats_defense_TklW",
-        "stats_defense_Att", "stats_defense_Lost",
-        "stats_defense_Blocks", "stats_defense_Sh", "stats_defense_Pass", "stats_defense_Int",
-        
-        ## Possession:
-        # Touches: Touches, Def Pen, Def 3rd, Mid 3rd, Att 3rd, Att Pen
-        # Take-Ons: Att, Succ%, Tkld%
-        # Carries: Carries, ProDist, ProgC, 1/3, CPA, Mis, Dis
-        # Receiving: Rec, PrgR
-        "stats_possession_Touches", "stats_possession_Def Pen", "stats_possession_Def 3rd",
-        "stats_possession_Mid 3rd", "stats_possession_Att 3rd", "stats_possession_Att Pen",
-        "stats_possession_Att", "stats_possession_Succ%", "stats_possession_Tkld%",
-        "stats_possession_Carries", "stats_possession_PrgDist", "stats_possession_PrgC",
-        "stats_possession_1/3", "stats_possession_CPA", "stats_possession_Mis", "stats_possession_Dis",
-        "stats_possession_Rec", "stats_possession_PrgR",
-        
-        ## Miscellaneous Stats:
-        # Performance: Fls, Fld, Off, Crs, Recov
-        # Aerial Duels: Won, Lost, Won%
-        "stats_misc_Fls", "stats_misc_Fld", "stats_misc_Off", "stats_misc_Crs", "stats_misc_Recov",
-        "stats_misc_Won", "stats_misc_Lost", "stats_misc_Won%",
-                   ] 
 
 ## Filter players, rename, sort
 
-df_result = df_result[columns_to_keep] # Select the main columns
+section("clean", rows_in = len(df_result))
+
+df_result = df_result[columns_to_keep + ["fbref_id"]] # Select the main columns and the fbref player id
 
 # Fill empty cells with N/a
-df_result = df_result.fillna("N/a") 
+df_result[columns_to_keep] = df_result[columns_to_keep].fillna("N/a") 
 
 # Get the capitalized country name
 df_result["Nation"] = df_result["Nation"].str.split().str[-1] 
@@ -157,7 +112,21 @@ df_result = df_result.sort_values(by = ["Player"])
 
 # print(df_result.shape) # Size of the DataFrame (number of rows, number of columns) (494, 78)
 
+count(rows_out = len(df_result))
+
+# Canonical id of every player in the identity index, a new id is given to the players seen for the first time
+section("identity", rows_in = len(df_result))
+player_index = PlayerIndex()
+df_result["player_id"] = player_index.resolve("fbref", fbref_keys(df_result), df_result["Player"])
+player_index.close()
+
+
+## Save the data to a typed parquet file (with the ids), and to a csv file for export (78 main columns)
+section("write", rows_in = len(df_result))
+write_results(df_result, csv_path = os.path.join("SourceCode", "results.csv")) 
 
-## Save the data to a csv file
-csv_path = os.path.join("SourceCode", "results.csv")
-df_result.to_csv(csv_path, index = False) 
\ No newline at end of file
+# Keep this season and competition in the partitioned store, a previous scrape of the same partition is replaced
+partition = write_partition(df_result, args.season, args.comp)
+count_files(os.path.join("SourceCode", "results.csv"), os.path.join("SourceCode", "results.parquet"),
+            os.path.join(partition, "data.parquet"))
+print(f"{len(df_result)} players saved in {partition}")
\ No newline at end of file
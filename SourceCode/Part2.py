@@ -1,69 +1,69 @@
-import pandas as pd 
-import matplotlib.pyplot as plt
+import argparse
 import os
+from results_store import load_results, add_store_arguments, store_options
+from ranking import top_bottom_k, render_report
+from histograms import histogram_jobs, render_histograms
+from team_stats import update_team_stats, aggregate_table, best_team_per_stat
+from profiling import add_trace_arguments, start_tracing, section, count, count_files
+
+parser = argparse.ArgumentParser(description = "Statistics, rankings and histograms of the players")
+parser.add_argument("--top-format", choices = ["text", "csv", "json"], default = "text",
+                    help = "format of the 3 highest / 3 lowest report (top_3.txt, top_3.csv or top_3.json)")
+parser.add_argument("--hist-dir", default = "SourceCode", help = "directory of the histograms")
+parser.add_argument("--hist-format", default = "png", help = "image format of the histograms (png, svg, pdf ...)")
+parser.add_argument("--hist-layout", choices = ["files", "grid", "pdf"], default = "files",
+                    help = "one file per histogram, one small-multiples file per statistic or one multi-page pdf")
+parser.add_argument("--dpi", type = int, default = 300, help = "resolution of the histograms")
+parser.add_argument("--workers", type = int, default = None, help = "number of processes drawing the histograms")
+add_store_arguments(parser)
+add_trace_arguments(parser)
+args = parser.parse_args()
+start_tracing(args) # Time and memory of every stage with --trace
 
 ## Data processing
 
-df = pd.read_csv(os.path.join("SourceCode","results.csv"))
-
-# Split the Age column into Year and Day, then calculate the age in years
-df[['Year', 'Day']] = df['Age'].str.split('-', expand = True).astype(int)
-df['Age'] = (df['Year'] + df['Day'] / 365).round(2)
-df.drop(columns=['Year', 'Day'], inplace = True) 
+section("load")
+df = load_results(**store_options(args)) # Typed table : the age is in years and "N/a" values are already NaN
+count(rows_out = len(df))
 
 
 ## Find the 3 highest and 3 lowest scores for each statistic
 
-top_3_path = os.path.join("SourceCode", "top_3.txt") 
-with open(top_3_path, "w", encoding = "utf-8") as f : 
-    for col in df.columns[4:] : 
-        # Convert the column to numeric and round to 2 decimal places
-        # If conversion fails, replace with NaN
-        df[col] = pd.to_numeric(df[col], errors = "coerce").round(2) 
-        
-        f.write(f"------------ Statistics for {col} ------------ \n")
-        
-        # Find the 3 highest scores
-        f.write(f"3 highest scores :  \n")
-        f.write( df.nlargest(3, col)[["Player", "Nation", "Squad", "Pos", col]].to_string(index = False) )
-        
-        # Find the 3 lowest scores
-        f.write(f"\n3 lowest scores : \n")
-        f.write( df.nsmallest(3, col)[["Player", "Nation", "Squad", "Pos", col]].to_string(index = False) )
+section("rank", rows_in = len(df))
+
+# Round the statistics to 2 decimal places (NaN stays NaN)
+df[df.columns[4:]] = df[df.columns[4:]].round(2)
+
+# Rank all the statistics together in a single pass over the (players x statistics) matrix
+ranking = top_bottom_k(df, list(df.columns[4:]), k = 3)
 
-        f.write("\n\n")
+extension = {"text" : "txt", "csv" : "csv", "json" : "json"}[args.top_format]
+top_3_path = os.path.join("SourceCode", f"top_3.{extension}") 
+with open(top_3_path, "w", encoding = "utf-8") as f : 
+    f.write(render_report(df, ranking, args.top_format, k = 3))
+count_files(top_3_path)
         
         
 ## Find the median for each statistic. Calculate the mean and standard deviation
 # for each statistic across all players and for each team    
 
+section("team_stats", rows_in = len(df))
+
 # Select the columns to calculate statistics
 cols = df.columns[4:]
 
-# Calculate median, mean, std for each team
-team = df.groupby("Squad")[cols].agg(["median", "mean", "std"]).round(2)
-team.columns = [f"{stat.capitalize()} of {name}" for name, stat in team.columns] # Convert multi-index to simple column names 
-team.reset_index(inplace = True)
-
-# Calculate median, mean, std for all  
-median = df[cols].median().round(2)
-mean = df[cols].mean().round(2)
-std = df[cols].std().round(2)
+# Per-team sufficient statistics are kept in team_stats.pkl : only the teams whose rows changed
+# since the last run are recomputed, and the "all" row is obtained by merging the team statistics
+state, changed = update_team_stats(df, cols)
+print(f"Team statistics recomputed for {len(changed)} of {len(state['teams'])} teams")
 
-# Creare a new row for the overall statistics
-row = {"Squad" : "all"}
-for col in cols:
-    row[f"Median of {col}"] = median[col]
-    row[f"Mean of {col}"] = mean[col]
-    row[f"Std of {col}"] = std[col]
-
-df_all = pd.DataFrame([row])
-
-# Add the overall statistics to the team DataFrame
-table = pd.concat([df_all, team], ignore_index = True)
+# Median, mean, std for all (first row) and for each team
+table = aggregate_table(state)
 
 csv_path = os.path.join("SourceCode", "results2.csv") 
 table.to_csv(csv_path, index = True)
+count(rows_out = len(table))
+count_files(csv_path)
 
 
 ## Plot a histogram showing the distribution of each statistic 
@@ -75,52 +75,30 @@ attack_cols = ["Gls", "Ast", "stats_shooting_G/Sh"]
 # 3 statistics for defending : Tackles: stats_defense_Tkl, stats_defense_TklW. Blocks : stats_defense_Blocks
 defense_cols = ["stats_defense_Tkl", "stats_defense_TklW", "stats_defense_Blocks"]
 
-# Histogram for all players
-for col in attack_cols + defense_cols : 
-    plt.figure(figsize = (10, 6)) # Set figure size
-    plt.hist(df[col], color = "skyblue", bins = 20, alpha = 1, edgecolor = "black") # Create histogram
-    plt.title(f"Histogram of {col} for all players") # Set title
-    plt.xlabel(col) # Set x-axis label
-    plt.ylabel("Frequency") # Set y-axis label
-    safe_col = col.replace("/", "_") # Replace invalid characters in column names
-    histogram_path = os.path.join("SourceCode", f"histogram_all_{safe_col}.png")
-    plt.savefig(histogram_path, dpi = 300, bbox_inches = "tight")  # Save the plot
-    plt.show()
-    
-# Histogram for each teams
-for col in attack_cols + defense_cols : 
-    for team in df["Squad"].unique() : # Get unique values in the Squad column
-        plt.figure(figsize = (10, 6))
-        plt.hist(df[df["Squad"] == team][col], color = "blue", bins = 20, alpha = 0.5, edgecolor = "black")
-        plt.title(f"Histogram of {col} for team {team}")
-        plt.xlabel(col) 
-        plt.ylabel("Frequency") 
-        safe_col = col.replace("/", "_")  # Replace invalid characters in column names
-        safe_team = team.replace("/", "_")  # Replace invalid characters in team names
-        histogram_team_path = os.path.join("SourceCode", f"histogram_{safe_team}_{safe_col}.png")
-        plt.savefig(histogram_team_path, dpi = 300, bbox_inches = "tight")
-        plt.show()
+# Histograms for all players and for each team : the bin counts of every statistic are computed
+# in one grouped pass, then the plots are drawn in parallel on the Agg backend (nothing is shown)
+section("histograms", rows_in = len(df))
+jobs = histogram_jobs(df, attack_cols + defense_cols, args.hist_dir, bins = 20, fmt = args.hist_format)
+render_histograms(jobs, args.hist_dir, layout = args.hist_layout, dpi = args.dpi, fmt = args.hist_format, workers = args.workers)
 
 
 ## Identify the team with the highest scores for each statistic
 
-table.drop(index = 0, inplace = True) # Remove the first row which is the overall stats for "all"
+section("best_team")
+best = best_team_per_stat(table, cols) # Team with the highest mean of each statistic
 
 Count = {} # Count the occurrences of teams to print the best-performing team
 
-for col in df.columns[4:] : 
-    mean_name = "Mean of " + col # Column name for mean
-    # Find the team with the highest value using the index of the max value in the column
-    max_team = table.loc[table[mean_name].idxmax(), "Squad"]
-    max_value = table[mean_name].max() # Get the maximum value
+for _, row in best.iterrows() : 
+    max_team = row["Team"]
     # Count occurrences
     if max_team not in Count : 
         Count[max_team] = 1 
     else : 
         Count[max_team] += 1
-    print(f"The team with the highest {mean_name} is {max_team} with a value of {max_value}") 
+    print(f"The team with the highest Mean of {row['Statistic']} is {max_team} with a value of {row['Value']}") 
     
 Max_value = max(Count.values()) # Find the highest occurrence count
 Max_team = [team for team, count in Count.items() if count == Max_value] # Find the teams with the highest occurrence count
 
-print(f"The team with the highest scores for each statistic is {", ".join(Max_team)} with {Max_value} statistics") 
\ No newline at end of file
+print(f"The team with the highest scores for each statistic is {', '.join(Max_team)} with {Max_value} statistics") 
\ No newline at end of file
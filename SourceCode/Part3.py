@@ -1,47 +1,99 @@
-import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans 
-from sklearn.metrics import silhouette_score 
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA 
+import argparse
 import os
-
-## Data processing
-
-df = pd.read_csv(os.path.join("SourceCode","results.csv"))
-
-# Split the Age column into Year and Day, then calculate the age in years
-df[['Year', 'Day']] = df['Age'].str.split('-', expand = True).astype(int)
-df['Age'] = (df['Year'] + df['Day'] / 365).round(2)
-df.drop(columns = ['Year', 'Day'], inplace = True) 
-
-# Select numerical columns and handle missing values
-cols = df.columns[4:] 
-df.replace("N/a", np.nan, inplace = True) # Replace "N/a" with NaN
-data = df[cols].apply(pd.to_numeric, errors = 'coerce') # Convert to numeric, if conversion fails, return NaN
-
-data = data.fillna(data.mean()) # Replace NaN with the column's mean value
-
-
-## Data clustering
-
-# Standardize the data
-scaler = StandardScaler() 
-data = scaler.fit_transform(data) 
-
-inertias = [] # Within-cluster distances
-silhouette_scores = [] # Similarity scores
-
-for k in range(2, 30):
-    kmeans = KMeans(n_clusters = k, random_state = 0) # Initialize the KMeans model
-    kmeans.fit(data) # Perform data clustering
-    inertias.append(kmeans.inertia_) # Save within-cluster distances
-    silhouette_scores.append(silhouette_score(data, kmeans.labels_)) # Calculate similarity scores
+from results_store import load_results, add_store_arguments, store_options, STAT_COLUMNS
+from model_selection import sweep_k, elbow_k
+from streaming_cluster import StreamingClusterer
+from similar_players import SimilarityIndex, INDEX_DIR, PLAYER_COLUMNS
+from feature_store import FeatureStore
+from profiling import add_trace_arguments, start_tracing, section, count, count_files
+
+K_RANGE = range(2, 30) # Numbers of clusters of the sweep
+
+
+# --k : "auto" or a number of clusters of the sweep
+def k_argument(text) :
+    if text == "auto" :
+        return text
+    if not text.isdigit() or int(text) not in K_RANGE :
+        raise argparse.ArgumentTypeError(f"expected auto or a number of clusters from {K_RANGE.start} to {K_RANGE.stop - 1}")
+    return int(text)
+
+
+parser = argparse.ArgumentParser(description = "Cluster the players with KMeans")
+parser.add_argument("--k", type = k_argument, default = 8,
+                    help = f"number of clusters ({K_RANGE.start} to {K_RANGE.stop - 1}), or auto to take the elbow of the inertia curve")
+parser.add_argument("--workers", type = int, default = None, help = "number of processes of the k sweep")
+parser.add_argument("--silhouette-sample", type = int, default = None,
+                    help = "number of players used by the silhouette (all of them for small tables)")
+parser.add_argument("--streaming", action = "store_true",
+                    help = "read the features by chunks and use incremental estimators (bounded memory)")
+parser.add_argument("--chunk-size", type = int, default = 10000, help = "rows per chunk in streaming mode")
+parser.add_argument("--sample-size", type = int, default = 2000,
+                    help = "players kept for the silhouette and the scatter plot in streaming mode")
+parser.add_argument("--index-components", type = int, default = 10,
+                    help = "principal components of the similar-player index")
+parser.add_argument("--feature-store", action = "store_true",
+                    help = "cluster the per-90 rates standardized within each position (feature_store.py) instead of the raw statistics")
+add_store_arguments(parser)
+add_trace_arguments(parser)
+args = parser.parse_args()
+start_tracing(args) # Time and memory of every stage with --trace
+query = store_options(args) # Seasons, competitions and filters of the players read
+
+## Data processing and clustering
+
+cols = STAT_COLUMNS 
+
+if args.streaming : 
+    section("k_sweep")
+    # Out-of-core mode : the features are read by chunks, scaled with a partial-fit scaler and clustered
+    # with mini-batch KMeans, the silhouette and the scatter plot use a uniform sample of players
+    clusterer = StreamingClusterer(cols, K_RANGE, chunk_size = args.chunk_size, sample_size = args.sample_size,
+                                   random_state = 0, query = query).fit()
+    models, curves = clusterer.models, clusterer.curves
+    count(rows_in = clusterer.n_rows)
+else : 
+    # Read only the numerical columns, they are already typed (age in years, "N/a" values are NaN)
+    section("load")
+    stats = load_results(columns = cols, **query)
+    count(rows_out = len(stats))
+
+    section("scale", rows_in = len(stats))
+    if args.feature_store : 
+        # z-scores of the per-90 rates within each position, read from the feature store built by the features
+        # stage (feature_store.py) from the same results, a missing value is the mean of the position
+        try : 
+            store = FeatureStore.load_current(query)
+        except (FileNotFoundError, ValueError) as e : 
+            parser.error(f"--feature-store : {e}")
+        data = store.view("z").fillna(0).to_numpy()
+    else : 
+        data = stats.fillna(stats.mean()) # Replace NaN with the column's mean value
+
+        # Standardize the data
+        scaler = StandardScaler() 
+        data = scaler.fit_transform(data) 
+
+    section("k_sweep", rows_in = len(data))
+    # Fit KMeans for every k of K_RANGE in parallel, the models are kept so the chosen k is not fitted again.
+    # The silhouette uses one distance matrix shared by all k (on a sample of players for large tables)
+    models, curves = sweep_k(data, K_RANGE, workers = args.workers, random_state = 0, sample_size = args.silhouette_sample)
+
+inertias = curves["inertia"] # Within-cluster distances
+silhouette_scores = curves["silhouette"] # Similarity scores
+
+curves.to_csv(os.path.join("SourceCode", "k_sweep.csv"), index = False) # Elbow and silhouette curves
+k_elbow = elbow_k(curves["k"], inertias)
+k_silhouette = int(curves.loc[silhouette_scores.idxmax(), "k"])
+print(f"Elbow method : k = {k_elbow}, best silhouette : k = {k_silhouette}")
 
 # Elbow plot
+section("plots")
 plt.figure(figsize = (10, 6))
-plt.plot(range(2, 30), inertias, marker = 'o') 
+plt.plot(K_RANGE, inertias, marker = 'o') 
 plt.grid(True)
 plt.title("Elbow method")
 plt.xlabel("Number of clusters")
@@ -52,7 +104,7 @@ plt.show()
 
 # Silhouette plot
 plt.figure(figsize = (10, 6))
-plt.plot(range(2, 30), silhouette_scores, marker = 'o')
+plt.plot(K_RANGE, silhouette_scores, marker = 'o')
 plt.grid(True)
 plt.title("Silhouette method")
 plt.xlabel("Number of clusters")
@@ -60,9 +112,10 @@ plt.ylabel("Silhouette Score")
 silhouette_plot_path = os.path.join("SourceCode", "silhouette_plot.png")  
 plt.savefig(silhouette_plot_path, dpi = 300, bbox_inches = "tight")
 plt.show()
+count_files(os.path.join("SourceCode", "k_sweep.csv"), elbow_plot_path, silhouette_plot_path)
 
 
-k_optimal = 8 # Optimal number of clusters
+k_optimal = k_elbow if args.k == "auto" else args.k # Optimal number of clusters (8 by default)
 # Reason for choosing k_optimal = 8:
 # - Elbow plot: after k = 8, the graph starts to decrease more slowly,
 # indicating that increasing the number of clusters beyond this point does not significantly reduce inertia
@@ -70,21 +123,42 @@ k_optimal = 8 # Optimal number of clusters
 # k = 8 still has an acceptable value and allows for more detailed data segmentation
 # => k = 8 is a balance between reasonable clustering and desired level of detail
 
-kmeans = KMeans(n_clusters = k_optimal, random_state = 0) # Initialize the KMeans model
-kmeans.fit(data) # Perform data clustering
+kmeans = models[k_optimal] # Already fitted during the sweep
 
 
 ## Use PCA to reduce the dimensionality of the data to 2 dimensions
 
-pca = PCA(n_components = 2, random_state = 0) # Reduce the dimensionality of the data
-pca_data = pca.fit_transform(data) # Reduce the dimensionality of the data  
+section("pca")
+if args.streaming : 
+    pca_data = clusterer.pca.transform(clusterer.sample) # Incremental PCA, fitted on all the chunks
+    labels = kmeans.predict(clusterer.sample)
+else : 
+    pca = PCA(n_components = 2, random_state = 0) # Reduce the dimensionality of the data
+    pca_data = pca.fit_transform(data) # Reduce the dimensionality of the data  
+    labels = kmeans.labels_
 
 plt.figure(figsize = (10, 6))
-plt.scatter(pca_data[:, 0], pca_data[:, 1], c = kmeans.labels_, cmap = 'viridis')
+plt.scatter(pca_data[:, 0], pca_data[:, 1], c = labels, cmap = 'viridis')
 plt.title("KMeans Clustering")
 plt.colorbar(label="Cluster")
 plt.xlabel("Feature 1")
 plt.ylabel("Feature 2")
 kmeans_plot_path = os.path.join("SourceCode", "kmeans_clustering.png")
 plt.savefig(kmeans_plot_path, dpi = 300, bbox_inches = "tight")
-plt.show()
\ No newline at end of file
+plt.show()
+count_files(kmeans_plot_path)
+
+
+## Similar-player index : nearest neighbours on the principal components of the standardized statistics,
+# queried with similar_players.py (e.g. the 20 players most like a player, with position and minutes filters)
+
+if args.streaming : 
+    print("The similar-player index is only built from the full table (run without --streaming)")
+else : 
+    section("similar_index", rows_in = len(stats))
+    players = load_results(columns = PLAYER_COLUMNS, **query)
+    index = SimilarityIndex.fit(stats, players, n_components = args.index_components)
+    index.save()
+    count_files(*[os.path.join(INDEX_DIR, name) for name in os.listdir(INDEX_DIR)])
+    print(f"Similar-player index of {len(index)} players saved to {INDEX_DIR} "
+          f"({index.transform['explained_variance']:.0%} of the variance kept)")
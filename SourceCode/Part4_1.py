@@ -1,87 +1,125 @@
 import pandas as pd 
-from bs4 import BeautifulSoup 
-from selenium import webdriver
-import time
-from rapidfuzz import process, fuzz
+import numpy as np
+import argparse
 import os 
+from fetcher import add_fetch_arguments, make_fetcher
+from results_store import load_results, add_store_arguments, store_options
+from name_matcher import StreamingMatcher
+from player_index import PlayerIndex, fbref_keys
+from transfer_values import page_url, parse_value_page, parse_value, last_page_number
+from profiling import add_trace_arguments, start_tracing, section, span, count, count_files
+
+parser = argparse.ArgumentParser(description = "Collect the transfer values of the players with more than 900 minutes")
+add_fetch_arguments(parser)
+# The players over 900 minutes are worth more than 0.9M (2024-2025), the listing is read down to 0.5M
+parser.add_argument("--min-value", type = float, default = 0.5,
+                    help = "stop after the first page listing a value below this one (millions of euros, 0 to read every page)")
+add_store_arguments(parser)
+add_trace_arguments(parser)
+args = parser.parse_args()
+start_tracing(args) # Time and memory of every stage with --trace
 
 
 ## 4.1. Collect player transfer values for the 2024-2025 season. Only collect for the players 
 # whose playing time is greater than 900 minutes
 
-url = "https://www.footballtransfers.com/us/values/players/most-valuable-soccer-players/playing-in-uk-premier-league"
-
-driver = webdriver.Chrome()
-
-players_data = [] # Store data
-
-for i in range(1, 23): # Get data from all 22 pages
-    url_tmp = url
-    if i != 1: 
-        url_tmp += "/" + str(i) 
-    
-    driver.get(url_tmp) # Open the webpage
-    time.sleep(3) 
-    
-    html = driver.page_source # Get the entire HTML source of the current page
-    soup = BeautifulSoup(html, "html.parser") 
-    
-    table = soup.find("table", class_ = "table table-hover no-cursor table-striped leaguetable mvp-table mb-0") # Find the table using its class
-    
-    if table: 
-        
-        rows = table.find_all("tr") 
-        for row in rows: 
-            cols = row.find_all("td") 
-            
-            if cols: 
-                # Get the player's name
-                player_name = cols[2].find("a").text.strip() # Found in the <a> tag
-                
-                # Get the team name
-                team_col = cols[4].find("span", class_ = "td-team__teamname") # The <span> tag contains the team name
-                team_name = team_col.text.strip() if team_col else "Unknown" 
-                
-                # Get the player's value
-                value = cols[-1].text.strip() 
-                
-                # Add the data to the list
-                players_data.append({"Player": player_name, "Team": team_name, "Value": value}) 
-    
-    
-driver.quit() # Close all browser windows
-players_value = pd.DataFrame(players_data) # Convert the list to a DataFrame
-
-
-df = pd.read_csv(os.path.join("SourceCode","results.csv"))
-
 cols = ["Player", "Nation", "Squad", "Pos", "Age", "Min"]
-players_900mins = df[df["Min"] > 900][cols].reset_index(drop = True) # Players who played more than 900 minutes
+# Only read the columns we need, and only the players who played more than 900 minutes (filter pushed down to the reader)
+section("load")
+players_900mins = load_results(columns = cols + ["fbref_id"], **store_options(args, "Min > 900"))
+count(rows_out = len(players_900mins))
+
+# Canonical ids of both sides in the identity index (player_index.py) : the players matched on a previous run
+# are joined on their id, only the players and the candidates never linked go through fuzzy matching
+section("identity", rows_in = len(players_900mins))
+player_index = PlayerIndex()
+player_ids = player_index.resolve("fbref", fbref_keys(players_900mins), players_900mins["Player"])
+positions = pd.Series(np.arange(len(player_ids))).groupby(player_ids).indices # A player can have one row per team
+rows = np.full(len(player_ids), -1, dtype = np.int64) # Row of the matched player in players_value
+
+# The new players are matched while the pages arrive : names normalized once (accents, token order),
+# candidates blocked by team, every block of a page scored with one vectorized call
+matcher = StreamingMatcher(players_900mins["Player"], players_900mins["Squad"])
+
+
+## Crawl the listing (sorted by value) : the pages are downloaded concurrently under the rate limit,
+# the last page is read from the pagination links (or is the first empty / missing page), and the crawl
+# stops early when every player is found or when the values fall below --min-value
+
+section("crawl") # The time spent waiting for the pages is the crawl time not spent in parse and match
+fetcher = make_fetcher(args) # Pages are served from the page cache when they are still fresh
+
+pages = [] # One DataFrame per page
+seen = set() # Slugs already listed, a player listed twice keeps his first value
+n_rows = 0
+for number, html in fetcher.iter_pages(page_url, last_page = last_page_number) :
+    with span("parse") : 
+        page = pd.DataFrame(parse_value_page(html), columns = ["Player", "Slug", "Team", "Value"])
+        count(rows_out = len(page))
+    if page.empty : # Past the last page
+        break
+    page.index += n_rows
+    n_rows += len(page)
+    pages.append(page)
+
+    with span("match", rows_in = len(page)) : 
+        first = page[~page["Slug"].isin(seen) & ~page["Slug"].duplicated()]
+        seen.update(first["Slug"])
+        ids = player_index.lookup("footballtransfers", first["Slug"])
+        for pid, row in zip(ids[ids >= 0], first.index[ids >= 0]) : # Exact join on the canonical id
+            rows[positions.get(pid, [])] = row
+        matcher.drop(np.flatnonzero(rows >= 0))
+        new = first[ids < 0] # Candidates not linked to a player yet
+        matcher.add(new["Player"], new["Team"], keys = new.index, threshold = 80)
+
+    if matcher.settled().all() :
+        print(f"Every player is found after page {number}")
+        break
+    values = [v for v in map(parse_value, page["Value"]) if v is not None]
+    if values and min(values) < args.min_value :
+        print(f"Values below {args.min_value}M after page {number}")
+        break
+fetcher.close()
+
+players_value = pd.concat(pages) if pages else pd.DataFrame(columns = ["Player", "Slug", "Team", "Value"])
+print(f"{len(pages)} pages, {len(players_value)} players listed")
+
+section("resolve", rows_in = len(rows))
+scores = np.full(len(rows), np.nan)
+joined = rows >= 0
+scores[joined] = player_index.match_scores("footballtransfers", players_value["Slug"].to_numpy()[rows[joined]]).round(1)
+
+# The result gives the row of the matched player in players_value (-1 if no similarity is above 80%)
+# and the similarity score (0-100). A candidate is one player : the rows joined on their id are not candidates,
+# and a candidate claimed by two players goes to the best score, the other one gets his next best candidate
+match = matcher.assign(threshold = 80, owners = player_ids, exclude = rows[joined])
+found = match["index"].to_numpy() >= 0
+matched = np.flatnonzero(found)
+match_rows = match["index"].to_numpy()[found]
+match_scores = match["score"].to_numpy()[found]
+rows[matched] = match_rows
+scores[matched] = match_scores.round(1)
+
+# Keep the decisions : the matched slugs are linked to the player, the next run joins them directly
+player_index.link("footballtransfers", players_value["Slug"].to_numpy()[match_rows], player_ids[matched],
+                  players_value["Player"].to_numpy()[match_rows], match_scores)
+player_index.close()
+print(f"{joined.sum()} players joined on their id, {len(rows) - joined.sum()} fuzzy matched ({len(matched)} found)")
 
-# Create a new column "Value" in players_900mins to store the player's value
+# Create the columns "Value", "Matched_Player" and "Match_Score" in players_900mins
+section("write")
+players_900mins = players_900mins[cols]
+found = rows >= 0
 players_900mins["Value"] = None
+players_900mins.loc[found, "Value"] = players_value["Value"].to_numpy()[rows[found]]
+players_900mins.loc[found, "Matched_Player"] = players_value["Player"].to_numpy()[rows[found]] # Kept for auditing
+players_900mins.loc[found, "Match_Score"] = scores[found]
 
-for index, row in players_900mins.iterrows(): # Iterate through each row in players_900mins
-    
-    # Get the player's name
-    player_name = row["Player"]  
-    
-    # Find the closest matching player in players_value
-    match = process.extractOne(player_name, players_value["Player"], scorer = fuzz.token_sort_ratio) # Fuzzy match player names
-    
-    if match and match[1] > 80:  # Similarity threshold > 80%, match[1]: Similarity score (0-100)
-        
-        matched_player = match[0]  # Matched player name
-        
-        value = players_value.loc[players_value["Player"] == matched_player, "Value"].values[0] # Get the value from players_value
-        # After filtering rows, only take the "Value" column, convert it to a 1D array, and get the first element
-        
-        players_900mins.at[index, "Value"] = value  # Assign the value to the "Value" column
-
-
-players_900mins.dropna(inplace = True) # Remove rows with null values in the "Value" column
+players_900mins.dropna(subset = ["Value"], inplace = True) # Remove rows with null values in the "Value" column
 
 players_900mins.reset_index(drop = True, inplace = True) # Reset the index
 
 csv_path = os.path.join("SourceCode", "players_900mins_value.csv")
-players_900mins.to_csv(csv_path, index = False)
\ No newline at end of file
+players_900mins.to_csv(csv_path, index = False)
+count(rows_out = len(players_900mins))
+count_files(csv_path)
\ No newline at end of file
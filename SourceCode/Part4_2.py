@@ -1,4 +1,3 @@
-import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -7,75 +6,69 @@ from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import os
+from results_store import load_results, add_store_arguments, store_options
+from valuation_model import save_model, MODEL_PATH
+from feature_selection import select_features, METHODS
+from model_search import search_models, load_grid, LEADERBOARD_PATH
+from transfer_values import parse_value
+import argparse
+from profiling import add_trace_arguments, start_tracing, section, count, count_files
+
+parser = argparse.ArgumentParser(description = "Estimate the transfer values of the players")
+parser.add_argument("--selection", choices = METHODS, default = "corr",
+                    help = "feature selection : correlation filter, mutual information or L1 (Lasso) path")
+parser.add_argument("--search", action = "store_true", help = "also compare the models of a grid with k-fold cross-validation")
+parser.add_argument("--grid", help = "JSON file {model : {parameter : [values]}} replacing the default grid of model_search.py")
+parser.add_argument("--folds", type = int, default = 5, help = "number of cross-validation folds")
+parser.add_argument("--workers", type = int, help = "number of processes of the model search (default: all cores)")
+add_store_arguments(parser)
+add_trace_arguments(parser)
+args = parser.parse_args()
+start_tracing(args) # Time and memory of every stage with --trace
 
 ## 4.2. Propose a method for estimating player values. How do you select features and model?
 
-data1 = pd.read_csv(os.path.join("SourceCode","results.csv"))
+section("load")
+# Typed table : the age is in years and "N/a" values are already NaN
+data1 = load_results(**store_options(args, "Min > 900")) # Select players with > 900 minutes while reading
 data2 = pd.read_csv(os.path.join("SourceCode","players_900mins_value.csv"))
 
+section("merge", rows_in = len(data1) + len(data2))
 df = pd.merge(data1, data2[["Player", "Value"]], on = "Player", how = "left") # Merge two tables
+count(rows_out = len(df))
 
-df = df[df["Min"] > 900] # Select players with > 900 minutes
+# Convert Value to millions of euros ("€12.5M", "€800K")
+df["Value"] = df["Value"].map(parse_value, na_action = "ignore").astype(float)
 
-# Split the Age column into Year and Day, then calculate the age in years
-df[['Year', 'Day']] = df['Age'].str.split('-', expand = True).astype(int)
-df['Age'] = (df['Year'] + df['Day'] / 365).round(2)
-df.drop(columns = ['Year', 'Day'], inplace = True) 
-
-# Remove characters in Value and convert to float
-df["Value"] = df["Value"].str.replace("€", "").str.replace("M", "").astype(float)
-
-df.replace("N/a", np.nan, inplace = True) # Replace "N/a" with NaN
 df.reset_index(drop = True, inplace = True)
 
 # Remove unnecessary columns
 df = df.drop(["Player", "Nation", "Squad", "Pos", "stats_keeper_GA90",
             "stats_keeper_Save%", "stats_keeper_CS%", "stats_keeper_Save%.1"], axis = 1)
 
-# Convert all columns to numeric, replace missing values with the mean
-df = df.apply(pd.to_numeric, errors = 'coerce') 
-df = df.fillna(df.mean())
-
-# Calculate the full correlation matrix
-corr_matrix = df.corr().abs()
-
-# Get correlation with Value
-value_corr = corr_matrix["Value"]
-
-# Select columns with correlation > 0.3
-selected_features = value_corr[value_corr > 0.3].index.tolist()
+# Replace missing values with the mean, all the columns are already numeric
+means = df.mean() # Kept in the model artifact to fill the missing statistics of new players
+df = df.fillna(means)
 
-# Recalculate the correlation matrix for these columns
-corr_selected = df[selected_features].corr().abs()
-
-# Extract the upper triangle of the matrix
-upper = corr_selected.where(np.triu(np.ones(corr_selected.shape), k = 1).astype(bool))
-
-# Find columns with multicollinearity > 0.9
-to_drop = []
-for column in upper.columns:
-    high_corr = upper[column][upper[column] > 0.9]
-    for idx in high_corr.index:
-        # Keep the column with higher correlation with Value
-        if value_corr[column] > value_corr[idx]:
-            to_drop.append(idx)
-        else:
-            to_drop.append(column)
-
-# Remove duplicate columns
-to_drop = list(set(to_drop))
+# Select the features : correlation with Value above 0.3, then greedy removal of the features
+# with a correlation above 0.9 with a more relevant feature (see feature_selection.py)
+section("select_features", rows_in = len(df))
+features = select_features(df.drop(columns = "Value"), df["Value"], method = args.selection)
 
 # Final list of features to keep
-final_features = [col for col in selected_features if col not in to_drop]
+final_features = features + ["Value"]
 
 # Plot the heatmap of correlations between variables after multicollinearity treatment
+section("heatmap")
 plt.figure(figsize = (12, 10))
 sns.heatmap(df[final_features].corr(), annot = True, fmt = ".2f", cmap = "coolwarm")  
 plt.title("Correlation heatmap between variables after multicollinearity treatment")
 heatmap_path = os.path.join("SourceCode", "heatmap_of_correlations.png")
 plt.savefig(heatmap_path, dpi = 300, bbox_inches = "tight")
 plt.show()
+count_files(heatmap_path)
 
+section("fit", rows_in = len(df))
 feature_data = df[final_features].drop(columns = "Value")
 
 # Standardize the data
@@ -106,7 +99,21 @@ print(f"Mean Absolute Error (MAE): {mae}")
 print(f"Mean Squared Error (MSE): {mse}") 
 print(f"R² Score: {r2}") 
 
+# Save the fitted scaler and regression, ValuationModel.load (valuation_model.py) prices new players without retraining
+section("save")
+save_model(feature_data.columns, means, sc, dt_model, metrics = {"mae" : mae, "mse" : mse, "r2" : r2})
+count_files(csv_path, MODEL_PATH)
+print(f"Model saved to {MODEL_PATH}")
+
+# Compare other models (ridge, lasso, gradient boosting ...) with k-fold cross-validation on all the players,
+# the folds already computed for the same data and candidate are read from the cache
+if args.search :
+    section("search", rows_in = len(feature_data))
+    leaderboard = search_models(feature_data, Y, grid = load_grid(args.grid), folds = args.folds, workers = args.workers)
+    print(leaderboard.head(10).to_string(index = False))
+    print(f"Leaderboard saved to {LEADERBOARD_PATH}")
+
 # Output:
-# Mean Absolute Error (MAE): 11.904445815556226
-# Mean Squared Error (MSE): 227.40318403347462
-# R² Score: 0.6553717047107084
\ No newline at end of file
+# Mean Absolute Error (MAE): 11.673913667446431
+# Mean Squared Error (MSE): 225.66739258596536
+# R² Score: 0.6580022872598287
\ No newline at end of file
@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import json
+import time
+import resource
+import tempfile
+import subprocess
+
+## Benchmark : Part2 histograms, previous pyplot loop against the batch renderer
+# Each variant runs in its own process, the wall time and the peak RSS (including the workers) are reported
+# Run : python SourceCode/bench_histograms.py [--dpi 300] [--workers 4]
+
+attack_cols = ["Gls", "Ast", "stats_shooting_G/Sh"]
+defense_cols = ["stats_defense_Tkl", "stats_defense_TklW", "stats_defense_Blocks"]
+
+
+# The previous loop of Part2 : a new pyplot figure per histogram, never closed
+def run_pyplot(df, out_dir, dpi) :
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    for col in attack_cols + defense_cols :
+        plt.figure(figsize = (10, 6))
+        plt.hist(df[col], color = "skyblue", bins = 20, alpha = 1, edgecolor = "black")
+        plt.title(f"Histogram of {col} for all players")
+        plt.xlabel(col)
+        plt.ylabel("Frequency")
+        plt.savefig(os.path.join(out_dir, f"histogram_all_{col.replace('/', '_')}.png"), dpi = dpi, bbox_inches = "tight")
+        plt.show()
+    for col in attack_cols + defense_cols :
+        for team in df["Squad"].unique() :
+            plt.figure(figsize = (10, 6))
+            plt.hist(df[df["Squad"] == team][col], color = "blue", bins = 20, alpha = 0.5, edgecolor = "black")
+            plt.title(f"Histogram of {col} for team {team}")
+            plt.xlabel(col)
+            plt.ylabel("Frequency")
+            plt.savefig(os.path.join(out_dir, f"histogram_{team.replace('/', '_')}_{col.replace('/', '_')}.png"),
+                        dpi = dpi, bbox_inches = "tight")
+            plt.show()
+
+
+def run_variant(args) :
+    from results_store import load_results
+    from histograms import histogram_jobs, render_histograms
+
+    df = load_results(columns = ["Squad"] + attack_cols + defense_cols)
+    start = time.perf_counter()
+    if args.variant == "pyplot" :
+        run_pyplot(df, args.out, args.dpi)
+    else :
+        jobs = histogram_jobs(df, attack_cols + defense_cols, args.out)
+        render_histograms(jobs, args.out, layout = args.variant, dpi = args.dpi, workers = args.workers)
+    wall = time.perf_counter() - start
+
+    scale = 1024 if sys.platform != "darwin" else 1024 ** 2 # ru_maxrss is in KB on Linux, in bytes on macOS
+    peak_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    peak_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    print(json.dumps({"variant" : args.variant, "wall_s" : round(wall, 2), "peak_rss_mb" : round(peak_self, 1),
+                      "peak_worker_rss_mb" : round(peak_children, 1), "files" : len(os.listdir(args.out))}))
+
+
+parser = argparse.ArgumentParser(description = "Compare the histogram renderers")
+parser.add_argument("--dpi", type = int, default = 300)
+parser.add_argument("--workers", type = int, default = None)
+parser.add_argument("--variant", choices = ["pyplot", "files", "grid", "pdf"], help = argparse.SUPPRESS)
+parser.add_argument("--out", help = argparse.SUPPRESS)
+args = parser.parse_args()
+
+if args.variant :
+    run_variant(args)
+else :
+    print(f"{'variant':8} {'wall (s)':>9} {'peak RSS (MB)':>14} {'peak worker RSS (MB)':>21} {'files':>6}")
+    for variant in ["pyplot", "files", "grid", "pdf"] :
+        with tempfile.TemporaryDirectory() as out_dir :
+            command = [sys.executable, __file__, "--variant", variant, "--out", out_dir, "--dpi", str(args.dpi)]
+            if args.workers :
+                command += ["--workers", str(args.workers)]
+            result = json.loads(subprocess.run(command, capture_output = True, text = True, check = True).stdout.strip().splitlines()[-1])
+            print(f"{variant:8} {result['wall_s']:>9} {result['peak_rss_mb']:>14} {result['peak_worker_rss_mb']:>21} {result['files']:>6}")
@@ -0,0 +1,68 @@
+import argparse
+import os
+import time
+from io import StringIO
+import pandas as pd
+from bs4 import BeautifulSoup, Comment
+from fetcher import page_filename
+from table_parser import read_table
+
+## Benchmark : streaming table parser against BeautifulSoup + pd.read_html on saved fbref pages
+# Save the pages once with : python SourceCode/Part1.py --save-pages <dir>
+# Then run : python SourceCode/bench_parse.py --pages <dir>
+
+links = {
+    "stats_standard" : "https://fbref.com/en/comps/9/stats/Premier-League-Stats",
+    "stats_keeper" : "https://fbref.com/en/comps/9/keepers/Premier-League-Stats",
+    "stats_shooting" : "https://fbref.com/en/comps/9/shooting/Premier-League-Stats",
+    "stats_passing" : "https://fbref.com/en/comps/9/passing/Premier-League-Stats",
+    "stats_gca" : "https://fbref.com/en/comps/9/gca/Premier-League-Stats",
+    "stats_defense" : "https://fbref.com/en/comps/9/defense/Premier-League-Stats",
+    "stats_possession" : "https://fbref.com/en/comps/9/possession/Premier-League-Stats",
+    "stats_misc" : "https://fbref.com/en/comps/9/misc/Premier-League-Stats"
+    }
+
+
+# The previous path of Part1 : parse the whole page, serialize the table and parse it again
+def read_table_bs4(html, table_id) :
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table", {"id" : table_id})
+    if table is None :
+        for comment in soup.find_all(string = lambda text : isinstance(text, Comment)) :
+            if f'id="{table_id}"' in comment :
+                table = BeautifulSoup(comment, "html.parser").find("table", {"id" : table_id})
+                break
+    df = pd.read_html(StringIO(str(table)), header = 1)[0]
+    return df[df["Player"] != "Player"]
+
+
+def best_time(function, repeat) :
+    times = []
+    for _ in range(repeat) :
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+parser = argparse.ArgumentParser(description = "Compare the table parsers on saved fbref pages")
+parser.add_argument("--pages", required = True, help = "directory of saved fbref pages")
+parser.add_argument("--repeat", type = int, default = 5, help = "number of runs, the best time is kept")
+args = parser.parse_args()
+
+rows = []
+for id, link in links.items() :
+    with open(os.path.join(args.pages, page_filename(link)), encoding = "utf-8") as f :
+        html = f.read()
+
+    old_time, old_df = best_time(lambda : read_table_bs4(html, id), args.repeat)
+    new_time, new_df = best_time(lambda : read_table(html, id), args.repeat)
+
+    rows.append({"Table" : id, "Size (KB)" : len(html) // 1024, "Rows" : len(new_df),
+                 "Same shape" : old_df.shape == new_df.shape,
+                 "bs4 + read_html (ms)" : round(old_time * 1000, 1), "streaming (ms)" : round(new_time * 1000, 1),
+                 "Speedup" : round(old_time / new_time, 1)})
+
+result = pd.DataFrame(rows)
+print(result.to_string(index = False))
+print(f"Total : {result['bs4 + read_html (ms)'].sum():.1f} ms -> {result['streaming (ms)'].sum():.1f} ms")
@@ -0,0 +1,145 @@
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+import pandas as pd
+from pipeline import STAGES, SOURCE_DIR
+from synthetic import TEAMS, write_dataset
+from results_store import write_results
+
+## Scale benchmark of the stages on synthetic data (synthetic.py), without the network
+# For every size (number of players), a sandbox directory with its own SourceCode/ is filled with the synthetic
+# fbref pages, value pages and tables, and every selected stage runs in it as a separate process, in the order
+# of the pipeline : part1 parses the saved fbref pages, part4_1 the saved value pages. A stage that is not selected
+# gets the synthetic table it would have written (results.csv, players_900mins_value.csv), so any stage can be
+# timed alone.
+# For every run, one row is appended to the results file : the wall time, the CPU time (with the process pools)
+# and the peak RSS of the process and of its children, read with wait4, and the exit status. The stage-level
+# trace of the script (profiling.py) adds one row per section, e.g. part1:parse.
+# The rows carry the commit, the host and the Python version, so the file can collect the runs of several
+# commits and be compared with e.g. pandas : df.pivot_table("wall_s", ["size", "stage"], "commit")
+# Run : python SourceCode/bench_scale.py --sizes 500 5000 50000 [--stages part1 part3] [--output bench_scale.csv]
+
+RESULTS_PATH = os.path.join(SOURCE_DIR, "bench_scale.csv")
+FIELDS = ["date", "commit", "host", "python", "size", "teams", "stage", "wall_s", "cpu_s", "peak_rss_mb", "status"]
+
+# Arguments of the stages in the sandbox, {data} is the directory of the synthetic data
+STAGE_ARGS = {"part1" : ["--pages", "{data}/pages", "--no-cache"],
+              "part4_1" : ["--pages", "{data}/values", "--no-cache"]}
+# Synthetic table used in place of the output of a stage that is not run
+STAGE_TABLES = {"part1" : "results.csv", "part4_1" : "players_900mins_value.csv"}
+
+
+def current_commit() :
+    try :
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd = SOURCE_DIR, capture_output = True,
+                                text = True, check = True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd = SOURCE_DIR,
+                               capture_output = True, text = True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError) :
+        return "unknown"
+
+
+# Run a script and wait for it, return (exit code, wall, CPU of the process and its children, peak RSS in MB)
+def run_measured(command, cwd, log_path) :
+    env = dict(os.environ, MPLBACKEND = "Agg") # The plots are saved, never shown
+    start = time.perf_counter()
+    with open(log_path, "w", encoding = "utf-8") as log :
+        process = subprocess.Popen(command, cwd = cwd, env = env, stdout = log, stderr = subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0) # The usage of the process and of the children it waited for
+    wall = time.perf_counter() - start
+    peak = usage.ru_maxrss / 1024 ** 2 if sys.platform == "darwin" else usage.ru_maxrss / 1024 # Bytes on macOS, kB on Linux
+    return os.waitstatus_to_exitcode(status), wall, usage.ru_utime + usage.ru_stime, peak
+
+
+# Rows of the sections of the stage-level trace, a section run several times (e.g. once per page) is summed
+def trace_rows(path) :
+    if not os.path.exists(path) :
+        return []
+    with open(path, encoding = "utf-8") as f :
+        records = json.load(f)["stages"]
+    sections = {}
+    for r in records :
+        total = sections.setdefault(r["stage"], {"wall_s" : 0.0, "cpu_s" : 0.0, "peak_rss_mb" : 0.0})
+        total["wall_s"] += r["wall_s"]
+        total["cpu_s"] += r["cpu_s"] + r["children_cpu_s"]
+        total["peak_rss_mb"] = max(total["peak_rss_mb"], r["peak_rss_mb"])
+    return [dict(total, section = name) for name, total in sections.items()]
+
+
+def bench_size(size, stages, teams, seed, keep) :
+    sandbox = tempfile.mkdtemp(prefix = f"bench_{size}_")
+    data = os.path.join(sandbox, "data")
+    work = os.path.join(sandbox, "SourceCode") # The scripts use paths like SourceCode/results.csv
+    os.makedirs(work)
+    rows = []
+    try :
+        start = time.perf_counter()
+        write_dataset(size, data, seed, teams)
+        print(f"{size} players : synthetic data written in {time.perf_counter() - start:.1f} s ({sandbox})")
+        for name, table in STAGE_TABLES.items() :
+            if name not in stages :
+                shutil.copy(os.path.join(data, table), os.path.join(work, table))
+        if "part1" not in stages : # The other stages read the typed copy of the results
+            results = pd.read_csv(os.path.join(work, "results.csv"), dtype = str, keep_default_na = False)
+            write_results(results, os.path.join(work, "results.parquet"))
+
+        for stage in [s for s in STAGES if s.name in stages] :
+            trace = os.path.join(sandbox, f"{stage.name}.json")
+            command = [sys.executable, os.path.join(SOURCE_DIR, stage.script)]
+            command += [arg.format(data = data) for arg in STAGE_ARGS.get(stage.name, [])] + ["--trace", trace]
+            code, wall, cpu, peak = run_measured(command, sandbox, os.path.join(sandbox, f"{stage.name}.log"))
+            status = "ok" if code == 0 else f"exit {code}"
+            print(f"{size:>8} {stage.name:10} {wall:9.2f} s {cpu:9.2f} s cpu {peak:9.1f} MB  {status}")
+            rows.append({"stage" : stage.name, "wall_s" : wall, "cpu_s" : cpu, "peak_rss_mb" : peak, "status" : status})
+            for r in trace_rows(trace) :
+                rows.append({"stage" : f"{stage.name}:{r['section']}", "wall_s" : r["wall_s"], "cpu_s" : r["cpu_s"],
+                             "peak_rss_mb" : r["peak_rss_mb"], "status" : status})
+            if code != 0 :
+                print(f"         see {os.path.join(sandbox, stage.name + '.log')}")
+                keep = True
+    finally :
+        if keep :
+            print(f"Sandbox kept : {sandbox}")
+        else :
+            shutil.rmtree(sandbox, ignore_errors = True)
+    return rows
+
+
+def append_rows(rows, path) :
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline = "", encoding = "utf-8") as f :
+        writer = csv.DictWriter(f, fieldnames = FIELDS)
+        if new_file :
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__" :
+    names = [stage.name for stage in STAGES]
+    parser = argparse.ArgumentParser(description = "Time the stages on synthetic data of several sizes")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [500, 5000, 50000], help = "numbers of players")
+    parser.add_argument("--stages", nargs = "+", choices = names, default = names, help = "stages to run (all by default)")
+    parser.add_argument("--teams", type = int, help = "number of teams (by default about 25 players per team, at least 20)")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--output", default = RESULTS_PATH, help = "CSV file the results are appended to")
+    parser.add_argument("--keep", action = "store_true", help = "keep the sandbox directories")
+    args = parser.parse_args()
+
+    info = {"date" : time.strftime("%Y-%m-%dT%H:%M:%S"), "commit" : current_commit(), "host" : socket.gethostname(),
+            "python" : platform.python_version()}
+    for size in args.sizes :
+        n_teams = args.teams or max(len(TEAMS), size // 25)
+        teams = (list(TEAMS) + [f"Team {i}" for i in range(len(TEAMS) + 1, n_teams + 1)])[: n_teams]
+        rows = bench_size(size, args.stages, teams, args.seed, args.keep)
+        append_rows([dict(info, size = size, teams = n_teams, **{k : round(v, 3) if isinstance(v, float) else v
+                                                                 for k, v in row.items()}) for row in rows], args.output)
+    print(f"Results appended to {args.output}")
@@ -0,0 +1,68 @@
+import argparse
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from similar_players import SimilarityIndex
+from sklearn.decomposition import PCA # Imported before the timings, the index imports it when it is built
+
+## Benchmark : latency of the similar-player index at several sizes
+# The players are synthetic (74 statistics driven by a few latent factors, like the real table) and the index
+# keeps 10 principal components. For every size : build time, single query (median and 95th percentile),
+# filtered query, batch of 100 queries, insertion of 1000 players, save and memory-mapped load.
+# Run : python SourceCode/bench_similar.py [--sizes 500 50000 500000]
+
+
+def synthetic_players(n, n_stats = 74, rng = None) :
+    rng = rng or np.random.default_rng(0)
+    factors = rng.normal(size = (n, 8))
+    stats = factors @ rng.normal(size = (8, n_stats)) + rng.normal(scale = 0.5, size = (n, n_stats))
+    stats = pd.DataFrame(stats, columns = [f"stat_{i}" for i in range(n_stats)])
+    players = pd.DataFrame({"Player" : [f"player {i}" for i in range(n)],
+                            "Pos" : rng.choice(["GK", "DF", "MF", "FW", "DF,MF", "MF,FW"], n),
+                            "Min" : rng.integers(90, 3400, n).astype(float), "player_id" : np.arange(n)})
+    return stats, players
+
+
+def timed(function, repeat = 1) :
+    times = []
+    for _ in range(repeat) :
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1000 # Milliseconds
+
+
+parser = argparse.ArgumentParser(description = "Latency of the similar-player index")
+parser.add_argument("--sizes", type = int, nargs = "+", default = [500, 50000, 500000])
+parser.add_argument("--k", type = int, default = 20)
+parser.add_argument("--queries", type = int, default = 50, help = "number of single queries timed")
+args = parser.parse_args()
+
+rng = np.random.default_rng(0)
+print(f"{'players':>8} {'build (ms)':>11} {'query p50':>10} {'query p95':>10} {'filtered p50':>13} "
+      f"{'batch 100 (ms)':>15} {'insert 1000 (ms)':>17} {'save (ms)':>10} {'load (ms)':>10}")
+for n in args.sizes :
+    stats, players = synthetic_players(n, rng = rng)
+    index = None
+
+    def build() :
+        global index
+        index = SimilarityIndex.fit(stats, players, n_components = 10)
+
+    build_ms = timed(build)[0]
+    rows = rng.choice(n, args.queries)
+    single = np.concatenate([timed(lambda r = r : index.search(index.vectors[[r]], args.k, exclude = np.array([r])))
+                             for r in rows])
+    mask = index.mask(["MF", "FW"], 900)
+    filtered = np.concatenate([timed(lambda r = r : index.search(index.vectors[[r]], args.k, mask = mask)) for r in rows])
+    batch = rng.choice(n, 100)
+    batch_ms = timed(lambda : index.search(index.vectors[batch], args.k, exclude = batch))[0]
+    new_stats, new_players = synthetic_players(1000, rng = rng)
+    new_players["player_id"] += n
+    insert_ms = timed(lambda : index.insert(new_stats, new_players))[0]
+    with tempfile.TemporaryDirectory() as path :
+        save_ms = timed(lambda : index.save(path))[0]
+        load_ms = timed(lambda : SimilarityIndex.load(path))[0]
+    print(f"{n:>8} {build_ms:>11.1f} {np.median(single):>10.2f} {np.percentile(single, 95):>10.2f} "
+          f"{np.median(filtered):>13.2f} {batch_ms:>15.1f} {insert_ms:>17.1f} {save_ms:>10.1f} {load_ms:>10.1f}")
@@ -0,0 +1,114 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+## Feature selection of Part4_2
+# 1. Relevance of every feature to the target, with one of the methods:
+#    - "corr" : absolute Pearson correlation, the features above threshold are kept
+#    - "mutual_info" : mutual information, the k best features are kept
+#    - "l1" : Lasso with a cross-validated penalty, the features with a non-zero coefficient are kept
+# 2. Collinear features ("corr" and "mutual_info") : the correlations between the kept features are computed
+#    with one matrix product, the pairs above the collinearity threshold are sorted (strongest first)
+#    and walked greedily : when both features of a pair are still kept, the less relevant one is dropped.
+#    The result does not depend on the order of the loops, a dropped feature no longer drops others.
+# The columns are centered and scaled once, the same unit columns give both correlations (and the Lasso input).
+# The selected features are cached with a hash of the data and of the parameters.
+
+CACHE_PATH = os.path.join("SourceCode", "feature_selection_cache.json")
+CACHE_ENTRIES = 50 # The oldest selections are forgotten beyond this number
+
+METHODS = ("corr", "mutual_info", "l1")
+
+
+# Columns centered and scaled to unit norm : the correlation of two columns is their dot product
+def _unit_columns(X) :
+    Z = X - X.mean(axis = 0)
+    norm = np.sqrt((Z ** 2).sum(axis = 0))
+    return Z / np.where(norm > 0, norm, np.inf) # A constant column is correlated with nothing
+
+
+# Absolute correlation of every column with y, Z : unit columns (_unit_columns)
+def target_correlation(Z, y) :
+    return np.abs(Z.T @ _unit_columns(y[:, None]))[:, 0]
+
+
+# Greedy removal of collinear columns, relevance decides which column of a pair is dropped
+# Z : unit columns (_unit_columns), return the boolean mask of the columns kept
+def prune_collinear(Z, relevance, threshold = 0.9) :
+    corr = np.abs(Z.T @ Z)
+    i, j = np.triu_indices(len(relevance), k = 1)
+    pairs = corr[i, j] > threshold
+    i, j, c = i[pairs], j[pairs], corr[i, j][pairs]
+    order = np.lexsort((j, i, -c)) # Strongest pairs first, then column order
+
+    keep = np.ones(len(relevance), dtype = bool)
+    for a, b in zip(i[order], j[order]) : # Only the collinear pairs are visited (a < b)
+        if keep[a] and keep[b] :
+            # Equal relevance (duplicated columns) keeps the first column
+            keep[a if relevance[b] > relevance[a] and not np.isclose(relevance[a], relevance[b]) else b] = False
+    return keep
+
+
+def _relevance(X, Z, y, method, threshold, k, random_state) :
+    if method == "corr" :
+        relevance = target_correlation(Z, y)
+        return relevance, relevance > threshold
+    if method == "mutual_info" :
+        from sklearn.feature_selection import mutual_info_regression
+        relevance = mutual_info_regression(X, y, random_state = random_state)
+        chosen = np.zeros(len(relevance), dtype = bool)
+        chosen[np.argsort(-relevance, kind = "stable")[: k or 20]] = True
+        return relevance, chosen & (relevance > 0)
+    if method == "l1" :
+        from sklearn.linear_model import LassoCV
+        standardized = Z * np.sqrt(len(Z)) # Unit norm x sqrt(n) : unit variance
+        relevance = np.abs(LassoCV(cv = 5, max_iter = 10000, random_state = random_state).fit(standardized, y).coef_)
+        chosen = relevance > 0
+        if k is not None :
+            chosen &= relevance >= np.sort(relevance)[::-1][min(k, len(relevance)) - 1]
+        return relevance, chosen
+    raise ValueError(f"Unknown feature selection method {method}, expected one of {METHODS}")
+
+
+def _cache_key(X, y, params) :
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(X, index = False).to_numpy().tobytes())
+    h.update(pd.util.hash_pandas_object(y, index = False).to_numpy().tobytes())
+    h.update(json.dumps([list(X.columns), params]).encode())
+    return h.hexdigest()
+
+
+# Select the features of X (DataFrame without missing values) to predict y
+# Return the names of the selected features, in the order of the columns of X
+def select_features(X, y, method = "corr", threshold = 0.3, k = None, collinearity = 0.9, random_state = 0,
+                    cache_path = CACHE_PATH) :
+    if k is not None and k < 1 :
+        raise ValueError(f"k must be at least 1, got {k}")
+    params = {"method" : method, "threshold" : threshold, "k" : k, "collinearity" : collinearity,
+              "random_state" : random_state}
+    cache = {}
+    key = _cache_key(X, y, params) if cache_path else None
+    if cache_path and os.path.exists(cache_path) :
+        with open(cache_path, encoding = "utf-8") as f :
+            cache = json.load(f)
+        if key in cache :
+            return cache[key]
+
+    values = X.to_numpy(dtype = float)
+    Z = _unit_columns(values) # Once for the relevance and the collinearity
+    relevance, chosen = _relevance(values, Z, y.to_numpy(dtype = float), method, threshold, k, random_state)
+    columns = np.flatnonzero(chosen)
+    if method != "l1" and len(columns) > 1 : # The L1 penalty already removes collinear features
+        columns = columns[prune_collinear(Z[:, columns], relevance[columns], collinearity)]
+    features = [X.columns[i] for i in columns]
+
+    if cache_path :
+        cache[key] = features
+        cache = dict(list(cache.items())[-CACHE_ENTRIES:])
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding = "utf-8") as f :
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    return features
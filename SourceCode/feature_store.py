@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from profiling import add_trace_arguments, start_tracing, section, count
+from results_store import load_results, add_store_arguments, store_options, KEY_COLUMNS, STAT_COLUMNS, COUNT_COLUMNS, ID_COLUMNS
+
+## Feature store : the normalized statistics of the players, computed once for the analysis scripts
+# - per-90 rates : every counting statistic divided by the minutes played (x 90), the other statistics
+#   (percentages, averages, fbref per-90 columns, age, minutes) are kept as they are
+# - the position of a player is the first position fbref lists ("DF,MF" -> DF)
+# - for every feature, in one grouped pass over the table : the percentile rank of the player among the
+#   players of his position (share of them at or below his value) and his z-score within his position
+# - a missing statistic stays missing (NaN) in the three forms, a z-score of 0 is the mean of the position
+# The store is a directory : features.parquet (one row per player, in the order of the results table),
+# sorted.npz (the sorted values of every feature for every position) and meta.json, which stamps the
+# format version and a hash of the results it was built from : a store built from other results is rebuilt.
+# The percentile of a new player is a binary search (np.searchsorted) in the sorted values, O(log n).
+# Only the features stage of the pipeline (this script) writes the store, the scripts that use it read it with
+# load_current, which fails when the store was built from other results instead of writing it again.
+
+STORE_PATH = os.path.join("SourceCode", "feature_store")
+FORMAT_VERSION = 1
+
+RATE_SOURCES = [col for col in COUNT_COLUMNS if col not in ("MP", "Starts")] # Counted over the minutes played
+FEATURES = [col for col in STAT_COLUMNS if col not in RATE_SOURCES] + [f"{col}/90" for col in RATE_SOURCES]
+POSITIONS = ["GK", "DF", "MF", "FW"]
+UNKNOWN = "unknown" # Position missing in the results
+ALL = "all" # Sorted values of every player, used for a new player whose position has no stored player
+
+
+def primary_position(pos) :
+    return pos.astype("string").str.split(",").str[0].str.strip().where(lambda p : p.isin(POSITIONS), UNKNOWN)
+
+
+# Features of the players : the statistics with the counts converted to per-90 rates
+def per90(stats) :
+    minutes = stats["Min"].to_numpy(dtype = float)
+    counts = stats[RATE_SOURCES].to_numpy(dtype = float)
+    with np.errstate(divide = "ignore", invalid = "ignore") :
+        rates = np.where(minutes[:, None] > 0, counts / minutes[:, None] * 90, np.nan)
+    features = pd.DataFrame(rates, columns = [f"{col}/90" for col in RATE_SOURCES], index = stats.index)
+    kept = [col for col in FEATURES if col in stats.columns]
+    return pd.concat([stats[kept].astype(float), features], axis = 1)[FEATURES]
+
+
+def source_hash(results) :
+    h = hashlib.sha1(str(FORMAT_VERSION).encode())
+    h.update(pd.util.hash_pandas_object(results, index = False).to_numpy().tobytes())
+    h.update(json.dumps(list(results.columns)).encode())
+    return h.hexdigest()
+
+
+class FeatureStore :
+
+    def __init__(self, table, sorted_values, counts, meta) :
+        self.table = table
+        self.sorted_values = sorted_values # position -> (features, players) sorted along each row, NaN at the end
+        self.counts = counts # position -> number of values of every feature (the NaN are not counted)
+        self.meta = meta
+        self.features = meta["features"]
+        self._column = {feature : i for i, feature in enumerate(self.features)}
+
+    # Compute the features, percentiles and z-scores of the results table (KEY_COLUMNS, STAT_COLUMNS)
+    @classmethod
+    def build(cls, results, source = None) :
+        X = per90(results)
+        position = primary_position(results["Pos"])
+        groups = X.groupby(position.to_numpy())
+        percentiles = groups.rank(method = "max", pct = True).add_suffix("_pct")
+        mean = groups.transform("mean")
+        std = groups.transform("std", ddof = 0)
+        zscores = ((X - mean) / std.where(std > 0, np.inf)).add_suffix("_z") # A constant feature has z = 0
+
+        ids = [col for col in ID_COLUMNS if col in results.columns]
+        table = pd.concat([results[KEY_COLUMNS + ids].reset_index(drop = True), position.rename("position").reset_index(drop = True),
+                           X.reset_index(drop = True), percentiles.reset_index(drop = True), zscores.reset_index(drop = True)],
+                          axis = 1)
+
+        values = X.to_numpy()
+        sorted_values, counts = {}, {}
+        for name, rows in list(groups.indices.items()) + [(ALL, np.arange(len(values)))] :
+            block = np.sort(values[rows].T, axis = 1) # One contiguous row per feature
+            sorted_values[name] = block
+            counts[name] = (~np.isnan(block)).sum(axis = 1)
+        meta = {"format_version" : FORMAT_VERSION, "created" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "source" : source or source_hash(results), "rows" : len(table), "features" : list(X.columns),
+                "positions" : sorted(sorted_values)}
+        return cls(table, sorted_values, counts, meta)
+
+    # Read the store, or build it again when it is missing or was built from other results
+    # query : the seasons, competitions and filters of load_results (results_store.py)
+    @classmethod
+    def ensure(cls, query = None, path = STORE_PATH) :
+        results = load_results(KEY_COLUMNS + STAT_COLUMNS + ID_COLUMNS, **(query or {}))
+        source = source_hash(results)
+        try :
+            store = cls.load(path)
+            if store.meta["source"] == source :
+                return store
+        except (FileNotFoundError, ValueError, KeyError) :
+            pass
+        store = cls.build(results, source)
+        store.save(path)
+        return store
+
+    # Read the store and check it was built from the results selected by query, it is never built here
+    @classmethod
+    def load_current(cls, query = None, path = STORE_PATH) :
+        store = cls.load(path)
+        results = load_results(KEY_COLUMNS + STAT_COLUMNS + ID_COLUMNS, **(query or {}))
+        if store.meta["source"] != source_hash(results) :
+            raise ValueError(f"The feature store in {path} was built from other results, "
+                             "run SourceCode/feature_store.py with the same --season, --comp and --where options")
+        return store
+
+    def save(self, path = STORE_PATH) :
+        os.makedirs(path, exist_ok = True)
+        if os.path.exists(os.path.join(path, "meta.json")) : # The old stamp is removed before its files are replaced
+            os.remove(os.path.join(path, "meta.json"))
+        self.table.to_parquet(os.path.join(path, "features.parquet"), index = False)
+        arrays = {f"values_{name}" : block for name, block in self.sorted_values.items()}
+        arrays.update({f"counts_{name}" : count for name, count in self.counts.items()})
+        np.savez(os.path.join(path, "sorted.npz"), **arrays)
+        tmp_path = os.path.join(path, "meta.json.tmp")
+        with open(tmp_path, "w", encoding = "utf-8") as f :
+            json.dump(self.meta, f, indent = 1)
+        os.replace(tmp_path, os.path.join(path, "meta.json")) # Written last : the stamp is only valid once the files are
+
+    @classmethod
+    def load(cls, path = STORE_PATH) :
+        with open(os.path.join(path, "meta.json"), encoding = "utf-8") as f :
+            meta = json.load(f)
+        if meta.get("format_version") != FORMAT_VERSION :
+            raise ValueError(f"Unsupported feature store format {meta.get('format_version')}")
+        with np.load(os.path.join(path, "sorted.npz")) as arrays :
+            sorted_values = {name : arrays[f"values_{name}"] for name in meta["positions"]}
+            counts = {name : arrays[f"counts_{name}"] for name in meta["positions"]}
+        return cls(pd.read_parquet(os.path.join(path, "features.parquet")), sorted_values, counts, meta)
+
+    # Feature columns of the table in one form : "value" (per-90 rates), "pct" (percentiles) or "z" (z-scores)
+    def view(self, form = "value") :
+        columns = self.features if form == "value" else [f"{feature}_{form}" for feature in self.features]
+        return self.table[columns]
+
+    # Percentile of a value among the players of a position, NaN for a missing value
+    def percentile(self, position, feature, value) :
+        position = position if position in self.sorted_values else ALL
+        i = self._column[feature]
+        n = self.counts[position][i]
+        if n == 0 or value is None or np.isnan(value) :
+            return np.nan
+        return np.searchsorted(self.sorted_values[position][i, : n], value, side = "right") / n
+
+    # Percentiles of new players (statistics like the results table) among the stored players of their position
+    def percentiles(self, results) :
+        X = per90(results)
+        position = primary_position(results["Pos"]).to_numpy()
+        out = np.full(X.shape, np.nan)
+        values = X.to_numpy()
+        for name in np.unique(position) :
+            rows = np.flatnonzero(position == name)
+            key = name if name in self.sorted_values else ALL
+            for i in range(len(self.features)) : # One vectorized binary search per feature
+                n = self.counts[key][i]
+                if n :
+                    out[rows, i] = np.searchsorted(self.sorted_values[key][i, : n], values[rows, i], side = "right") / n
+        out[np.isnan(values)] = np.nan
+        return pd.DataFrame(out, columns = self.features, index = results.index)
+
+
+## Command line : build the store, and show the percentiles of players
+# python SourceCode/feature_store.py [--show "Bukayo Saka"] [--season ... --comp ... --where ...]
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description = "Build the per-90, percentile and z-score features of the players")
+    parser.add_argument("--show", nargs = "+", default = [], metavar = "PLAYER", help = "print the percentiles of these players")
+    add_store_arguments(parser)
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    start_tracing(args)
+
+    section("build")
+    start = time.perf_counter()
+    store = FeatureStore.ensure(store_options(args))
+    count(rows_out = store.meta["rows"])
+    print(f"Feature store of {store.meta['rows']} players and {len(store.features)} features "
+          f"(built {store.meta['created']}, ready in {time.perf_counter() - start:.2f} s)")
+    for name in args.show :
+        rows = store.table[store.table["Player"].str.lower() == name.lower()]
+        if rows.empty :
+            print(f"Unknown player : {name}")
+        for i, row in rows.iterrows() :
+            print(f"\n{row['Player']} ({row['Squad']}, {row['position']}) : percentile among the {row['position']} players")
+            print(store.view("pct").loc[i].round(2).to_string())
@@ -0,0 +1,268 @@
+import os
+import time
+import random
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from page_cache import PageCache
+from profiling import count
+
+## Fetch layer shared by the scraping scripts
+# A Fetcher downloads pages through a pluggable transport:
+# - HttpTransport : pooled HTTP client (default)
+# - SeleniumTransport : real browser, only used as a fallback
+# - LocalTransport : directory of saved HTML pages, to run the pipeline offline
+# Downloaded pages go through an optional PageCache (see page_cache.py)
+
+Response = namedtuple("Response", ["status", "text", "headers"])
+
+RETRY_STATUS = {429, 500, 502, 503, 504} # Status codes worth retrying
+FINAL_STATUS = {404, 410} # The page does not exist, the fallback would not find it either
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+
+class FetchError(Exception) :
+
+    def __init__(self, message, status = None) :
+        super().__init__(message)
+        self.status = status # HTTP status of the last response, None for a network error
+
+
+# Get the file name of a saved page from its url
+# e.g. https://fbref.com/en/comps/9/stats/Premier-League-Stats -> fbref.com_en_comps_9_stats_Premier-League-Stats.html
+def page_filename(url) :
+    parsed = urlparse(url)
+    name = (parsed.netloc + parsed.path).strip("/").replace("/", "_")
+    if parsed.query :
+        name += "_" + parsed.query.replace("&", "_").replace("=", "-")
+    return name + ".html"
+
+
+class HttpTransport :
+    remote = True
+
+    def __init__(self, pool_size = 8, timeout = 30) :
+        import requests # Imported here so offline runs do not need it
+        from requests.adapters import HTTPAdapter
+
+        self.timeout = timeout
+        self.session = requests.Session() # Keep the connections alive between pages
+        adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent" : USER_AGENT})
+
+    def get(self, url, headers = None) :
+        r = self.session.get(url, headers = headers, timeout = self.timeout)
+        return Response(r.status_code, r.text, dict(r.headers))
+
+    def close(self) :
+        self.session.close()
+
+
+class SeleniumTransport :
+    remote = True
+
+    def __init__(self, wait = 3) :
+        self.wait = wait # Seconds to let the page run its JavaScript
+        self.driver = None # The browser is only opened on the first request
+        self.lock = threading.Lock() # One browser can only load one page at a time
+
+    def get(self, url, headers = None) :
+        with self.lock :
+            if self.driver is None :
+                from selenium import webdriver
+                self.driver = webdriver.Chrome()
+            self.driver.get(url) # Open the web page
+            time.sleep(self.wait)
+            return Response(200, self.driver.page_source, {})
+
+    def close(self) :
+        if self.driver is not None :
+            self.driver.quit() # Close all web browsers
+            self.driver = None
+
+
+class LocalTransport :
+    remote = False
+
+    def __init__(self, directory) :
+        self.directory = directory
+
+    def get(self, url, headers = None) :
+        path = os.path.join(self.directory, page_filename(url))
+        if not os.path.exists(path) :
+            return Response(404, "", {})
+        with open(path, encoding = "utf-8") as f :
+            return Response(200, f.read(), {})
+
+    def close(self) :
+        pass
+
+
+# Keep a minimum interval between two requests to the same host
+class RateLimiter :
+
+    def __init__(self, min_interval = 1.0) :
+        self.min_interval = min_interval
+        self.next_time = {} # host -> earliest time of the next request
+        self.lock = threading.Lock()
+
+    def wait(self, url) :
+        host = urlparse(url).netloc
+        with self.lock :
+            now = time.monotonic()
+            start = max(now, self.next_time.get(host, 0))
+            self.next_time[host] = start + self.min_interval # Book the slot before sleeping
+        if start > now :
+            time.sleep(start - now)
+
+
+class Fetcher :
+
+    def __init__(self, transport = None, fallback = None, max_workers = 4, min_interval = 1.0,
+                 retries = 3, backoff = 1.0, save_dir = None, cache = None) :
+        self.transport = transport if transport is not None else HttpTransport(pool_size = max_workers)
+        self.fallback = fallback # Transport used when the main one keeps failing
+        self.max_workers = max_workers # Bounded concurrency
+        self.limiter = RateLimiter(min_interval)
+        self.retries = retries
+        self.backoff = backoff
+        self.save_dir = save_dir # Save every downloaded page here to replay it later
+        self.cache = cache
+
+    def _get(self, transport, url, headers = None) :
+        error = None
+        for attempt in range(self.retries + 1) :
+            if transport.remote :
+                self.limiter.wait(url)
+            try :
+                response = transport.get(url, headers = headers)
+            except Exception as e : # Network error, try again
+                response, error = None, e
+
+            if response is not None :
+                if response.status in (200, 304) :
+                    return response
+                error = FetchError(f"{url} returned status {response.status}", response.status)
+                if response.status not in RETRY_STATUS : # 403, 404 ... will not get better
+                    break
+
+            if attempt < self.retries :
+                delay = self.backoff * 2 ** attempt + random.uniform(0, self.backoff) # Exponential backoff with jitter
+                if response is not None and str(response.headers.get("Retry-After", "")).isdigit() :
+                    delay = max(delay, int(response.headers["Retry-After"]))
+                time.sleep(delay)
+        raise error
+
+    # Get the HTML of one page
+    def fetch(self, url) :
+        entry = None
+        if self.cache is not None :
+            entry = self.cache.lookup(url)
+            if entry is not None and (self.cache.offline or self.cache.is_fresh(entry)) :
+                count(pages_cached = 1)
+                return self.cache.hit(url)
+            if self.cache.offline :
+                raise FetchError(f"{url} is not in the page cache (offline mode)")
+
+        headers = self.cache.conditional_headers(entry) if self.cache is not None else None
+        try :
+            response = self._get(self.transport, url, headers)
+        except Exception as e :
+            # A missing page is the answer of the site, the other errors (a 403 of an anti-bot layer, network errors,
+            # exhausted retries) go to the fallback
+            if self.fallback is None or (isinstance(e, FetchError) and e.status in FINAL_STATUS) :
+                raise
+            response = self._get(self.fallback, url)
+
+        if response.status == 304 : # Not modified since the cached copy
+            count(pages_revalidated = 1)
+            return self.cache.revalidated(url, response.headers)
+        html = response.text
+        count(pages_fetched = 1, bytes_fetched = len(html.encode("utf-8")))
+        if self.cache is not None :
+            self.cache.store(url, html, response.headers)
+
+        if self.save_dir :
+            os.makedirs(self.save_dir, exist_ok = True)
+            with open(os.path.join(self.save_dir, page_filename(url)), "w", encoding = "utf-8") as f :
+                f.write(html)
+        return html
+
+    # Get the HTML of several pages concurrently, links is a dict {name : url}
+    def fetch_all(self, links) :
+        with ThreadPoolExecutor(max_workers = self.max_workers) as pool :
+            pages = pool.map(self.fetch, links.values())
+            return dict(zip(links.keys(), pages))
+
+    # Get the numbered pages of a listing in order, page_url(n) gives the url of page n (from 1)
+    # The next pages are downloaded max_workers at a time while the caller reads the current one,
+    # the caller can stop at any page (the pages in flight are dropped).
+    # last_page(html) can read the number of the last page from the first page, otherwise the listing
+    # ends at the first missing page (404)
+    def iter_pages(self, page_url, last_page = None) :
+        pool = ThreadPoolExecutor(max_workers = self.max_workers)
+        pending = {}
+        last = None
+        number = next_page = 1
+        try :
+            while last is None or number <= last :
+                while len(pending) < self.max_workers and (last is None or next_page <= last) :
+                    pending[next_page] = pool.submit(self.fetch, page_url(next_page))
+                    next_page += 1
+                try :
+                    html = pending.pop(number).result()
+                except FetchError as e :
+                    if last is None and e.status == 404 and number > 1 : # No page after the last one
+                        return
+                    raise
+                if number == 1 and last_page is not None :
+                    last = last_page(html)
+                yield number, html
+                number += 1
+        finally :
+            for future in pending.values() :
+                future.cancel()
+            pool.shutdown(wait = True) # The pages being downloaded finish before the cache is saved
+
+    def close(self) :
+        self.transport.close()
+        if self.fallback is not None :
+            self.fallback.close()
+        if self.cache is not None :
+            self.cache.save()
+            print(self.cache.report())
+
+
+## Command line options shared by the scraping scripts
+
+def add_fetch_arguments(parser) :
+    parser.add_argument("--pages", help = "directory of saved HTML pages, read instead of the network")
+    parser.add_argument("--transport", choices = ["http", "selenium"], default = "http",
+                        help = "how to download the pages (Selenium is always the fallback of http)")
+    parser.add_argument("--save-pages", help = "directory where the downloaded pages are saved")
+    parser.add_argument("--workers", type = int, default = 4, help = "number of pages downloaded at the same time")
+    parser.add_argument("--min-interval", type = float, default = 1.0, help = "seconds between two requests to the same host")
+    parser.add_argument("--cache-dir", default = os.path.join("SourceCode", "page_cache"), help = "directory of the page cache")
+    parser.add_argument("--cache-ttl", type = float, default = 12, help = "hours a cached page is used without revalidation")
+    parser.add_argument("--cache-size", type = float, default = 200, help = "maximum size of the page cache in MB")
+    parser.add_argument("--no-cache", action = "store_true", help = "always download the pages")
+    parser.add_argument("--offline", action = "store_true", help = "only use pages from the cache")
+
+
+def make_fetcher(args) :
+    if args.pages :
+        return Fetcher(LocalTransport(args.pages), max_workers = args.workers, retries = 0)
+
+    cache = None
+    if not args.no_cache :
+        cache = PageCache(args.cache_dir, ttl = args.cache_ttl * 3600, max_bytes = args.cache_size * 1024 ** 2,
+                          offline = args.offline)
+    if args.transport == "selenium" :
+        return Fetcher(SeleniumTransport(), max_workers = 1, min_interval = args.min_interval, save_dir = args.save_pages,
+                       cache = cache)
+    return Fetcher(HttpTransport(pool_size = args.workers), fallback = SeleniumTransport(), max_workers = args.workers,
+                   min_interval = args.min_interval, save_dir = args.save_pages, cache = cache)
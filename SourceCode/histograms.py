@@ -0,0 +1,140 @@
+import os
+import numpy as np
+from workers import process_pool, default_workers, split_chunks
+
+## Batch rendering of the Part2 histograms
+# - The bin counts of a statistic are computed for the league and for every team with one
+#   grouped NumPy pass (same bins as plt.hist : 20 equal bins between the min and max of each group)
+# - The figures are drawn on the Agg backend, each worker reuses one figure for all its plots
+# - The plots are split across a process pool, or written to one multi-page PDF / one grid per statistic
+
+
+# Histogram of values for every group, groups are integer codes 0 .. n_groups - 1
+# Return edges (n_groups x bins + 1) and counts (n_groups x bins)
+def grouped_histograms(values, groups, n_groups, bins = 20) :
+    values = np.asarray(values, dtype = float)
+    valid = ~np.isnan(values)
+    v, g = values[valid], groups[valid]
+
+    lo = np.full(n_groups, np.inf)
+    hi = np.full(n_groups, -np.inf)
+    np.minimum.at(lo, g, v)
+    np.maximum.at(hi, g, v)
+    empty = ~np.isfinite(lo)
+    lo[empty], hi[empty] = 0.0, 1.0 # Same default range as np.histogram
+    same = lo == hi
+    lo[same] -= 0.5 # Same as np.histogram when all the values are equal
+    hi[same] += 0.5
+
+    edges = lo[:, None] + np.arange(bins + 1)[None, :] * ((hi - lo) / bins)[:, None] # Same steps as np.linspace
+    edges[:, -1] = hi
+    idx = ((v - lo[g]) * bins / (hi - lo)[g]).astype(np.int64)
+    idx = np.clip(idx, 0, bins - 1) # The max value belongs to the last bin
+    idx -= (v < edges[g, idx]) & (idx > 0) # Rounding corrections, as in np.histogram
+    idx += (v >= edges[g, idx + 1]) & (idx < bins - 1)
+
+    counts = np.bincount(g * bins + idx, minlength = n_groups * bins).reshape(n_groups, bins)
+    return edges, counts
+
+
+def safe_name(name) :
+    return str(name).replace("/", "_") # Replace invalid characters in file names
+
+
+# Build the plot jobs of the league and team histograms of the given statistics
+def histogram_jobs(df, stats, out_dir, bins = 20, fmt = "png", team_col = "Squad") :
+    teams = list(df[team_col].unique()) # Same team order as the data
+    codes = df[team_col].map({team : i for i, team in enumerate(teams)}).to_numpy()
+    n = len(df)
+    groups = np.concatenate([np.zeros(n, dtype = np.int64), codes + 1]) # Group 0 is the whole league
+
+    jobs = []
+    for col in stats :
+        values = df[col].to_numpy(dtype = float)
+        edges, counts = grouped_histograms(np.concatenate([values, values]), groups, len(teams) + 1, bins)
+        jobs.append({"stat" : col, "title" : f"Histogram of {col} for all players", "xlabel" : col,
+                     "edges" : edges[0], "counts" : counts[0], "color" : "skyblue", "alpha" : 1,
+                     "path" : os.path.join(out_dir, f"histogram_all_{safe_name(col)}.{fmt}")})
+        for i, team in enumerate(teams, start = 1) :
+            jobs.append({"stat" : col, "title" : f"Histogram of {col} for team {team}", "xlabel" : col,
+                         "edges" : edges[i], "counts" : counts[i], "color" : "blue", "alpha" : 0.5,
+                         "path" : os.path.join(out_dir, f"histogram_{safe_name(team)}_{safe_name(col)}.{fmt}")})
+    return jobs
+
+
+def _draw(ax, job, small = False) :
+    ax.clear()
+    # The counts are already computed : one weighted value per bin draws the same bars as plt.hist
+    ax.hist(job["edges"][:-1], bins = job["edges"], weights = job["counts"], color = job["color"],
+            alpha = job["alpha"], edgecolor = "black")
+    ax.set_title(job["title"], fontsize = 8 if small else None)
+    if not small :
+        ax.set_xlabel(job["xlabel"])
+        ax.set_ylabel("Frequency")
+
+
+def _new_figure(figsize) :
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize = figsize) # Not registered in pyplot, so nothing is kept after the plot
+    FigureCanvasAgg(fig)
+    return fig
+
+
+# Worker : draw a list of jobs, one file per job, on a single reused figure
+def _render_files(jobs, dpi) :
+    fig = _new_figure((10, 6))
+    ax = fig.add_subplot()
+    for job in jobs :
+        _draw(ax, job)
+        fig.savefig(job["path"], dpi = dpi, bbox_inches = "tight")
+    return len(jobs)
+
+
+# Worker : draw all the histograms of one statistic as small multiples in one file
+def _render_grid(jobs, path, dpi, ncols = 6) :
+    nrows = -(-len(jobs) // ncols)
+    fig = _new_figure((3.2 * ncols, 2.4 * nrows))
+    axes = fig.subplots(nrows, ncols, squeeze = False).ravel()
+    for ax, job in zip(axes, jobs) :
+        _draw(ax, job, small = True)
+    for ax in axes[len(jobs):] :
+        ax.set_visible(False)
+    fig.suptitle(f"Histograms of {jobs[0]['stat']}")
+    fig.tight_layout()
+    fig.savefig(path, dpi = dpi)
+    return 1
+
+
+# Draw the jobs
+# layout : "files" one file per histogram, "grid" one small-multiples file per statistic,
+#          "pdf" every histogram as a page of histograms.pdf
+def render_histograms(jobs, out_dir, layout = "files", dpi = 300, fmt = "png", workers = None) :
+    os.makedirs(out_dir, exist_ok = True)
+    workers = workers or default_workers()
+
+    if layout == "pdf" :
+        from matplotlib.backends.backend_pdf import PdfPages
+        fig = _new_figure((10, 6))
+        ax = fig.add_subplot()
+        with PdfPages(os.path.join(out_dir, "histograms.pdf")) as pdf :
+            for job in jobs :
+                _draw(ax, job)
+                pdf.savefig(fig, bbox_inches = "tight")
+        return 1
+
+    if layout == "grid" :
+        by_stat = {}
+        for job in jobs :
+            by_stat.setdefault(job["stat"], []).append(job)
+        tasks = [(stat_jobs, os.path.join(out_dir, f"histograms_{safe_name(stat)}.{fmt}"), dpi) for stat, stat_jobs in by_stat.items()]
+        if workers == 1 :
+            return sum(_render_grid(*task) for task in tasks)
+        with process_pool(min(workers, len(tasks))) as pool :
+            return sum(pool.map(_render_grid, *zip(*tasks)))
+
+    if workers == 1 :
+        return _render_files(jobs, dpi)
+    with process_pool(workers) as pool :
+        chunks = split_chunks(jobs, workers)
+        return sum(pool.map(_render_files, chunks, [dpi] * len(chunks)))
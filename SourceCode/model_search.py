@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold, ParameterGrid
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from workers import process_pool, default_workers
+
+## Cross-validated model search for the valuation model of Part4_2
+# - The grid gives, for every kind of model, the values of its parameters (DEFAULT_GRID, or a JSON file
+#   with the same form), every combination is a candidate scaled by a StandardScaler fitted on each fold
+# - Every (candidate, fold) pair is one task of the process pool, the data is saved once as .npy files
+#   named after the hash of its content, and the workers memory-map them instead of receiving a pickled copy
+# - The scores of every (candidate, fold) are cached with a hash of the data and of the candidate,
+#   so a rerun with a new candidate only fits that candidate
+# - The leaderboard gives the mean and standard deviation of the scores and the fit time of every candidate
+
+SEARCH_DIR = os.path.join("SourceCode", "model_search")
+CACHE_PATH = os.path.join(SEARCH_DIR, "folds.json")
+LEADERBOARD_PATH = os.path.join("SourceCode", "model_leaderboard.csv")
+
+DEFAULT_GRID = {
+    "linear" : {},
+    "ridge" : {"alpha" : [0.1, 1.0, 10.0, 100.0]},
+    "lasso" : {"alpha" : [0.01, 0.1, 1.0], "max_iter" : [10000]},
+    "elastic_net" : {"alpha" : [0.1, 1.0], "l1_ratio" : [0.2, 0.5, 0.8], "max_iter" : [10000]},
+    "gradient_boosting" : {"n_estimators" : [200], "max_depth" : [2, 3], "learning_rate" : [0.05, 0.1], "random_state" : [0]},
+    "random_forest" : {"n_estimators" : [300], "min_samples_leaf" : [1, 5], "random_state" : [0]},
+    }
+
+
+def make_model(kind, params) :
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn import linear_model, ensemble
+    models = {
+        "linear" : linear_model.LinearRegression,
+        "ridge" : linear_model.Ridge,
+        "lasso" : linear_model.Lasso,
+        "elastic_net" : linear_model.ElasticNet,
+        "gradient_boosting" : ensemble.GradientBoostingRegressor,
+        "random_forest" : ensemble.RandomForestRegressor,
+        }
+    if kind not in models :
+        raise ValueError(f"Unknown model {kind}, expected one of {sorted(models)}")
+    return make_pipeline(StandardScaler(), models[kind](**params))
+
+
+# Candidates of a grid {kind : {parameter : [values]}} as (name, kind, params)
+def expand_grid(grid) :
+    candidates = []
+    for kind, space in grid.items() :
+        for params in ParameterGrid({name : values if isinstance(values, list) else [values] for name, values in space.items()}) :
+            label = ",".join(f"{name}={value}" for name, value in sorted(params.items()) if name not in ("random_state", "max_iter"))
+            candidates.append((f"{kind}({label})", kind, params))
+    return candidates
+
+
+def load_grid(path = None) :
+    if path is None :
+        return DEFAULT_GRID
+    with open(path, encoding = "utf-8") as f :
+        return json.load(f)
+
+
+def _fold_key(data_hash, kind, params, fold, folds, random_state) :
+    spec = json.dumps([data_hash, kind, params, fold, folds, random_state], sort_keys = True)
+    return hashlib.sha1(spec.encode()).hexdigest()
+
+
+# Save an array for the workers, unless the file is already there with the right shape
+# The file is written under a temporary name then moved : an interrupted or concurrent run never leaves a partial file
+def _save_array(path, array) :
+    try :
+        if np.load(path, mmap_mode = "r").shape == array.shape :
+            return
+    except (OSError, ValueError) : # Missing, or truncated by a run before the files were written this way
+        pass
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f :
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+# One task : fit a candidate on the training rows of one fold and score it on the other rows
+def _run_fold(paths, kind, params, train, test) :
+    from threadpoolctl import threadpool_limits
+    X = np.load(paths[0], mmap_mode = "r") # Shared with the other workers through the page cache
+    y = np.load(paths[1], mmap_mode = "r")
+    with threadpool_limits(limits = 1) : # The parallelism is across the tasks
+        model = make_model(kind, params)
+        start = time.perf_counter()
+        model.fit(X[train], y[train])
+        fit_time = time.perf_counter() - start
+        start = time.perf_counter()
+        pred = model.predict(X[test])
+        predict_time = time.perf_counter() - start
+    return {"mae" : mean_absolute_error(y[test], pred), "rmse" : float(np.sqrt(mean_squared_error(y[test], pred))),
+            "r2" : r2_score(y[test], pred), "fit_time" : fit_time, "predict_time" : predict_time}
+
+
+# Cross-validate every candidate of the grid on (X, y), return the leaderboard sorted by mean MAE
+def search_models(X, y, grid = None, folds = 5, workers = None, random_state = 0,
+                  search_dir = SEARCH_DIR, leaderboard_path = LEADERBOARD_PATH) :
+    X = np.ascontiguousarray(X, dtype = float)
+    y = np.ascontiguousarray(y, dtype = float)
+    candidates = expand_grid(grid or DEFAULT_GRID)
+    data_hash = hashlib.sha1(X.tobytes() + y.tobytes() + str((X.shape, y.shape)).encode()).hexdigest()
+
+    os.makedirs(search_dir, exist_ok = True)
+    paths = (os.path.join(search_dir, f"{data_hash}_X.npy"), os.path.join(search_dir, f"{data_hash}_y.npy"))
+    _save_array(paths[0], X)
+    _save_array(paths[1], y)
+
+    cache_path = os.path.join(search_dir, os.path.basename(CACHE_PATH))
+    cache = {}
+    if os.path.exists(cache_path) :
+        with open(cache_path, encoding = "utf-8") as f :
+            cache = json.load(f)
+
+    splits = list(KFold(n_splits = folds, shuffle = True, random_state = random_state).split(X))
+    tasks = []
+    for name, kind, params in candidates :
+        for fold, (train, test) in enumerate(splits) :
+            key = _fold_key(data_hash, kind, params, fold, folds, random_state)
+            if key not in cache :
+                tasks.append((key, kind, params, train, test))
+
+    if tasks :
+        workers = min(workers or default_workers(), len(tasks))
+        with process_pool(workers) as pool :
+            futures = [pool.submit(_run_fold, paths, kind, params, train, test) for _, kind, params, train, test in tasks]
+            for (key, *_), future in zip(tasks, futures) :
+                cache[key] = future.result()
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding = "utf-8") as f :
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    print(f"{len(candidates)} candidates x {folds} folds, {len(tasks)} fitted, {len(candidates) * folds - len(tasks)} from the cache")
+
+    rows = []
+    for name, kind, params in candidates :
+        scores = pd.DataFrame([cache[_fold_key(data_hash, kind, params, fold, folds, random_state)] for fold in range(folds)])
+        rows.append({"model" : name, "mae_mean" : scores["mae"].mean(), "mae_std" : scores["mae"].std(),
+                     "rmse_mean" : scores["rmse"].mean(), "r2_mean" : scores["r2"].mean(), "r2_std" : scores["r2"].std(),
+                     "fit_time" : scores["fit_time"].sum(), "predict_time" : scores["predict_time"].sum()})
+    leaderboard = pd.DataFrame(rows).sort_values("mae_mean", kind = "stable").reset_index(drop = True)
+    if leaderboard_path :
+        leaderboard.round(4).to_csv(leaderboard_path, index = False)
+    return leaderboard
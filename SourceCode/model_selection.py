@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_score, pairwise_distances
+from workers import process_pool, default_workers
+
+## Choice of the number of clusters for Part3
+# - The KMeans models of every k are fitted in parallel and kept, the chosen k is never refitted
+# - The distances used by the silhouette are computed once and shared by all k:
+#   on the full data when it is small, on a fixed random sample of players otherwise,
+#   so the silhouette cost does not grow with the number of players
+# - The elbow (point of the inertia curve farthest from its chord) and the best silhouette give k automatically
+
+_shared = {} # Data of the sweep, inherited by the forked workers instead of being pickled for each task
+
+
+def _fit(k, random_state) :
+    from threadpoolctl import threadpool_limits
+    with threadpool_limits(limits = 1) : # One thread per worker, the parallelism is across k
+        model = KMeans(n_clusters = k, random_state = random_state)
+        model.fit(_shared["data"])
+    return k, model
+
+
+# Distances used by the silhouette : rows of the sample and their distance matrix
+def silhouette_distances(data, sample_size = None, max_exact = 4000, random_state = 0) :
+    n = len(data)
+    if sample_size is None and n <= max_exact :
+        rows = np.arange(n)
+    else :
+        size = min(n, sample_size or max_exact)
+        rows = np.sort(np.random.default_rng(random_state).choice(n, size, replace = False))
+    return rows, pairwise_distances(data[rows])
+
+
+def elbow_k(ks, inertias) :
+    ks = np.asarray(list(ks), dtype = float)
+    y = np.asarray(inertias, dtype = float)
+    x = (ks - ks[0]) / (ks[-1] - ks[0]) # Normalize both axes
+    y = (y - y.min()) / (y.max() - y.min())
+    chord = y[0] + (y[-1] - y[0]) * x
+    return int(ks[np.argmax(np.abs(chord - y))])
+
+
+# Fit KMeans for every k, return the fitted models {k : model} and a table k / inertia / silhouette
+def sweep_k(data, ks, workers = None, random_state = 0, sample_size = None) :
+    ks = list(ks)
+    data = np.ascontiguousarray(data, dtype = float)
+    _shared["data"] = data
+    workers = min(workers or default_workers(), len(ks))
+    try :
+        if workers == 1 :
+            fitted = [_fit(k, random_state) for k in ks]
+        else :
+            with process_pool(workers) as pool :
+                fitted = list(pool.map(_fit, ks, [random_state] * len(ks)))
+    finally :
+        _shared.clear()
+    models = dict(fitted)
+
+    rows, distances = silhouette_distances(data, sample_size, random_state = random_state)
+    curves = pd.DataFrame({
+        "k" : ks,
+        "inertia" : [models[k].inertia_ for k in ks],
+        "silhouette" : [silhouette_score(distances, models[k].labels_[rows], metric = "precomputed") for k in ks],
+        })
+    return models, curves
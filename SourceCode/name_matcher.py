@@ -0,0 +1,181 @@
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+from rapidfuzz import process, fuzz
+
+## Batch fuzzy matching of player names between two sources (fbref and footballtransfers)
+# - Every name is normalized once : accents folded, lower case, punctuation removed, tokens sorted,
+#   so a plain ratio on the normalized names is the token_sort_ratio of the original names
+# - Candidates are blocked by team : the teams of both sources are matched first, then each
+#   player is only scored against the players of his team, with one vectorized cdist call per team
+# - Players without a good match in their team (e.g. transferred during the season) are scored
+#   against all the candidates
+# - The result gives the index of the matched candidate and the score, for auditing
+# - assign gives a one-to-one matching : a candidate claimed by two players goes to the best score,
+#   and the other player gets his next best free candidate
+# - The candidates can also be added page by page (StreamingMatcher), while they are downloaded
+
+# Letters that do not decompose into a base letter + accent
+SPECIAL_LETTERS = str.maketrans({"ł" : "l", "Ł" : "L", "ø" : "o", "Ø" : "O", "ß" : "ss", "æ" : "ae", "Æ" : "AE",
+                                 "œ" : "oe", "Œ" : "OE", "đ" : "d", "Đ" : "D", "ð" : "d", "þ" : "th", "ı" : "i"})
+
+
+def fold_accents(text) :
+    text = unicodedata.normalize("NFKD", str(text).translate(SPECIAL_LETTERS))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def normalize_name(name) :
+    tokens = re.sub(r"[^a-z0-9]+", " ", fold_accents(name).lower()).split()
+    return " ".join(sorted(tokens))
+
+
+# Match every team of teams to the most similar team of candidate_teams
+def match_teams(teams, candidate_teams) :
+    teams = list(dict.fromkeys(teams))
+    candidates = list(dict.fromkeys(candidate_teams))
+    if not teams or not candidates :
+        return {}
+    scores = process.cdist([fold_accents(t).lower() for t in teams], [fold_accents(t).lower() for t in candidates],
+                           scorer = fuzz.WRatio)
+    return {team : candidates[j] for team, j in zip(teams, scores.argmax(axis = 1))}
+
+
+def _best(queries, candidates, workers) :
+    scores = process.cdist(queries, candidates, scorer = fuzz.ratio, workers = workers)
+    best = scores.argmax(axis = 1) # First candidate in case of a tie, like extractOne
+    return best, scores[np.arange(len(queries)), best]
+
+
+# Incremental version of match_players : the candidates are added in pages, as they are downloaded,
+# the best candidate of every player is kept, and the result is the same as matching all the candidates at once
+class StreamingMatcher :
+
+    def __init__(self, names, teams = None, workers = -1) :
+        self.query = [normalize_name(name) for name in names]
+        self.teams = np.asarray(list(teams), dtype = object) if teams is not None else None
+        self.workers = workers
+        n = len(self.query)
+        self.active = np.ones(n, dtype = bool) # Players still looking for a candidate
+        self.team_index = np.full(n, -1, dtype = np.int64) # Best candidate in the team of the player
+        self.team_score = np.zeros(n)
+        self.any_index = np.full(n, -1, dtype = np.int64) # Best candidate of all teams
+        self.any_score = np.zeros(n)
+        self.cand = []
+        self.cand_teams = np.empty(0, dtype = object)
+        self.cand_keys = np.empty(0, dtype = np.int64) # Index of every candidate given by the caller
+        self.team_map = {}
+
+    # Pairs (player, candidate, score) above threshold, from one cdist call per block of players
+    def _pairs(self, q, c, threshold, block_size = 2048) :
+        found = []
+        for start in range(0, len(q), block_size) :
+            block = q[start : start + block_size]
+            scores = process.cdist([self.query[i] for i in block], [self.cand[j] for j in c], scorer = fuzz.ratio,
+                                   workers = self.workers)
+            i, j = np.nonzero(scores > threshold)
+            found.append((block[i], c[j], scores[i, j]))
+        if not found :
+            return np.empty(0, dtype = np.int64), np.empty(0, dtype = np.int64), np.empty(0)
+        return tuple(np.concatenate(parts) for parts in zip(*found))
+
+    # Players that do not need a candidate any more (e.g. found by their id)
+    def drop(self, queries) :
+        self.active[queries] = False
+
+    def _update(self, q, c, index, score) :
+        if len(q) == 0 or len(c) == 0 :
+            return
+        best, best_score = _best([self.query[i] for i in q], [self.cand[j] for j in c], self.workers)
+        better = best_score > score[q] # Equal scores keep the first candidate, like a single argmax
+        index[q[better]], score[q[better]] = c[best[better]], best_score[better]
+
+    # Add a page of candidates, keys is the index of every candidate returned by result (their position by default)
+    def add(self, names, teams = None, keys = None, threshold = 80) :
+        start = len(self.cand)
+        self.cand += [normalize_name(name) for name in names]
+        new = np.arange(start, len(self.cand))
+        keys = np.asarray(list(keys) if keys is not None else new, dtype = np.int64)
+        self.cand_keys = np.concatenate([self.cand_keys, keys])
+        active = np.flatnonzero(self.active)
+
+        rescan = np.empty(0, dtype = np.int64)
+        if self.teams is not None and teams is not None :
+            self.cand_teams = np.concatenate([self.cand_teams, np.asarray(list(teams), dtype = object)])
+            team_map = match_teams(self.teams, self.cand_teams)
+            for team, cand_team in team_map.items() : # One block per team
+                q = active[self.teams[active] == team]
+                if self.team_map.get(team) == cand_team :
+                    c = new[self.cand_teams[new] == cand_team]
+                else : # A better team appeared, the players of this team are scored again on all the candidates
+                    self.team_index[q], self.team_score[q] = -1, 0.0
+                    self.any_index[q], self.any_score[q] = -1, 0.0
+                    rescan = np.concatenate([rescan, q])
+                    c = np.flatnonzero(self.cand_teams == cand_team)
+                self._update(q, c, self.team_index, self.team_score)
+            self.team_map = team_map
+
+        # Search all the candidates for the players not found in their team
+        todo = active[self.team_score[active] <= threshold]
+        self._update(np.setdiff1d(todo, rescan), new, self.any_index, self.any_score)
+        self._update(np.intersect1d(todo, rescan), np.arange(len(self.cand)), self.any_index, self.any_score)
+        return self
+
+    # Players whose match cannot get better
+    def settled(self) :
+        return ~self.active | (self.team_score >= 100)
+
+    # DataFrame aligned with names : candidate key (-1 when no score is above threshold) and score
+    def result(self, threshold = 80) :
+        index, score = self.team_index.copy(), self.team_score.copy()
+        better = (score <= threshold) & (self.any_score > score)
+        index[better], score[better] = self.any_index[better], self.any_score[better]
+        found = (score > threshold) & self.active
+        keys = np.full(len(index), -1, dtype = np.int64)
+        keys[found] = self.cand_keys[index[found]]
+        return pd.DataFrame({"index" : keys, "score" : np.where(self.active, score, 0.0)})
+
+
+    # One-to-one matching of the active players : the pairs above threshold are taken greedily, best score first,
+    # the pairs within the team of the player before the pairs with other teams. Ties go to the first player and
+    # the first candidate, so without conflicts this is the result of result(threshold).
+    # owners : one id per player, the rows of one player (one per team) can share a candidate
+    # exclude : candidate keys already taken (e.g. joined on their id)
+    # Return a DataFrame aligned with names like result
+    def assign(self, threshold = 80, owners = None, exclude = ()) :
+        n = len(self.query)
+        owners = np.asarray(owners) if owners is not None else np.arange(n)
+        free = np.flatnonzero(~np.isin(self.cand_keys, np.asarray(list(exclude), dtype = np.int64)))
+        active = np.flatnonzero(self.active)
+        index = np.full(n, -1, dtype = np.int64)
+        score = self.result(threshold)["score"].to_numpy(copy = True) # Best score seen, for the players left without a candidate
+        owner_of = {} # Candidate -> owner of the player who took it
+
+        def take(q, c, s) :
+            for k in np.lexsort((c, q, -s)) : # Best score first, then player and candidate order
+                player, cand = q[k], c[k]
+                if index[player] < 0 and owner_of.get(cand, owners[player]) == owners[player] :
+                    index[player], score[player] = cand, s[k]
+                    owner_of[cand] = owners[player]
+
+        if self.teams is not None and len(self.cand_teams) :
+            for team, cand_team in self.team_map.items() : # Pairs within the team
+                q = active[self.teams[active] == team]
+                c = free[self.cand_teams[free] == cand_team]
+                if len(q) and len(c) :
+                    take(*self._pairs(q, c, threshold))
+        todo = active[index[active] < 0] # Pairs with all the candidates for the players still without one
+        if len(todo) and len(free) :
+            take(*self._pairs(todo, free, threshold))
+
+        keys = np.full(n, -1, dtype = np.int64)
+        keys[index >= 0] = self.cand_keys[index[index >= 0]]
+        return pd.DataFrame({"index" : keys, "score" : score})
+
+
+# Match the players (names, teams) to the candidates (candidate_names, candidate_teams)
+# Return a DataFrame aligned with names : candidate index (-1 when no score is above threshold) and score
+def match_players(names, teams, candidate_names, candidate_teams = None, threshold = 80, workers = -1) :
+    matcher = StreamingMatcher(names, teams if candidate_teams is not None else None, workers)
+    return matcher.add(candidate_names, candidate_teams, threshold = threshold).result(threshold)
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+## On-disk cache of the scraped HTML pages, shared by Part1 and Part4_1
+# - Page bodies are stored once per content hash in objects/<sha256>.html
+# - index.json maps each url to its hash, ETag / Last-Modified and timestamps
+# - A page younger than the TTL is served without any request, an older one is
+#   revalidated with If-None-Match / If-Modified-Since (a 304 costs no body)
+# - When the cache grows over max_bytes the least recently used pages are evicted
+# - In offline mode only the cache is used, a missing page is an error
+
+
+class PageCache :
+
+    def __init__(self, directory, ttl = 12 * 3600, max_bytes = 200 * 1024 ** 2, offline = False) :
+        self.directory = directory
+        self.ttl = ttl # Seconds a page is served without revalidation
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.stats = {"hits" : 0, "revalidated" : 0, "misses" : 0, "bytes_saved" : 0}
+
+        os.makedirs(os.path.join(directory, "objects"), exist_ok = True)
+        self.index_path = os.path.join(directory, "index.json")
+        self.index = {}
+        if os.path.exists(self.index_path) :
+            with open(self.index_path, encoding = "utf-8") as f :
+                self.index = json.load(f)
+
+    def _object_path(self, digest) :
+        return os.path.join(self.directory, "objects", digest + ".html")
+
+    def _read(self, url) :
+        entry = self.index[url]
+        entry["last_used"] = time.time()
+        with open(self._object_path(entry["hash"]), encoding = "utf-8") as f :
+            return f.read()
+
+    # Get the cache entry of a url, None if it is missing or its body was deleted
+    def lookup(self, url) :
+        with self.lock :
+            entry = self.index.get(url)
+            if entry is None or not os.path.exists(self._object_path(entry["hash"])) :
+                return None
+            return dict(entry)
+
+    def is_fresh(self, entry) :
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    # Headers of a conditional request for a cached page
+    def conditional_headers(self, entry) :
+        headers = {}
+        if entry is not None :
+            if entry.get("etag") :
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified") :
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    # The cached page is served without any request
+    def hit(self, url) :
+        with self.lock :
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += self.index[url]["size"]
+            return self._read(url)
+
+    # The server answered 304 Not Modified, the cached page is still valid
+    def revalidated(self, url, headers = None) :
+        with self.lock :
+            entry = self.index[url]
+            entry["fetched_at"] = time.time()
+            if headers :
+                entry["etag"] = headers.get("ETag", entry.get("etag"))
+                entry["last_modified"] = headers.get("Last-Modified", entry.get("last_modified"))
+            self.stats["revalidated"] += 1
+            self.stats["bytes_saved"] += entry["size"]
+            return self._read(url)
+
+    # Store a downloaded page
+    def store(self, url, html, headers = None) :
+        headers = headers or {}
+        body = html.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()
+        with self.lock :
+            self.stats["misses"] += 1
+            path = self._object_path(digest)
+            if not os.path.exists(path) : # Same content under another url or from an earlier run
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f :
+                    f.write(body)
+                os.replace(tmp_path, path)
+            now = time.time()
+            self.index[url] = {"hash" : digest, "size" : len(body), "etag" : headers.get("ETag"),
+                               "last_modified" : headers.get("Last-Modified"), "fetched_at" : now, "last_used" : now}
+            self._evict()
+
+    # Remove the least recently used pages until the cache fits in max_bytes
+    def _evict(self) :
+        sizes = {entry["hash"] : entry["size"] for entry in self.index.values()} # A body is counted once
+        total = sum(sizes.values())
+        for url in sorted(self.index, key = lambda u : self.index[u]["last_used"]) :
+            if total <= self.max_bytes :
+                break
+            digest = self.index.pop(url)["hash"]
+            if all(entry["hash"] != digest for entry in self.index.values()) :
+                total -= sizes[digest]
+                if os.path.exists(self._object_path(digest)) :
+                    os.remove(self._object_path(digest))
+
+    # Write the index to disk, the temporary file keeps it valid if the script is interrupted
+    def save(self) :
+        with self.lock :
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding = "utf-8") as f :
+                json.dump(self.index, f, indent = 1)
+            os.replace(tmp_path, self.index_path)
+
+    def report(self) :
+        s = self.stats
+        return (f"Page cache : {s['hits']} hits, {s['revalidated']} revalidated, {s['misses']} misses, "
+                f"{s['bytes_saved'] / 1024 ** 2:.2f} MB not downloaded")
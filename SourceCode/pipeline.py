@@ -0,0 +1,223 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shlex
+import hashlib
+import argparse
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+## Pipeline runner of the Part scripts
+# Every stage is a script with the files it reads and writes in SourceCode/. A stage runs when:
+# - one of its inputs changed since its last successful run : the data files it reads, the script
+#   and the local modules it imports (content hashes), or the arguments given with --args
+# - one of its outputs is missing
+# - it is forced (--force), or it downloads pages and --refresh is given
+# The stages that download pages (Part1, Part4_1) are not run again only because time passed: their
+# outputs are kept until --refresh. The hashes are saved in pipeline_state.json with the size and the
+# modification time of every file, an unchanged file is not read again, so a run with nothing to do is instant.
+# A stage starts as soon as the stages producing its inputs are done, independent stages run in parallel,
+# each in its own process, with its output in pipeline_logs/<stage>.log.
+# With --trace-dir, every stage saves its stage-level trace (profiling.py) to <dir>/<stage>.json.
+# Run : python SourceCode/pipeline.py [stages ...] [--dry-run] [--force STAGE] [--refresh] [--args STAGE="..."]
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SOURCE_DIR) # The scripts use paths like SourceCode/results.csv
+STATE_PATH = os.path.join(SOURCE_DIR, "pipeline_state.json")
+LOG_DIR = os.path.join(SOURCE_DIR, "pipeline_logs")
+
+Stage = namedtuple("Stage", ["name", "script", "inputs", "outputs", "remote"])
+
+# Inputs and outputs are relative to SourceCode/, an output can be a glob pattern
+STAGES = [
+    Stage("part1", "Part1.py", [], ["results.csv", "results.parquet"], True),
+    Stage("features", "feature_store.py", ["results.parquet"], ["feature_store/meta.json"], False),
+    Stage("part2", "Part2.py", ["results.parquet"], ["top_3.txt", "results2.csv", "histogram_*.png"], False),
+    Stage("part3", "Part3.py", ["results.parquet", "feature_store/meta.json"], # meta.json : written last by the features stage
+          ["k_sweep.csv", "elbow_plot.png", "silhouette_plot.png", "kmeans_clustering.png", "similar_index/vectors.npy"], False),
+    Stage("part4_1", "Part4_1.py", ["results.parquet"], ["players_900mins_value.csv"], True),
+    Stage("part4_2", "Part4_2.py", ["results.parquet", "players_900mins_value.csv"],
+          ["valuation_model.json", "train_model.csv", "heatmap_of_correlations.png"], False),
+    ]
+
+IMPORT_PATTERN = re.compile(r"^\s*(?:from\s+(\w+)[\w.]*\s+import|import\s+([\w ,]+))", re.MULTILINE)
+
+
+# The script and the modules of SourceCode/ it imports, directly or not
+def code_files(script) :
+    files, todo = [], [script]
+    while todo :
+        name = todo.pop()
+        if name in files :
+            continue
+        files.append(name)
+        with open(os.path.join(SOURCE_DIR, name), encoding = "utf-8") as f :
+            source = f.read()
+        for single, several in IMPORT_PATTERN.findall(source) :
+            for module in [single] if single else [m.strip().split(" ")[0] for m in several.split(",")] :
+                if os.path.exists(os.path.join(SOURCE_DIR, module + ".py")) :
+                    todo.append(module + ".py")
+    return sorted(files)
+
+
+class FileHashes :
+
+    def __init__(self, known) :
+        self.known = known # path -> [size, mtime_ns, sha1]
+
+    def __call__(self, name) :
+        path = os.path.join(SOURCE_DIR, name)
+        if not os.path.exists(path) :
+            return None
+        stat = os.stat(path)
+        entry = self.known.get(name)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns :
+            return entry[2]
+        h = hashlib.sha1()
+        with open(path, "rb") as f :
+            for block in iter(lambda : f.read(1 << 20), b"") :
+                h.update(block)
+        self.known[name] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+
+def load_state(path = STATE_PATH) :
+    if os.path.exists(path) :
+        with open(path, encoding = "utf-8") as f :
+            return json.load(f)
+    return {"files" : {}, "stages" : {}}
+
+
+def save_state(state, path = STATE_PATH) :
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding = "utf-8") as f :
+        json.dump(state, f, indent = 1)
+    os.replace(tmp_path, path)
+
+
+def missing_outputs(stage) :
+    return [out for out in stage.outputs if not glob.glob(os.path.join(SOURCE_DIR, out))]
+
+
+def input_hashes(stage, hashes) :
+    return {name : hashes(name) for name in code_files(stage.script) + stage.inputs}
+
+
+# Reason to run the stage, or None when it is up to date
+def run_reason(stage, state, hashes, forced, refresh, args = ()) :
+    if stage.name in forced :
+        return "forced"
+    if stage.remote and refresh :
+        return "refresh of the downloaded pages"
+    missing = missing_outputs(stage)
+    if missing :
+        return f"missing {', '.join(missing)}"
+    record = state["stages"].get(stage.name)
+    current = input_hashes(stage, hashes)
+    if record is None :
+        if stage.remote : # Outputs downloaded before the pipeline existed, they are kept until --refresh
+            state["stages"][stage.name] = {"inputs" : current, "args" : list(args), "seconds" : None}
+            return None
+        return "never run"
+    changed = [name for name, digest in current.items() if record["inputs"].get(name) != digest]
+    if record.get("args", []) != list(args) : # The trace path is not part of the arguments
+        changed.append("arguments")
+    return f"changed {', '.join(changed)}" if changed else None
+
+
+def run_stage(stage, extra_args) :
+    os.makedirs(LOG_DIR, exist_ok = True)
+    command = [sys.executable, os.path.join(SOURCE_DIR, stage.script)] + extra_args
+    env = dict(os.environ, MPLBACKEND = "Agg") # The plots are saved, never shown
+    start = time.perf_counter()
+    with open(os.path.join(LOG_DIR, f"{stage.name}.log"), "w", encoding = "utf-8") as log :
+        code = subprocess.run(command, cwd = ROOT_DIR, env = env, stdout = log, stderr = subprocess.STDOUT).returncode
+    return code, time.perf_counter() - start
+
+
+# Stages that produce the inputs of every stage
+def dependencies(stages) :
+    producers = {out : stage.name for stage in stages for out in stage.outputs}
+    return {stage.name : {producers[name] for name in stage.inputs if name in producers} for stage in stages}
+
+
+def run_pipeline(selected = None, forced = (), refresh = False, dry_run = False, jobs = None, stage_args = None, trace_dir = None) :
+    state = load_state()
+    hashes = FileHashes(state["files"])
+    deps = dependencies(STAGES)
+    selected = set(selected or [stage.name for stage in STAGES])
+    stage_args = stage_args or {}
+
+    status = {stage.name : "not selected" for stage in STAGES if stage.name not in selected}
+    pending = [stage for stage in STAGES if stage.name in selected]
+    running = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = jobs or len(STAGES)) as pool :
+        while pending or running :
+            for stage in [s for s in pending if deps[s.name] <= set(status)] : # Stages whose inputs are ready
+                pending.remove(stage)
+                blocked = [d for d in deps[stage.name] if status[d] == "failed" or status[d] == "blocked"]
+                upstream = [d for d in deps[stage.name] if status[d] in ("ran", "would run")]
+                extra_args = shlex.split(stage_args.get(stage.name, ""))
+                reason = run_reason(stage, state, hashes, forced, refresh, extra_args)
+                if blocked :
+                    status[stage.name] = "blocked"
+                    print(f"{stage.name:8} blocked by {', '.join(blocked)}")
+                elif dry_run :
+                    if reason is None and upstream :
+                        reason = f"if {', '.join(upstream)} changes its outputs"
+                    status[stage.name] = "would run" if reason else "up to date"
+                    print(f"{stage.name:8} {'would run : ' + reason if reason else 'up to date'}")
+                elif reason is None :
+                    status[stage.name] = "up to date"
+                    print(f"{stage.name:8} up to date")
+                else :
+                    print(f"{stage.name:8} running ({reason})")
+                    inputs = input_hashes(stage, hashes) # Before the run, a change during the run is seen next time
+                    trace_args = ["--trace", os.path.join(os.path.abspath(trace_dir), f"{stage.name}.json")] if trace_dir else []
+                    running[pool.submit(run_stage, stage, extra_args + trace_args)] = (stage, inputs, extra_args)
+            if not running :
+                if pending and not any(deps[s.name] <= set(status) for s in pending) :
+                    raise RuntimeError("Cyclic dependencies between " + ", ".join(s.name for s in pending))
+                continue
+
+            finished, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in finished :
+                stage, inputs, extra_args = running.pop(future)
+                code, seconds = future.result()
+                if code == 0 :
+                    status[stage.name] = "ran"
+                    state["stages"][stage.name] = {"inputs" : inputs, "args" : extra_args, "seconds" : round(seconds, 2)}
+                    print(f"{stage.name:8} done in {seconds:.1f} s")
+                else :
+                    status[stage.name] = "failed"
+                    print(f"{stage.name:8} failed (exit code {code}), see {os.path.join(LOG_DIR, stage.name + '.log')}")
+    if not dry_run :
+        save_state(state)
+    print(f"Pipeline finished in {time.perf_counter() - start:.2f} s")
+    return status
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description = "Run the stages of the assignment whose inputs changed")
+    parser.add_argument("stages", nargs = "*", choices = [[]] + [stage.name for stage in STAGES],
+                        help = "stages to consider (all by default)")
+    parser.add_argument("--force", action = "append", default = [], metavar = "STAGE", help = "run this stage in any case")
+    parser.add_argument("--refresh", action = "store_true", help = "download the pages again (Part1, Part4_1)")
+    parser.add_argument("--dry-run", action = "store_true", help = "only show the stages that would run")
+    parser.add_argument("--jobs", type = int, help = "maximum number of stages running at the same time")
+    parser.add_argument("--args", action = "append", default = [], metavar = "STAGE=ARGS",
+                        help = 'arguments of a stage, e.g. --args part1="--pages saved_pages"')
+    parser.add_argument("--trace-dir", help = "save the stage-level trace of every script run in this directory")
+    args = parser.parse_args()
+    unknown = set(args.stages + args.force) - {stage.name for stage in STAGES}
+    if unknown :
+        parser.error(f"unknown stages : {', '.join(sorted(unknown))}")
+
+    stage_args = dict(item.split("=", 1) for item in args.args)
+    status = run_pipeline(args.stages, set(args.force), args.refresh, args.dry_run, args.jobs, stage_args, args.trace_dir)
+    sys.exit(1 if any(s in ("failed", "blocked") for s in status.values()) else 0)
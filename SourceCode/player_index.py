@@ -0,0 +1,100 @@
+import os
+import time
+import sqlite3
+import numpy as np
+
+## Persistent player identity index shared by the fbref and footballtransfers pipelines
+# Every player gets a canonical integer id. The ids of each source (fbref player id, footballtransfers
+# slug ...) are linked to it, and the fuzzy-match decisions between sources are cached, so a rerun
+# joins the sources on integers and only the new names go through fuzzy matching.
+
+INDEX_PATH = os.path.join("SourceCode", "player_index.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    player_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS source_ids (
+    source TEXT NOT NULL,
+    source_key TEXT NOT NULL,
+    player_id INTEGER NOT NULL REFERENCES players(player_id),
+    name TEXT,
+    PRIMARY KEY (source, source_key)
+);
+CREATE TABLE IF NOT EXISTS match_decisions (
+    source TEXT NOT NULL,
+    source_key TEXT NOT NULL,
+    player_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    decided_at REAL NOT NULL,
+    PRIMARY KEY (source, source_key)
+);
+"""
+
+
+# Source key of the fbref rows : the fbref player id, or the name and nation for tables saved without it
+def fbref_keys(df) :
+    ids = df["fbref_id"] if "fbref_id" in df.columns else None
+    keys = []
+    for i, (player, nation) in enumerate(zip(df["Player"], df["Nation"])) :
+        fbref_id = ids.iat[i] if ids is not None else None
+        keys.append(str(fbref_id) if isinstance(fbref_id, str) and fbref_id else f"name:{player}|{nation}")
+    return keys
+
+
+class PlayerIndex :
+
+    def __init__(self, path = INDEX_PATH) :
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def _select(self, source, keys) :
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500) : # SQLite limits the number of parameters
+            chunk = keys[start : start + 500]
+            marks = ",".join("?" * len(chunk))
+            query = f"SELECT source_key, player_id FROM source_ids WHERE source = ? AND source_key IN ({marks})"
+            found.update(self.conn.execute(query, [source] + chunk).fetchall())
+        return found
+
+    # Canonical ids of source keys, -1 for the keys not linked yet
+    def lookup(self, source, keys) :
+        found = self._select(source, keys)
+        return np.array([found.get(key, -1) for key in keys], dtype = np.int64)
+
+    # Canonical ids of source keys, a new player is created for every unknown key
+    def resolve(self, source, keys, names) :
+        keys, names = list(keys), list(names)
+        found = self._select(source, keys)
+        with self.conn :
+            for key, name in zip(keys, names) :
+                if key not in found :
+                    player_id = self.conn.execute("INSERT INTO players (name) VALUES (?)", (name,)).lastrowid
+                    self.conn.execute("INSERT INTO source_ids VALUES (?, ?, ?, ?)", (source, key, player_id, name))
+                    found[key] = player_id
+        return np.array([found[key] for key in keys], dtype = np.int64)
+
+    # Link source keys to existing players, the fuzzy-match decisions are kept with their score
+    def link(self, source, keys, player_ids, names, scores) :
+        now = time.time()
+        with self.conn :
+            for key, player_id, name, score in zip(keys, player_ids, names, scores) :
+                self.conn.execute("INSERT OR REPLACE INTO source_ids VALUES (?, ?, ?, ?)", (source, key, int(player_id), name))
+                self.conn.execute("INSERT OR REPLACE INTO match_decisions VALUES (?, ?, ?, ?, ?)",
+                                  (source, key, int(player_id), float(score), now))
+
+    # Score of the fuzzy match of every source key (NaN when the key was linked without fuzzy matching)
+    def match_scores(self, source, keys) :
+        keys = list(keys)
+        scores = {}
+        for start in range(0, len(keys), 500) :
+            chunk = keys[start : start + 500]
+            marks = ",".join("?" * len(chunk))
+            query = f"SELECT source_key, score FROM match_decisions WHERE source = ? AND source_key IN ({marks})"
+            scores.update(self.conn.execute(query, [source] + chunk).fetchall())
+        return np.array([scores.get(key, np.nan) for key in keys])
+
+    def close(self) :
+        self.conn.close()
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+## Stage-level tracing of the Part scripts (enabled with --trace, free otherwise)
+# A script marks its stages with section("name") (a section lasts until the next one) or with
+# "with span("name") :" for a nested step. For every stage the tracer records:
+# - wall time, CPU time of the process and CPU time of its finished child processes (process pools)
+# - peak RSS during the stage : on Linux the high-water mark of the process is reset when a stage starts,
+#   elsewhere it is the peak of the process so far
+# - counters added by the code : rows_in, rows_out, bytes_fetched (fetcher.py), bytes_written ...
+# The trace is written when the script exits, as JSON (one record per stage) or as a Chrome trace
+# (chrome://tracing or https://ui.perfetto.dev), and a summary table is printed.
+# --profile STAGE runs cProfile during this stage (the .prof file is saved next to the trace and the
+# slowest functions are in the trace), --tracemalloc STAGE records the peak of the Python allocations
+# and the lines that allocated the most. Both only see the main thread.
+
+_tracer = None
+
+
+def _read_peak_rss() :
+    try :
+        with open("/proc/self/status", encoding = "ascii") as f :
+            for line in f :
+                if line.startswith("VmHWM") :
+                    return int(line.split()[1]) * 1024
+    except OSError :
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Bytes on macOS, kilobytes on Linux
+
+
+def _reset_peak_rss() :
+    try :
+        with open("/proc/self/clear_refs", "w", encoding = "ascii") as f :
+            f.write("5") # Resets VmHWM to the current RSS
+        return True
+    except OSError :
+        return False
+
+
+class Span :
+
+    def __init__(self, name, parent, section, counters) :
+        self.name = name
+        self.parent = parent
+        self.section = section # Closed by the next section
+        self.path = f"{parent.path}/{name}" if parent is not None else name
+        self.counters = dict(counters)
+        self.peak_rss = 0
+        times = os.times()
+        self.start = time.perf_counter()
+        self.cpu_start = times.user + times.system
+        self.children_cpu_start = times.children_user + times.children_system
+        self.profiler = None
+        self.tracing_memory = False
+
+    def add(self, **counters) :
+        for name, value in counters.items() :
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+class Tracer :
+
+    def __init__(self, path, fmt = "json", profile = (), tracemalloc = (), script = None) :
+        self.path = path
+        self.fmt = fmt
+        self.profile = set(profile)
+        self.tracemalloc = set(tracemalloc)
+        self.script = script or os.path.basename(sys.argv[0])
+        self.stack = []
+        self.records = []
+        self.lock = threading.Lock() # The counters are also updated by the download threads
+        self.origin = time.perf_counter()
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.resets_peak = _reset_peak_rss()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True) # Also for the .prof files
+
+    def open(self, name, section = False, counters = None) :
+        if section and self.stack and self.stack[-1].section :
+            self.close(self.stack[-1])
+        parent = self.stack[-1] if self.stack else None
+        if parent is not None : # The peak of the parent so far, before the child resets it
+            parent.peak_rss = max(parent.peak_rss, _read_peak_rss())
+        if self.resets_peak :
+            _reset_peak_rss()
+        span = Span(name, parent, section, counters or {})
+        if name in self.tracemalloc :
+            import tracemalloc
+            span.tracing_memory = not tracemalloc.is_tracing()
+            if span.tracing_memory :
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        if name in self.profile :
+            import cProfile
+            span.profiler = cProfile.Profile()
+            span.profiler.enable()
+        self.stack.append(span)
+        return span
+
+    def close(self, span) :
+        if span not in self.stack : # Already closed with its parent
+            return
+        while self.stack and self.stack[-1] is not span : # Sections left open inside a span end with it
+            self.close(self.stack[-1])
+        self.stack.pop()
+        end = time.perf_counter()
+        times = os.times()
+        if span.profiler is not None :
+            span.profiler.disable()
+        span.peak_rss = max(span.peak_rss, _read_peak_rss())
+        if span.parent is not None :
+            span.parent.peak_rss = max(span.parent.peak_rss, span.peak_rss)
+
+        record = {"stage" : span.path, "start_s" : round(span.start - self.origin, 6), "wall_s" : round(end - span.start, 6),
+                  "cpu_s" : round(times.user + times.system - span.cpu_start, 6),
+                  "children_cpu_s" : round(times.children_user + times.children_system - span.children_cpu_start, 6),
+                  "peak_rss_mb" : round(span.peak_rss / 1024 ** 2, 1)}
+        record.update(span.counters)
+        if span.name in self.tracemalloc :
+            record["tracemalloc"] = self._memory_report(span)
+        if span.profiler is not None :
+            record["profile"] = self._profile_report(span)
+        self.records.append(record)
+
+    def _memory_report(self, span) :
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:10]
+        if span.tracing_memory :
+            tracemalloc.stop()
+        return {"peak_mb" : round(peak / 1024 ** 2, 2), "current_mb" : round(current / 1024 ** 2, 2),
+                "top_lines" : [{"line" : str(stat.traceback[0]), "size_kb" : round(stat.size / 1024, 1), "count" : stat.count}
+                               for stat in top]}
+
+    def _profile_report(self, span) :
+        import pstats
+        base = os.path.splitext(self.path)[0]
+        prof_path = f"{base}.{span.path.replace('/', '.')}.prof"
+        span.profiler.dump_stats(prof_path)
+        stats = pstats.Stats(span.profiler)
+        rows = sorted(stats.stats.items(), key = lambda item : item[1][3], reverse = True)[:15] # Cumulative time
+        return {"file" : prof_path, "top_functions" : [
+            {"function" : f"{os.path.basename(file)}:{line}({function})", "calls" : calls, "tottime_s" : round(tottime, 6),
+             "cumtime_s" : round(cumtime, 6)} for (file, line, function), (_, calls, tottime, cumtime, _) in rows]}
+
+    # The counters of a background thread (downloads) go to the current section, not to a nested step of the main thread
+    def count(self, counters) :
+        with self.lock :
+            if not self.stack :
+                return
+            target = self.stack[-1]
+            if threading.current_thread() is not threading.main_thread() :
+                target = next((span for span in reversed(self.stack) if span.section), target)
+            target.add(**counters)
+
+    def finish(self) :
+        while self.stack :
+            self.close(self.stack[-1])
+        records = sorted(self.records, key = lambda r : r["start_s"])
+        if self.fmt == "chrome" :
+            trace = {"traceEvents" : [{"name" : r["stage"].split("/")[-1], "cat" : "stage", "ph" : "X", "pid" : os.getpid(),
+                                       "tid" : 0, "ts" : r["start_s"] * 1e6, "dur" : r["wall_s"] * 1e6,
+                                       "args" : {k : v for k, v in r.items() if k not in ("start_s", "wall_s")}}
+                                      for r in records],
+                     "displayTimeUnit" : "ms", "otherData" : {"script" : self.script, "started" : self.started}}
+        else :
+            trace = {"script" : self.script, "argv" : sys.argv[1:], "started" : self.started,
+                     "peak_rss_is_per_stage" : self.resets_peak, "stages" : records}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding = "utf-8") as f :
+            json.dump(trace, f, indent = 1)
+        os.replace(tmp_path, self.path)
+        print(summary(records))
+        print(f"Trace saved to {self.path}")
+
+
+# Table of the stages : wall, CPU, peak RSS and the counters, a stage run several times (e.g. once per page)
+# is one line with its number of calls and its totals
+def summary(records) :
+    metrics = ("start_s", "wall_s", "cpu_s", "children_cpu_s", "peak_rss_mb")
+    stages = {}
+    for r in records :
+        total = stages.setdefault(r["stage"], {"calls" : 0, "peak_rss_mb" : 0.0})
+        total["calls"] += 1
+        for name, value in r.items() :
+            if name == "peak_rss_mb" :
+                total[name] = max(total[name], value)
+            elif isinstance(value, (int, float)) and name != "start_s" :
+                total[name] = total.get(name, 0) + value
+    counters = sorted({name for total in stages.values() for name in total if name not in metrics + ("calls",)})
+    lines = [f"{'stage':28} {'calls':>5} {'wall (s)':>9} {'cpu (s)':>8} {'child cpu':>9} {'peak RSS (MB)':>13}"
+             + "".join(f" {c:>15}" for c in counters)]
+    for stage, t in stages.items() :
+        lines.append(f"{stage[:28]:28} {t['calls']:>5} {t['wall_s']:>9.3f} {t['cpu_s']:>8.3f} {t['children_cpu_s']:>9.3f} "
+                     f"{t['peak_rss_mb']:>13.1f}" + "".join(f" {t.get(c, ''):>15}" for c in counters))
+    return "\n".join(lines)
+
+
+## Functions used by the scripts, they do nothing when tracing is off
+
+def add_trace_arguments(parser) :
+    parser.add_argument("--trace", metavar = "PATH", help = "save the time and memory of every stage to this JSON file")
+    parser.add_argument("--trace-format", choices = ["json", "chrome"], default = "json",
+                        help = "stage records, or a Chrome trace (chrome://tracing, Perfetto)")
+    parser.add_argument("--profile", action = "append", default = [], metavar = "STAGE", help = "run cProfile during this stage")
+    parser.add_argument("--tracemalloc", action = "append", default = [], metavar = "STAGE",
+                        help = "trace the Python allocations during this stage")
+
+
+def start_tracing(args) :
+    global _tracer
+    if getattr(args, "trace", None) :
+        _tracer = Tracer(args.trace, args.trace_format, args.profile, args.tracemalloc)
+        atexit.register(_tracer.finish) # Also on an error, the stages done so far are kept
+    return _tracer
+
+
+# Start a stage of the script, the previous section ends here
+def section(name, **counters) :
+    if _tracer is not None :
+        _tracer.open(name, section = True, counters = counters)
+
+
+# Nested stage : with span("parse") : ...
+@contextmanager
+def span(name, **counters) :
+    if _tracer is None :
+        yield None
+        return
+    current = _tracer.open(name, counters = counters)
+    try :
+        yield current
+    finally :
+        _tracer.close(current)
+
+
+# Add to the counters of the current stage, e.g. count(rows_out = len(df))
+def count(**counters) :
+    if _tracer is not None :
+        _tracer.count(counters)
+
+
+# Add the size of the written files to the bytes_written counter of the current stage
+def count_files(*paths) :
+    if _tracer is not None :
+        _tracer.count({"bytes_written" : sum(os.path.getsize(p) for p in paths if os.path.isfile(p))})
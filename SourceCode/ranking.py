@@ -0,0 +1,92 @@
+import json
+import numpy as np
+import pandas as pd
+
+## Highest and lowest k players of every statistic in one pass
+# All the statistics are ranked together on the 2-D matrix (players x statistics):
+# one partition along the players axis gives the k-th value of every column, the
+# players above it are taken, then ties on the k-th value are filled in row order.
+# This gives the same players, in the same order, as nlargest / nsmallest (keep = "first"),
+# and NaN values are never ranked.
+
+ID_COLUMNS = ["Player", "Nation", "Squad", "Pos"]
+
+
+# Rows of the k largest values of each column of M, as a list with one array of row indices per column
+def _largest(M, k) :
+    n, m = M.shape
+    k = min(k, n)
+    if k == 0 :
+        return [np.array([], dtype = np.int64) for _ in range(m)]
+
+    valid = ~np.isnan(M)
+    filled = np.where(valid, M, -np.inf)
+    kth = np.partition(filled, n - k, axis = 0)[n - k] # k-th largest value of every column
+
+    above = valid & (filled > kth)
+    tie = valid & (filled == kth)
+    room = k - above.sum(axis = 0) # Number of tied rows still needed in each column
+    take = above | (tie & (np.cumsum(tie, axis = 0) <= room))
+
+    col_idx, row_idx = np.nonzero(take.T) # Grouped by column
+    order = np.lexsort((row_idx, -filled[row_idx, col_idx], col_idx)) # Highest value first, then row order
+    col_idx, row_idx = col_idx[order], row_idx[order]
+    return np.split(row_idx, np.cumsum(np.bincount(col_idx, minlength = m))[:-1])
+
+
+# Get the row positions of the k highest and k lowest values of every column
+# Return {column : {"top" : rows, "bottom" : rows}}
+def top_bottom_k(df, cols, k = 3) :
+    M = df[cols].to_numpy(dtype = float)
+    top = _largest(M, k)
+    bottom = _largest(-M, k)
+    return {col : {"top" : top[j], "bottom" : bottom[j]} for j, col in enumerate(cols)}
+
+
+## Report renderers, the same ranking can be written as text, csv or json
+
+def render_text(df, ranking, k = 3) :
+    parts = []
+    for col, rows in ranking.items() :
+        parts.append(f"------------ Statistics for {col} ------------ \n")
+        parts.append(f"{k} highest scores :  \n")
+        parts.append(df.iloc[rows["top"]][ID_COLUMNS + [col]].to_string(index = False))
+        parts.append(f"\n{k} lowest scores : \n")
+        parts.append(df.iloc[rows["bottom"]][ID_COLUMNS + [col]].to_string(index = False))
+        parts.append("\n\n")
+    return "".join(parts)
+
+
+def ranking_records(df, ranking) :
+    records = []
+    for col, rows in ranking.items() :
+        for side in ("top", "bottom") :
+            for rank, row in enumerate(rows[side], start = 1) :
+                record = {"Statistic" : col, "Side" : side, "Rank" : rank}
+                record.update({name : df[name].iat[row] for name in ID_COLUMNS})
+                value = df[col].iat[row]
+                record["Value"] = value.item() if hasattr(value, "item") else value # numpy -> python number
+                records.append(record)
+    return records
+
+
+def render_csv(df, ranking) :
+    return pd.DataFrame(ranking_records(df, ranking)).to_csv(index = False)
+
+
+def render_json(df, ranking) :
+    report = {}
+    for record in ranking_records(df, ranking) :
+        sides = report.setdefault(record.pop("Statistic"), {"top" : [], "bottom" : []})
+        sides[record.pop("Side")].append(record)
+    return json.dumps(report, ensure_ascii = False, indent = 1)
+
+
+def render_report(df, ranking, fmt = "text", k = 3) :
+    if fmt == "text" :
+        return render_text(df, ranking, k)
+    if fmt == "csv" :
+        return render_csv(df, ranking)
+    if fmt == "json" :
+        return render_json(df, ranking)
+    raise ValueError(f"Unknown report format : {fmt}")
@@ -0,0 +1,274 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+
+## Typed storage of the player statistics (results.csv)
+# Part1 writes the table once as a parquet file with the schema below:
+# - Player, Nation, Squad, Pos are text
+# - Age is the age in years (the "YY-DDD" string of fbref converted once)
+# - the counting statistics (COUNT_COLUMNS) are integers, every other statistic is a float
+# - a missing value ("N/a" in the csv) is null, it is read back as NaN
+# - the identity columns (ID_COLUMNS : fbref player id, canonical id of player_index.py) follow, they are not in the csv
+# The analysis scripts read it with load_results, only the columns they ask for are read
+#
+# Every run of Part1 is also kept in a partitioned store, one parquet file per season and competition:
+#   results_store/season=2024-2025/comp=9/data.parquet
+# A new scrape of the same season and competition replaces its file atomically, the other partitions are kept.
+# results.parquet stays the table of the last run and is what the scripts read by default, with a season,
+# a competition or --store they read the store instead. The filters (e.g. "Min > 900") are pushed down to
+# the parquet reader : the partitions of other seasons and competitions are not opened, and the row groups
+# whose statistics exclude the filter are skipped.
+
+RESULTS_PATH = os.path.join("SourceCode", "results.parquet")
+RESULTS_CSV_PATH = os.path.join("SourceCode", "results.csv")
+STORE_DIR = os.path.join("SourceCode", "results_store")
+
+# Keys of the partitions of the store, they can be read and filtered like the other columns
+PARTITION_COLUMNS = ["season", "comp"]
+
+# 78 main columns
+RESULTS_COLUMNS = [ 
+        ## Standard: 
+        "Player", "Nation", "Squad", "Pos", "Age",            
+        # Playing Time : matches played, starts, minutes 
+        "MP", "Starts", "Min",
+        # Performance : goals, assists, yellow cards, red cards 
+        "Gls", "Ast", "CrdY", "CrdR",
+        # Expected: expected goals (xG), expedted Assist Goals (xAG) 
+        "xG", "xAG",
+        # Progression: PrgC, PrgP, Prg 
+        "PrgC", "PrgP", "PrgR",
+        # Per 90 minutes: Gls, Ast, xG, xGA 
+        "Gls.1", "Ast.1", "xG.1", "xAG.1",
+    
+        ## Goalkeeping: 
+        # Performance: goals against per 90mins (GA90), Save%, CS% 
+        # Penalty Kicks: penalty kicks Save% 
+        "stats_keeper_GA90", "stats_keeper_Save%", "stats_keeper_CS%", 
+        "stats_keeper_Save%.1",  
+         
+        ## Shooting: 
+        # Standard: shoots on target percentage (SoT%), Shoot on Target per 90min (SoT/90),
+        # goals/shot (G/sh), average shoot distance (Dist) 
+        "stats_shooting_SoT%", "stats_shooting_SoT/90", "stats_shooting_G/Sh", "stats_shooting_Dist",
+        
+        ## Passing:
+        # Total: passes completed (Cmp),Pass completion (Cmp%), progressive
+        # passing distance (TotDist) 
+        # Short: Pass completion (Cmp%),
+        # Medium: Pass completion (Cmp%),
+        # Long: Pass completion (Cmp%),
+        # Expected: key passes (KP), pass into final third (1/3), pass into penalty
+        # area (PPA), CrsPA, PrgP
+        "stats_passing_Cmp", "stats_passing_Cmp%", "stats_passing_TotDist", 
+        "stats_passing_Cmp%.1", 
+        "stats_passing_Cmp%.2", 
+        "stats_passing_Cmp%.3", 
+        "stats_passing_KP", "stats_passing_1/3", "stats_passing_PPA", "stats_passing_CrsPA", "stats_passing_PrgP", 
+        
+        ## Goal and Shot Creation:
+        # SCA: SCA, SCA90
+        # GCA: GCA, GCA90
+        "stats_gca_SCA", "stats_gca_SCA90",
+        "stats_gca_GCA", "stats_gca_GCA90",
+        
+        ## Defensive Actions:
+        # Tackles: Tkl, TklW
+        # Challenges: Att, Lost
+        # Blocks: Blocks, Sh, Pass, Int
+        "stats_defense_Tkl", "stats_defense_TklW",
+        "stats_defense_Att", "stats_defense_Lost",
+        "stats_defense_Blocks", "stats_defense_Sh", "stats_defense_Pass", "stats_defense_Int",
+        
+        ## Possession:
+        # Touches: Touches, Def Pen, Def 3rd, Mid 3rd, Att 3rd, Att Pen
+        # Take-Ons: Att, Succ%, Tkld%
+        # Carries: Carries, ProDist, ProgC, 1/3, CPA, Mis, Dis
+        # Receiving: Rec, PrgR
+        "stats_possession_Touches", "stats_possession_Def Pen", "stats_possession_Def 3rd",
+        "stats_possession_Mid 3rd", "stats_possession_Att 3rd", "stats_possession_Att Pen",
+        "stats_possession_Att", "stats_possession_Succ%", "stats_possession_Tkld%",
+        "stats_possession_Carries", "stats_possession_PrgDist", "stats_possession_PrgC",
+        "stats_possession_1/3", "stats_possession_CPA", "stats_possession_Mis", "stats_possession_Dis",
+        "stats_possession_Rec", "stats_possession_PrgR",
+        
+        ## Miscellaneous Stats:
+        # Performance: Fls, Fld, Off, Crs, Recov
+        # Aerial Duels: Won, Lost, Won%
+        "stats_misc_Fls", "stats_misc_Fld", "stats_misc_Off", "stats_misc_Crs", "stats_misc_Recov",
+        "stats_misc_Won", "stats_misc_Lost", "stats_misc_Won%",
+                   ] 
+
+KEY_COLUMNS = ["Player", "Nation", "Squad", "Pos"]
+STAT_COLUMNS = [col for col in RESULTS_COLUMNS if col not in KEY_COLUMNS] # Age and the 73 statistics
+
+# Statistics that count something (matches, goals, passes, touches ...)
+COUNT_COLUMNS = [
+    "MP", "Starts", "Gls", "Ast", "CrdY", "CrdR", "PrgC", "PrgP", "PrgR",
+    "stats_passing_Cmp", "stats_passing_TotDist", "stats_passing_KP", "stats_passing_1/3", "stats_passing_PPA",
+    "stats_passing_CrsPA", "stats_passing_PrgP",
+    "stats_gca_SCA", "stats_gca_GCA",
+    "stats_defense_Tkl", "stats_defense_TklW", "stats_defense_Att", "stats_defense_Lost",
+    "stats_defense_Blocks", "stats_defense_Sh", "stats_defense_Pass", "stats_defense_Int",
+    "stats_possession_Touches", "stats_possession_Def Pen", "stats_possession_Def 3rd", "stats_possession_Mid 3rd",
+    "stats_possession_Att 3rd", "stats_possession_Att Pen", "stats_possession_Att", "stats_possession_Carries",
+    "stats_possession_PrgDist", "stats_possession_PrgC", "stats_possession_1/3", "stats_possession_CPA",
+    "stats_possession_Mis", "stats_possession_Dis", "stats_possession_Rec", "stats_possession_PrgR",
+    "stats_misc_Fls", "stats_misc_Fld", "stats_misc_Off", "stats_misc_Crs", "stats_misc_Recov",
+    "stats_misc_Won", "stats_misc_Lost",
+    ]
+
+
+# Identity of the players, stored after the main columns when Part1 knows it
+ID_COLUMNS = ["fbref_id", "player_id"]
+
+
+# Get the arrow schema of the results table (with the given identity columns)
+def results_schema(id_columns = ()) :
+    import pyarrow as pa
+    fields = [pa.field(col, pa.string()) for col in KEY_COLUMNS]
+    fields += [pa.field(col, pa.int64() if col in COUNT_COLUMNS else pa.float64()) for col in STAT_COLUMNS]
+    types = {"fbref_id" : pa.string(), "player_id" : pa.int64()}
+    fields += [pa.field(col, types[col]) for col in id_columns]
+    return pa.schema(fields)
+
+
+# Convert the csv form of the results (text, "N/a", "YY-DDD" ages) to the typed form
+def clean_results(df) :
+    df = df.replace("N/a", np.nan)
+    age = df["Age"].astype(str).str.split("-", expand = True) if "Age" in df.columns else pd.DataFrame()
+    if age.shape[1] == 2 : # "YY-DDD", otherwise the age is already in years
+        df["Age"] = (pd.to_numeric(age[0], errors = "coerce") + pd.to_numeric(age[1], errors = "coerce") / 365).round(2)
+    stats = [col for col in STAT_COLUMNS if col in df.columns]
+    df[stats] = df[stats].apply(pd.to_numeric, errors = "coerce")
+    return df
+
+
+def _typed_table(df) :
+    import pyarrow as pa
+    id_columns = [col for col in ID_COLUMNS if col in df.columns]
+    typed = clean_results(df[RESULTS_COLUMNS + id_columns].copy())
+    return pa.Table.from_pandas(typed, schema = results_schema(id_columns), preserve_index = False)
+
+
+# Save the results as a typed parquet file, and as csv when csv_path is given
+def write_results(df, path = RESULTS_PATH, csv_path = None) :
+    import pyarrow.parquet as pq
+
+    if csv_path :
+        df[RESULTS_COLUMNS].to_csv(csv_path, index = False)
+    tmp_path = path + ".tmp"
+    pq.write_table(_typed_table(df), tmp_path)
+    os.replace(tmp_path, path) # Readers never see a half written file
+
+
+def partition_path(season, comp, store_dir = STORE_DIR) :
+    return os.path.join(store_dir, f"season={season}", f"comp={comp}")
+
+
+# Save the results of one season and competition in the store, replacing the previous scrape of this partition
+def write_partition(df, season, comp, store_dir = STORE_DIR) :
+    import pyarrow.parquet as pq
+
+    directory = partition_path(season, comp, store_dir)
+    os.makedirs(directory, exist_ok = True)
+    tmp_path = os.path.join(directory, ".data.parquet.tmp") # Hidden : the readers of the store skip it
+    pq.write_table(_typed_table(df), tmp_path)
+    os.replace(tmp_path, os.path.join(directory, "data.parquet"))
+    return directory
+
+
+FILTER_PATTERN = re.compile(r"^\s*(.+?)\s*(==|!=|>=|<=|=|>|<)\s*(.+?)\s*$")
+
+
+# Arrow expression of a filter written as text : "Min > 900", "Squad == Arsenal", "season >= 2022-2023"
+def parse_filter(text) :
+    import pyarrow.dataset as ds
+    match = FILTER_PATTERN.match(text)
+    if match is None :
+        raise ValueError(f"Cannot read the filter {text!r}, expected COLUMN OPERATOR VALUE (e.g. Min > 900)")
+    column, operator, value = match.groups()
+    value = value.strip("\"'")
+    try :
+        value = float(value) if column not in KEY_COLUMNS + ["fbref_id", "season"] else value
+    except ValueError :
+        pass
+    field = ds.field(column)
+    return {"==" : field == value, "=" : field == value, "!=" : field != value, ">" : field > value,
+            ">=" : field >= value, "<" : field < value, "<=" : field <= value}[operator]
+
+
+# One arrow expression for the filters (text or expressions) and the seasons and competitions, None without any
+def filter_expression(filters = None, season = None, comp = None) :
+    import pyarrow.dataset as ds
+    parts = [parse_filter(f) if isinstance(f, str) else f for f in filters or []]
+    if season is not None :
+        parts.append(ds.field("season").isin([season] if isinstance(season, str) else list(season)))
+    if comp is not None :
+        parts.append(ds.field("comp").isin([int(c) for c in (comp if isinstance(comp, (list, tuple)) else [comp])]))
+    expression = None
+    for part in parts :
+        expression = part if expression is None else expression & part
+    return expression
+
+
+# Arrow dataset of the results : the parquet file of the last run, or every partition of the store
+def results_dataset(path = RESULTS_PATH, store = False, store_dir = STORE_DIR, memory_map = True) :
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    filesystem = fs.LocalFileSystem(use_mmap = memory_map)
+    if not store :
+        return ds.dataset(path, format = "parquet", filesystem = filesystem)
+    if not os.path.isdir(store_dir) :
+        raise FileNotFoundError(f"No results store in {store_dir}, Part1 creates it")
+    keys = pa.schema([pa.field("season", pa.string()), pa.field("comp", pa.int32())])
+    schema = pa.schema(list(results_schema(ID_COLUMNS)) + list(keys)) # Older partitions without ids read as null
+    return ds.dataset(os.path.abspath(store_dir), format = "parquet", filesystem = filesystem, schema = schema,
+                      partitioning = ds.partitioning(keys, flavor = "hive"))
+
+
+# Read the results table, only the given columns (the 78 main columns by default) and the rows passing the filters
+# The parquet file is memory-mapped, the csv file next to it (results.parquet -> results.csv) is only used
+# when there is no parquet file yet
+# With a season, a competition (one or a list) or store = True, the rows are read from the partitioned store
+# Identity columns that an older file does not have are read as missing values
+def load_results(columns = None, path = RESULTS_PATH, memory_map = True, filters = None, season = None, comp = None,
+                 store = False, store_dir = STORE_DIR) :
+    columns = list(columns) if columns is not None else RESULTS_COLUMNS
+    store = store or season is not None or comp is not None
+    expression = filter_expression(filters, season, comp)
+    if store or os.path.exists(path) :
+        dataset = results_dataset(path, store, store_dir, memory_map)
+        available = dataset.schema.names
+        df = dataset.to_table(columns = [col for col in columns if col in available], filter = expression).to_pandas()
+    else :
+        csv_path = os.path.splitext(path)[0] + ".csv"
+        df = pd.read_csv(csv_path, dtype = {col : str for col in ["Age"] + KEY_COLUMNS})
+        df = clean_results(df)
+        if expression is not None : # The csv is small, it is filtered after reading
+            import pyarrow as pa
+            df = pa.Table.from_pandas(df, preserve_index = False).filter(expression).to_pandas()
+        df = df[[col for col in columns if col in df.columns]]
+    for col in columns :
+        if col not in df.columns :
+            if col not in ID_COLUMNS :
+                raise KeyError(f"No column {col} in the results table")
+            df[col] = np.nan
+    return df[columns]
+
+
+# Command line options of the scripts reading the results
+def add_store_arguments(parser) :
+    parser.add_argument("--season", nargs = "+", help = "read these seasons from the results store (e.g. 2023-2024)")
+    parser.add_argument("--comp", nargs = "+", type = int, help = "read these fbref competitions from the results store (e.g. 9)")
+    parser.add_argument("--store", action = "store_true", help = "read every season and competition of the results store")
+    parser.add_argument("--where", action = "append", default = [], metavar = "FILTER",
+                        help = 'only the players passing this filter, e.g. --where "Min > 900" (can be repeated)')
+
+
+# Arguments of load_results for these options, with the filters the script always applies
+def store_options(args, *filters) :
+    return {"filters" : list(filters) + args.where, "season" : args.season, "comp" : args.comp, "store" : args.store}
@@ -0,0 +1,175 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+## Similar players : nearest neighbours in the standardized statistics space of Part3
+# - Every player is a row of the standardized statistics (missing values filled with the mean, as in Part3),
+#   projected on the first principal components : about ten numbers per player keep most of the variance
+# - A query is an exact search : the squared distances are computed block by block with one matrix product
+#   and the k best of every block are kept with argpartition, so the memory does not grow with the index
+#   and a batch of queries shares every pass over the vectors
+# - The filters (positions, minimum minutes) are a mask applied before the k best are chosen
+# - New players are inserted with the saved projection, a player already in the index (same player_id) is replaced
+# - The index is a directory : vectors.npy (memory-mapped when loaded), players.parquet and transform.npz
+
+INDEX_DIR = os.path.join("SourceCode", "similar_index")
+PLAYER_COLUMNS = ["Player", "Nation", "Squad", "Pos", "Min", "player_id"]
+
+
+class SimilarityIndex :
+
+    def __init__(self, vectors, players, transform) :
+        self.vectors = vectors
+        self.players = players.reset_index(drop = True)
+        self.transform = transform # columns, fill, mean, scale, components, pca_mean
+        self.norms = np.einsum("ij,ij->i", vectors, vectors)
+
+    # Build the index from the raw statistics (one row per player) and the player columns
+    @classmethod
+    def fit(cls, stats, players, n_components = 10, random_state = 0) :
+        from sklearn.decomposition import PCA
+        fill = stats.mean()
+        X = stats.fillna(fill).to_numpy(dtype = float)
+        mean = X.mean(axis = 0)
+        scale = X.std(axis = 0)
+        scale[scale == 0] = 1.0 # Like StandardScaler
+        pca = PCA(n_components = min(n_components, *X.shape), random_state = random_state).fit((X - mean) / scale)
+        transform = {"columns" : list(stats.columns), "fill" : fill.to_numpy(dtype = float), "mean" : mean, "scale" : scale,
+                     "components" : pca.components_, "pca_mean" : pca.mean_,
+                     "explained_variance" : float(pca.explained_variance_ratio_.sum())}
+        return cls(cls._project(transform, X), players, transform)
+
+    @staticmethod
+    def _project(transform, X) :
+        X = np.where(np.isnan(X), transform["fill"], X)
+        Z = (X - transform["mean"]) / transform["scale"]
+        return ((Z - transform["pca_mean"]) @ transform["components"].T).astype(np.float32)
+
+    def project(self, stats) :
+        return self._project(self.transform, stats[self.transform["columns"]].to_numpy(dtype = float))
+
+    def __len__(self) :
+        return len(self.players)
+
+    # Add newly scraped players, the rows with the player_id of a player already in the index replace him
+    # Return the rows of the inserted players
+    def insert(self, stats, players) :
+        vectors = self.project(stats)
+        players = players.reset_index(drop = True)
+        rows = np.full(len(players), -1, dtype = np.int64)
+        if "player_id" in players.columns and "player_id" in self.players.columns :
+            known = pd.Series(np.arange(len(self.players)), index = self.players["player_id"])
+            known = known[known.index.notna() & ~known.index.duplicated()]
+            rows = known.reindex(players["player_id"]).fillna(-1).to_numpy(dtype = np.int64, copy = True)
+
+        replace = rows >= 0
+        if replace.any() :
+            self.vectors = np.array(self.vectors) # A memory-mapped index is copied before it is modified
+            self.vectors[rows[replace]] = vectors[replace]
+            self.players.loc[rows[replace], players.columns] = players[replace].to_numpy()
+        new = ~replace
+        rows[new] = np.arange(len(self.players), len(self.players) + new.sum())
+        self.vectors = np.concatenate([self.vectors, vectors[new]])
+        self.players = pd.concat([self.players, players[new]], ignore_index = True)
+        self.norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        return rows
+
+    # Rows allowed by the filters : one of the positions (fbref "DF,MF" lists several), at least min_minutes
+    def mask(self, positions = None, min_minutes = None) :
+        allowed = np.ones(len(self.players), dtype = bool)
+        if positions :
+            wanted = set(positions)
+            allowed &= self.players["Pos"].fillna("").map(lambda pos : bool(wanted & set(pos.split(",")))).to_numpy()
+        if min_minutes is not None :
+            allowed &= self.players["Min"].fillna(0).to_numpy() >= min_minutes
+        return allowed
+
+    # k nearest rows of every query vector, return (rows, distances) of shape (queries, k), -1 / inf past the end
+    # exclude : one row per query left out of its own results (the queried player)
+    def search(self, queries, k = 20, mask = None, exclude = None, block_size = 65536) :
+        Q = np.atleast_2d(np.asarray(queries, dtype = np.float32))
+        n_queries = len(Q)
+        q_norms = np.einsum("ij,ij->i", Q, Q)[:, None]
+        best_d = np.full((n_queries, k), np.inf, dtype = np.float32)
+        best_i = np.full((n_queries, k), -1, dtype = np.int64)
+        for start in range(0, len(self.vectors), block_size) :
+            end = min(start + block_size, len(self.vectors))
+            d = q_norms - 2 * Q @ self.vectors[start : end].T + self.norms[start : end]
+            if mask is not None :
+                d[:, ~mask[start : end]] = np.inf
+            if exclude is not None :
+                inside = (exclude >= start) & (exclude < end)
+                d[np.flatnonzero(inside), exclude[inside] - start] = np.inf
+            d = np.concatenate([best_d, d], axis = 1)
+            i = np.concatenate([best_i, np.broadcast_to(np.arange(start, end), (n_queries, end - start))], axis = 1)
+            keep = np.argpartition(d, k - 1, axis = 1)[:, :k] # The k best so far and of this block
+            best_d, best_i = np.take_along_axis(d, keep, axis = 1), np.take_along_axis(i, keep, axis = 1)
+        order = np.argsort(best_d, axis = 1, kind = "stable")
+        best_d, best_i = np.take_along_axis(best_d, order, axis = 1), np.take_along_axis(best_i, order, axis = 1)
+        best_i[np.isinf(best_d)] = -1
+        return best_i, np.sqrt(np.maximum(best_d, 0))
+
+    # Rows of the players with these names (case insensitive), the first row of a player listed for two teams
+    def rows_of(self, names) :
+        lookup = pd.Series(np.arange(len(self.players)), index = self.players["Player"].str.lower())
+        lookup = lookup[~lookup.index.duplicated()]
+        missing = [name for name in names if name.lower() not in lookup.index]
+        if missing :
+            raise KeyError(f"Unknown players : {', '.join(missing)}")
+        return lookup[[name.lower() for name in names]].to_numpy()
+
+    # The k players most similar to each of the given players, as one table (query, rank, player columns, distance)
+    def query(self, names, k = 20, positions = None, min_minutes = None) :
+        rows = self.rows_of(names)
+        found, distances = self.search(self.vectors[rows], k, self.mask(positions, min_minutes), exclude = rows)
+        tables = []
+        for name, found_rows, dist in zip(names, found, distances) :
+            keep = found_rows >= 0
+            table = self.players.iloc[found_rows[keep]].reset_index(drop = True)
+            table.insert(0, "rank", np.arange(1, keep.sum() + 1))
+            table.insert(0, "query", name)
+            table["distance"] = dist[keep].round(3)
+            tables.append(table)
+        return pd.concat(tables, ignore_index = True)
+
+    def save(self, path = INDEX_DIR) :
+        os.makedirs(path, exist_ok = True)
+        tmp = os.path.join(path, "vectors.tmp.npy")
+        np.save(tmp, np.asarray(self.vectors))
+        os.replace(tmp, os.path.join(path, "vectors.npy"))
+        self.players.to_parquet(os.path.join(path, "players.parquet"), index = False)
+        arrays = {name : value for name, value in self.transform.items() if isinstance(value, np.ndarray)}
+        np.savez(os.path.join(path, "transform.npz"), **arrays)
+        with open(os.path.join(path, "index.json"), "w", encoding = "utf-8") as f :
+            json.dump({"columns" : self.transform["columns"], "explained_variance" : self.transform["explained_variance"],
+                       "players" : len(self.players), "dimensions" : int(self.vectors.shape[1])}, f, indent = 1)
+
+    @classmethod
+    def load(cls, path = INDEX_DIR, memory_map = True) :
+        with open(os.path.join(path, "index.json"), encoding = "utf-8") as f :
+            info = json.load(f)
+        with np.load(os.path.join(path, "transform.npz")) as arrays :
+            transform = dict(arrays)
+        transform["columns"] = info["columns"]
+        transform["explained_variance"] = info["explained_variance"]
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode = "r" if memory_map else None)
+        return cls(vectors, pd.read_parquet(os.path.join(path, "players.parquet")), transform)
+
+
+## Command line : python SourceCode/similar_players.py "Bukayo Saka" --k 20 --pos FW,MF --min-minutes 900
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description = "Find the players most similar to the given players")
+    parser.add_argument("players", nargs = "+", help = "names of the players")
+    parser.add_argument("--k", type = int, default = 20, help = "number of similar players")
+    parser.add_argument("--pos", help = "only players with one of these positions, e.g. FW,MF")
+    parser.add_argument("--min-minutes", type = float, help = "only players with at least these minutes played")
+    parser.add_argument("--index", default = INDEX_DIR, help = "directory of the index (built by Part3)")
+    args = parser.parse_args()
+
+    index = SimilarityIndex.load(args.index)
+    result = index.query(args.players, k = args.k, positions = args.pos.split(",") if args.pos else None,
+                         min_minutes = args.min_minutes)
+    print(result.to_string(index = False))
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import IncrementalPCA
+from sklearn.metrics import silhouette_score, pairwise_distances
+from sklearn.preprocessing import StandardScaler
+from results_store import RESULTS_PATH, results_dataset, filter_expression
+
+## Out-of-core clustering for Part3, for player tables that do not fit in memory
+# The feature chunks are streamed from the parquet file (or directory of parquet files, or the partitioned store):
+# - pass 1 : StandardScaler.partial_fit (missing values are replaced by the column mean, as in the full-batch path)
+# - pass 2 : MiniBatchKMeans.partial_fit for every k and IncrementalPCA.partial_fit, on the same chunks,
+#            repeated for a few epochs, and a uniform sample of players is kept
+#            (partial_fit initializes the centers once, from the first chunk : there is no n_init)
+# - pass 3 : inertia of every k summed over the chunks
+# The silhouette and the PCA scatter use the sample, so the memory used is bounded by
+# the chunk size and the sample size, whatever the number of players.
+# Every chunk has at least max(ks) rows (small batches are merged), so every model is fitted on every chunk.
+
+
+# query : the filters, seasons and competitions of load_results (results_store.py)
+def iter_chunks(columns, path = RESULTS_PATH, chunk_size = 10000, filters = None, season = None, comp = None, store = False) :
+    dataset = results_dataset(path, store = store or season is not None or comp is not None)
+    expression = filter_expression(filters, season, comp)
+    for batch in dataset.to_batches(columns = list(columns), filter = expression, batch_size = chunk_size) :
+        if batch.num_rows :
+            yield batch.to_pandas().to_numpy(dtype = float)
+
+
+class StreamingClusterer :
+
+    def __init__(self, columns, ks, path = RESULTS_PATH, chunk_size = 10000, sample_size = 2000,
+                 epochs = 3, n_components = 2, random_state = 0, query = None) :
+        self.columns = list(columns)
+        self.query = query or {}
+        self.ks = list(ks)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.sample_size = sample_size
+        self.epochs = epochs
+        self.random_state = random_state
+        self.scaler = StandardScaler()
+        self.models = {k : MiniBatchKMeans(n_clusters = k, random_state = random_state, batch_size = min(chunk_size, 1024))
+                       for k in self.ks}
+        self.pca = IncrementalPCA(n_components = n_components)
+        self.min_rows = max(self.ks + [n_components]) # Rows needed by every partial_fit
+
+    # Chunks of at least min_rows rows : small batches are merged with the next ones, a small last batch
+    # with the chunk before it
+    def _chunks(self) :
+        pending, buffer, size = None, [], 0
+        for X in iter_chunks(self.columns, self.path, self.chunk_size, **self.query) :
+            buffer.append(X)
+            size += len(X)
+            if size >= self.min_rows :
+                if pending is not None :
+                    yield pending
+                pending, buffer, size = np.vstack(buffer), [], 0
+        if buffer :
+            pending = np.vstack(([pending] if pending is not None else []) + buffer)
+        if pending is not None :
+            yield pending
+
+    # Standardized chunk, a missing value becomes the column mean (0 after scaling)
+    def transform(self, X) :
+        X = np.where(np.isnan(X), self.mean_, X)
+        return (X - self.mean_) / self.scale_
+
+    def fit(self) :
+        n_rows = 0
+        for X in self._chunks() : # Pass 1 : mean and variance
+            with np.errstate(invalid = "ignore", divide = "ignore") : # A column without values in a chunk (e.g. keeper statistics)
+                self.scaler.partial_fit(X)
+            n_rows += len(X)
+        if n_rows < self.min_rows :
+            raise ValueError(f"{n_rows} players, at least {self.min_rows} are needed for k = {max(self.ks)}")
+        # The full-batch path fills the missing values with the mean before scaling,
+        # they add no deviation but count in the variance
+        self.mean_ = self.scaler.mean_
+        var = self.scaler.var_ * self.scaler.n_samples_seen_ / n_rows
+        self.scale_ = np.where(var > 0, np.sqrt(var), 1.0)
+
+        rng = np.random.default_rng(self.random_state)
+        sample = np.empty((0, len(self.columns)))
+        keys = np.empty(0)
+        seen = 0
+        for epoch in range(self.epochs) : # Pass 2 : clustering and PCA
+            for X in self._chunks() :
+                Z = self.transform(X)
+                for model in self.models.values() :
+                    model.partial_fit(Z)
+                if epoch == 0 :
+                    self.pca.partial_fit(Z)
+                    # Uniform sample of the players : every row gets a random key, the smallest keys are kept
+                    sample = np.vstack([sample, Z])
+                    keys = np.concatenate([keys, rng.random(len(Z))])
+                    if len(keys) > self.sample_size :
+                        keep = np.argpartition(keys, self.sample_size)[: self.sample_size]
+                        sample, keys = sample[keep], keys[keep]
+                    seen += len(Z)
+        self.sample = sample
+        self.n_rows = seen
+
+        inertias = dict.fromkeys(self.ks, 0.0)
+        for X in self._chunks() : # Pass 3 : inertia on all the players
+            Z = self.transform(X)
+            for k, model in self.models.items() :
+                inertias[k] += -model.score(Z)
+
+        distances = pairwise_distances(self.sample) # Shared by the silhouette of every k
+        self.curves = pd.DataFrame({
+            "k" : self.ks,
+            "inertia" : [inertias[k] for k in self.ks],
+            "silhouette" : [silhouette_score(distances, self.models[k].predict(self.sample), metric = "precomputed") for k in self.ks],
+            })
+        return self
@@ -0,0 +1,298 @@
+import os
+import html
+import argparse
+import numpy as np
+import pandas as pd
+from fetcher import page_filename
+from results_store import RESULTS_COLUMNS, KEY_COLUMNS, COUNT_COLUMNS
+from transfer_values import page_url, TABLE_CLASS
+
+## Synthetic data in the shape of the real sources, to run the scripts at any size without the network
+# - synthetic_players : the player table in the form of results.csv (78 columns, "N/a" for a missing value,
+#   ages as "YY-DDD"), driven by a few hidden factors (minutes, skill, position) so the statistics are
+#   correlated like the real ones, with a few players under 90 minutes that Part1 filters out
+# - fbref_pages : one page per statistic table, like fbref : the table inside an HTML comment next to a decoy
+#   table, a header row over the header, the header repeated every 25 rows, repeated column names
+#   (Gls ... Gls, Cmp% x 4), thousands separators, the player id in data-append-csv, the empty cells of "N/a"
+# - value_listing / value_pages : the footballtransfers listing sorted by value, 25 players per page with the
+#   pagination links, the names as near-duplicates of the fbref names (accents, token order, initials, typos)
+#   and the long team names
+# Run : python SourceCode/synthetic.py --players 5000 --out synthetic_data
+#       (then e.g. python SourceCode/Part1.py --pages synthetic_data/pages --no-cache)
+
+# fbref team name : footballtransfers team name
+TEAMS = {
+    "Arsenal" : "Arsenal", "Aston Villa" : "Aston Villa", "Bournemouth" : "AFC Bournemouth", "Brentford" : "Brentford",
+    "Brighton" : "Brighton & Hove Albion", "Chelsea" : "Chelsea", "Crystal Palace" : "Crystal Palace", "Everton" : "Everton",
+    "Fulham" : "Fulham", "Ipswich Town" : "Ipswich Town", "Leicester City" : "Leicester City", "Liverpool" : "Liverpool",
+    "Manchester City" : "Manchester City", "Manchester Utd" : "Manchester United", "Newcastle Utd" : "Newcastle United",
+    "Nott'ham Forest" : "Nottingham Forest", "Southampton" : "Southampton", "Tottenham" : "Tottenham Hotspur",
+    "West Ham" : "West Ham United", "Wolves" : "Wolverhampton Wanderers",
+    }
+
+NATIONS = ["ENG", "FRA", "ESP", "BRA", "POR", "NED", "GER", "ARG", "BEL", "NOR", "SCO", "WAL", "IRL", "DEN", "SWE",
+           "SUI", "ITA", "CRO", "SRB", "USA", "JPN", "KOR", "GHA", "NGA", "SEN", "CIV", "CMR", "MAR", "URU", "COL"]
+
+FIRST_NAMES = ["James", "Jack", "Harry", "Kai", "Bukayo", "Mohamed", "Bruno", "João", "Rúben", "Martin", "Érling", "Kevin",
+               "Declan", "Trent", "Virgil", "Son", "Heung-min", "Ollie", "Jarrod", "Cole", "Phil", "Marcus", "Raheem",
+               "Dominik", "Alexis", "Moisés", "Enzo", "Nicolás", "Rodrigo", "Bernardo", "Éderson", "Gabriel", "William",
+               "Ben", "Aaron", "Jordan", "Kieran", "Luke", "Mason", "Conor", "Lewis", "Callum", "Danny", "Tyrick",
+               "Ibrahima", "Yves", "Amadou", "Pape", "Cheikhou", "Youssef", "Hwang", "Takehiro", "Kaoru", "Wataru",
+               "Antonín", "Tomáš", "Lukáš", "Matías", "Álex", "Iñaki", "Sergio", "Dani", "Pedro", "Andrés", "Emile"]
+SURNAME_STARTS = ["Sa", "Ra", "Mar", "Fer", "Gon", "Ro", "Wil", "Cal", "Dou", "Kul", "Mit", "Tri", "Hav", "Øde", "Bel",
+                  "Mbe", "Kon", "Ndi", "Oli", "Wat", "Gvar", "Zin", "Hoj", "Ler", "Ruiz", "Sánch", "Mül", "Kova", "Diab", "Tiel"]
+SURNAME_ENDS = ["ka", "shford", "tinez", "nandes", "zález", "dri", "son", "vert", "glas", "usevski", "oma", "ppier", "ertz",
+                "gaard", "lingham", "umo", "até", "aye", "ise", "kins", "diol", "chenko", "lund", "ma", "ez", "ez-Pérez",
+                "ler", "čić", "by", "mans"]
+
+STAT_PAGES = {"stats_standard" : "stats", "stats_keeper" : "keepers", "stats_shooting" : "shooting",
+              "stats_passing" : "passing", "stats_gca" : "gca", "stats_defense" : "defense",
+              "stats_possession" : "possession", "stats_misc" : "misc"}
+
+POSITIONS = ["GK", "DF", "MF", "FW", "DF,MF", "MF,FW", "FW,MF", "MF,DF"]
+POSITION_SHARES = [0.08, 0.30, 0.22, 0.18, 0.06, 0.08, 0.04, 0.04]
+ATTACK = {"GK" : 0.02, "DF" : 0.25, "MF" : 0.6, "FW" : 1.0} # How much the position shoots, creates, dribbles
+DEFEND = {"GK" : 0.1, "DF" : 1.0, "MF" : 0.7, "FW" : 0.3}
+
+
+def fbref_url(table_id, comp = 9, name = "Premier-League") :
+    return f"https://fbref.com/en/comps/{comp}/{STAT_PAGES[table_id]}/{name}-Stats"
+
+
+# Column names of one fbref table in results.csv, in order ("stats_passing_Cmp%.1" ...)
+def table_columns(table_id) :
+    if table_id == "stats_standard" :
+        return [col for col in RESULTS_COLUMNS if not col.startswith("stats_") and col not in KEY_COLUMNS]
+    return [col for col in RESULTS_COLUMNS if col.startswith(table_id + "_")]
+
+
+def _names(n, rng) :
+    surnames = np.char.add(rng.choice(SURNAME_STARTS, n), rng.choice(SURNAME_ENDS, n))
+    names = np.char.add(np.char.add(rng.choice(FIRST_NAMES, n), " "), surnames)
+    names = pd.Series(names)
+    single = rng.random(n) < 0.03 # A few players known by one name (Alisson, Rodri ...)
+    names[single] = pd.Series(surnames)[single]
+    return names
+
+
+def _fmt(values, decimals) :
+    return np.char.mod(f"%.{decimals}f", np.round(values, decimals))
+
+
+# The player table of results.csv (every column as text), before the Min > 90 filter of Part1
+def synthetic_players(n, seed = 0, teams = None) :
+    rng = np.random.default_rng(seed)
+    teams = list(teams or TEAMS)
+    pos = rng.choice(POSITIONS, n, p = POSITION_SHARES)
+    main = np.array([p.split(",")[0] for p in pos])
+    attack = np.vectorize(ATTACK.get)(main) * rng.lognormal(0, 0.35, n)
+    defend = np.vectorize(DEFEND.get)(main) * rng.lognormal(0, 0.3, n)
+    skill = rng.normal(0, 1, n)
+    minutes = np.where(rng.random(n) < 0.05, rng.integers(1, 90, n), np.clip(rng.normal(1500 + 400 * skill, 800), 91, 3420))
+    minutes = minutes.round().astype(int)
+    n90 = minutes / 90
+    age_days = rng.integers(17 * 365, 38 * 365, n)
+    mp = np.clip(np.round(n90 * rng.uniform(1.0, 1.6, n)), 1, 38).astype(int)
+
+    df = pd.DataFrame({"Player" : _names(n, rng), "Nation" : rng.choice(NATIONS, n), "Squad" : rng.choice(teams, n), "Pos" : pos})
+    df["Age"] = np.char.add(np.char.add((age_days // 365).astype(str), "-"), np.char.zfill((age_days % 365).astype(str), 3))
+    stats = {"MP" : mp, "Starts" : np.minimum(mp, np.round(n90 * 0.9)).astype(int), "Min" : minutes}
+
+    level = np.exp(0.3 * skill)
+    for col in COUNT_COLUMNS : # Counts over the minutes played, the rate depends on the position and the level
+        if col in stats :
+            continue
+        style = attack if any(key in col for key in ("Gls", "Ast", "SCA", "GCA", "KP", "PPA", "Att Pen", "Att 3rd", "CPA", "Off", "Crs", "Prg"))\
+            else defend if any(key in col for key in ("defense", "Recov", "Won", "Def", "Fls", "Lost")) else np.ones(n)
+        base = {"Gls" : 0.35, "Ast" : 0.25, "CrdY" : 0.15, "CrdR" : 0.01, "stats_gca_GCA" : 0.5}.get(col, rng.uniform(0.5, 40))
+        stats[col] = rng.poisson(base * style * level * n90)
+
+    for col in RESULTS_COLUMNS[5:] : # The other statistics : expected values, per-90 columns, percentages
+        if col in stats :
+            continue
+        if col in ("xG", "xAG") :
+            value = np.maximum(stats["Gls" if col == "xG" else "Ast"] + rng.normal(0, 1.0, n), 0)
+        elif col.endswith(".1") and col[:-2] in ("Gls", "Ast", "xG", "xAG") :
+            value = stats[col[:-2]] / np.maximum(n90, 1e-9)
+        elif col.endswith("90") and col.startswith("stats_gca") :
+            value = stats[col[:-2]] / np.maximum(n90, 1e-9)
+        elif col == "stats_shooting_SoT/90" :
+            value = attack * rng.uniform(0.2, 1.2, n)
+        elif col == "stats_shooting_Dist" :
+            value = rng.normal(17, 3, n)
+        elif col == "stats_shooting_G/Sh" :
+            value = rng.beta(2, 14, n)
+        elif col == "stats_keeper_GA90" :
+            value = rng.normal(1.4, 0.4, n)
+        else : # Percentages
+            value = np.clip(rng.normal(60 + 10 * skill, 15), 0, 100)
+        stats[col] = value
+    for col in RESULTS_COLUMNS[5:] :
+        value = stats[col]
+        df[col] = value.astype(str) if value.dtype.kind == "i" else _fmt(value, 2 if "/" in col or "90" in col or col in ("Gls.1", "Ast.1", "xG.1", "xAG.1") else 1)
+
+    # Missing values : the goalkeeping columns of outfield players, the shooting ratios of players who never
+    # shot, and a few random holes
+    keeper_cols = table_columns("stats_keeper")
+    df.loc[main != "GK", keeper_cols] = "N/a"
+    no_shot = rng.random(n) < np.where(main == "GK", 0.95, 0.08)
+    df.loc[no_shot, ["stats_shooting_SoT%", "stats_shooting_SoT/90", "stats_shooting_G/Sh", "stats_shooting_Dist"]] = "N/a"
+    ratio_cols = [col for col in RESULTS_COLUMNS if "%" in col and not col.startswith("stats_keeper")]
+    holes = rng.random((n, len(ratio_cols))) < 0.03
+    df[ratio_cols] = df[ratio_cols].mask(holes, "N/a")
+    df["fbref_id"] = [f"{(i * 2654435761 + seed) % 2 ** 32:08x}" for i in range(n)]
+    df["skill"] = skill # Hidden factors used for the transfer values
+    df["age_years"] = age_days / 365
+    return df
+
+
+# The table Part1 saves as results.csv : players over 90 minutes sorted by name, the 78 columns
+def results_table(players) :
+    df = players[players["Min"].astype(int) > 90].sort_values("Player", kind = "stable")
+    return df[RESULTS_COLUMNS].reset_index(drop = True)
+
+
+# HTML of one fbref table page
+def fbref_page(players, table_id, repeat_header = 25) :
+    columns = table_columns(table_id)
+    if table_id != "stats_standard" :
+        columns = ["Age"] + columns # Every fbref table repeats the age
+    if table_id == "stats_keeper" :
+        players = players[players["Pos"].str.contains("GK")]
+    raw_names = [col[len(table_id) + 1 :] if col.startswith(table_id + "_") else col for col in columns]
+    raw_names = [name.rsplit(".", 1)[0] if name.rsplit(".", 1)[-1].isdigit() else name for name in raw_names] # Gls.1 -> Gls
+    header = ["Rk", "Player", "Nation", "Pos", "Squad"] + raw_names + ["90s", "Matches"]
+    head_cells = "".join(f'<th aria-label="{html.escape(h)}" scope="col">{html.escape(h)}</th>' for h in header)
+
+    n = len(players)
+    cells = {}
+    for col in columns :
+        text = players[col].astype(str).where(players[col] != "N/a", "")
+        if col in ("Min", "stats_passing_TotDist", "stats_possession_PrgDist") : # Thousands separators
+            text = text.map(lambda v : f"{int(v):,}" if v else v)
+        cells[col] = [f'<td data-stat="{html.escape(col)}">{v}</td>' for v in text]
+    nineties = _fmt(players["Min"].astype(int).to_numpy() / 90, 1)
+    names = players["Player"].map(html.escape).to_numpy()
+    ids = players["fbref_id"].to_numpy()
+    nations = players["Nation"].to_numpy()
+    pos, squad = players["Pos"].to_numpy(), players["Squad"].map(html.escape).to_numpy()
+
+    rows = []
+    for i in range(n) :
+        if i and i % repeat_header == 0 :
+            rows.append(f'<tr class="thead">{head_cells}</tr>')
+        slug = names[i].replace(" ", "-")
+        rows.append(f'<tr><th scope="row" data-stat="ranker">{i + 1}</th>'
+                    f'<td data-stat="player" data-append-csv="{ids[i]}"><a href="/en/players/{ids[i]}/{slug}">{names[i]}</a></td>'
+                    f'<td data-stat="nationality"><a href="/en/country/{nations[i]}/"><span class="f-i f-{nations[i].lower()}">'
+                    f'{nations[i].lower()}</span></a> {nations[i]}</td><td data-stat="position">{pos[i]}</td>'
+                    f'<td data-stat="team"><a href="/en/squads/x/">{squad[i]}</a></td>'
+                    + "".join(cells[col][i] for col in columns)
+                    + f'<td data-stat="minutes_90s">{nineties[i]}</td><td data-stat="matches"><a href="/matches/">Matches</a></td></tr>')
+    table = (f'<table class="min_width sortable stats_table" id="{table_id}" data-cols-to-freeze=",3">'
+             f'<caption>Player Table</caption><thead><tr class="over_header"><th aria-label="" colspan="5"></th>'
+             f'<th colspan="{len(header) - 5}">Performance</th></tr><tr>{head_cells}</tr></thead><tbody>'
+             + "\n".join(rows) + "</tbody></table>")
+    squads = f'<table class="stats_table" id="{table_id.replace("stats_", "stats_squads_")}_for"><tr><th>Squad</th></tr></table>'
+    return (f"<!DOCTYPE html><html><head><title>{table_id}</title></head><body><div id='content'>{squads}</div>"
+            f"<div id='all_{table_id}' class='table_wrapper'><div class='placeholder'></div>\n<!--\n{table}\n-->\n</div></body></html>")
+
+
+# Write the 8 fbref pages with the file names of saved pages (Part1 --pages)
+def write_fbref_pages(players, directory) :
+    os.makedirs(directory, exist_ok = True)
+    for table_id in STAT_PAGES :
+        with open(os.path.join(directory, page_filename(fbref_url(table_id))), "w", encoding = "utf-8") as f :
+            f.write(fbref_page(players, table_id))
+
+
+def _near_duplicate(name, rng) :
+    from name_matcher import fold_accents
+    kind = rng.random()
+    parts = name.split(" ")
+    if kind < 0.1 and len(parts) > 1 : # Token order
+        return " ".join(parts[1:] + parts[:1])
+    if kind < 0.2 : # Accents dropped
+        return fold_accents(name)
+    if kind < 0.25 and len(parts) > 1 : # Initial of the first name
+        return f"{parts[0][0]}. {' '.join(parts[1:])}"
+    if kind < 0.28 and len(name) > 6 : # Typo : a letter dropped
+        i = int(rng.integers(1, len(name) - 1))
+        return name[:i] + name[i + 1 :]
+    return name
+
+
+# The transfer values of the players : a function of the hidden level, the minutes and the age
+def value_listing(players, seed = 0) :
+    rng = np.random.default_rng(seed + 1)
+    minutes = players["Min"].astype(int).to_numpy()
+    age = players["age_years"].to_numpy()
+    value = np.exp(1.2 + 0.8 * players["skill"].to_numpy() + minutes / 1500 - 0.04 * np.maximum(age - 26, 0) ** 2
+                   + rng.normal(0, 0.3, len(players)))
+    value = np.maximum(value, np.where(minutes > 900, 0.9, 0.1)) # Like the listing : a regular is worth at least 0.9M
+    listing = pd.DataFrame({"Player" : [_near_duplicate(name, rng) for name in players["Player"]],
+                            "Team" : players["Squad"].map(lambda team : TEAMS.get(team, team + " FC")).to_numpy(),
+                            "Value" : np.round(value, 1), "fbref_name" : players["Player"].to_numpy(),
+                            "fbref_id" : players["fbref_id"].to_numpy()})
+    listing["Slug"] = (listing["Player"].str.lower().str.replace(r"[^a-z0-9]+", "-", regex = True).str.strip("-")
+                       + "-" + players["fbref_id"].to_numpy())
+    return listing.sort_values("Value", ascending = False, kind = "stable").reset_index(drop = True)
+
+
+def _value_text(value) :
+    return f"€{value * 1000:.0f}K" if value < 1 else f"€{value:.1f}M"
+
+
+# Write the pages of the listing with the file names of saved pages (Part4_1 --pages), 25 players per page
+def write_value_pages(listing, directory, per_page = 25) :
+    os.makedirs(directory, exist_ok = True)
+    n_pages = max(1, -(-len(listing) // per_page))
+    path = page_url(2).split("footballtransfers.com", 1)[-1].rsplit("/", 1)[0]
+    for number in range(1, n_pages + 1) :
+        page = listing.iloc[(number - 1) * per_page : number * per_page]
+        rows = "".join(f'<tr><td class="td-rank">{(number - 1) * per_page + k + 1}</td><td><img src="/p.png"></td>'
+                       f'<td class="td-player"><a href="/us/players/{slug}">{html.escape(name)}</a><span class="sub-text">MF</span></td>'
+                       f'<td>25</td><td><span class="td-team__teamname">{html.escape(team)}</span></td>'
+                       f'<td class="text-center">{_value_text(value)}</td></tr>'
+                       for k, (name, slug, team, value) in enumerate(page[["Player", "Slug", "Team", "Value"]].itertuples(index = False)))
+        links = "".join(f'<a href="{path}/{p}">{p}</a>' for p in sorted({2, 3, 4, n_pages}) if 1 < p <= n_pages)
+        with open(os.path.join(directory, page_filename(page_url(number))), "w", encoding = "utf-8") as f :
+            f.write(f'<html><body><table class="{TABLE_CLASS}"><thead><tr><th>#</th><th></th><th>Player</th><th>Age</th>'
+                    f'<th>Team</th><th>Value</th></tr></thead><tbody>{rows}</tbody></table>'
+                    f'<div class="pagination">{links}</div></body></html>')
+    return n_pages
+
+
+# The file Part4_1 writes (players over 900 minutes with their value), for running Part4_2 alone
+def values_table(players, listing) :
+    df = players[players["Min"].astype(int) > 900].sort_values("Player", kind = "stable")
+    value = listing.set_index("fbref_id")["Value"] # Not the name : two players can have the same name
+    out = df[["Player", "Nation", "Squad", "Pos", "Age", "Min"]].copy()
+    out["Value"] = df["fbref_id"].map(value).map(_value_text).to_numpy()
+    out["Matched_Player"] = out["Player"]
+    out["Match_Score"] = 100.0
+    return out.reset_index(drop = True)
+
+
+# Write everything for n players : pages/ (fbref), values/ (footballtransfers), results.csv, players_900mins_value.csv
+def write_dataset(n, directory, seed = 0, teams = None) :
+    players = synthetic_players(n, seed, teams)
+    write_fbref_pages(players, os.path.join(directory, "pages"))
+    listing = value_listing(players, seed)
+    n_pages = write_value_pages(listing, os.path.join(directory, "values"))
+    results_table(players).to_csv(os.path.join(directory, "results.csv"), index = False)
+    values_table(players, listing).to_csv(os.path.join(directory, "players_900mins_value.csv"), index = False)
+    return players, n_pages
+
+
+if __name__ == "__main__" :
+    parser = argparse.ArgumentParser(description = "Write synthetic fbref pages, value pages and results tables")
+    parser.add_argument("--players", type = int, default = 5000, help = "number of players")
+    parser.add_argument("--teams", type = int, help = "number of teams (the 20 Premier League teams by default)")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--out", required = True, help = "output directory")
+    args = parser.parse_args()
+
+    teams = (list(TEAMS) + [f"Team {i}" for i in range(len(TEAMS) + 1, args.teams + 1)])[: args.teams] if args.teams else None
+    players, n_pages = write_dataset(args.players, args.out, args.seed, teams)
+    print(f"{len(players)} players, 8 fbref pages and {n_pages} value pages written to {args.out}")
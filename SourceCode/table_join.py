@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+## Join the fbref statistic tables in a single pass
+# - The composite key (Player, Nation, Squad, Pos) is encoded once as integer codes for all tables
+# - Each table is reduced to the columns we keep before joining
+# - Every table is aligned on the rows of the main table and all of them are concatenated at once
+# - A key that appears twice in a table would multiply the rows of a merge, it is reported instead
+
+KEY = ["Player", "Nation", "Squad", "Pos"]
+
+
+# Encode the key of every table as one integer per row, equal keys get equal codes across tables
+def encode_keys(frames, key = KEY) :
+    keys = pd.concat([df[key] for df in frames], ignore_index = True)
+    codes = np.zeros(len(keys), dtype = np.int64)
+    for col in key :
+        col_codes, uniques = pd.factorize(keys[col]) # Missing values get -1, so they still match each other
+        codes, _ = pd.factorize(codes * (len(uniques) + 1) + col_codes + 1) # Keep the codes small
+    bounds = np.cumsum([0] + [len(df) for df in frames])
+    return [codes[start : end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+# Join the tables of data {id : DataFrame} on the main table, like a chain of left merges
+# The columns of the other tables are renamed "{id}_{column}", only the columns in columns_to_keep are joined
+# Return the joined table and the rows left out because their key is already in the same table
+def join_stat_tables(data, main_id, columns_to_keep, key = KEY) :
+    keep = set(columns_to_keep)
+
+    tables = {}
+    for id, df in data.items() :
+        if id != main_id :
+            df = df.rename(columns = lambda x : x if x in key else f"{id}_{x}")
+        cols = [col for col in df.columns if col in keep and col not in key]
+        tables[id] = df[key + cols] # Projection before the join
+
+    ids = list(tables)
+    codes = dict(zip(ids, encode_keys([tables[id] for id in ids], key)))
+
+    main = tables[main_id].reset_index(drop = True)
+    parts = [main]
+    duplicates = []
+    for id in ids :
+        if id == main_id :
+            continue
+        df = tables[id]
+        dup = pd.Series(codes[id]).duplicated(keep = "first").to_numpy()
+        if dup.any() :
+            duplicates.append(df[dup][key].assign(Table = id)) # The rows that are not joined
+            df, table_codes = df[~dup], codes[id][~dup] # Keep the first row of each key
+        else :
+            table_codes = codes[id]
+        aligned = df.drop(columns = key).set_index(table_codes).reindex(codes[main_id]) # Rows in the order of the main table
+        parts.append(aligned.reset_index(drop = True))
+
+    result = pd.concat(parts, axis = 1)
+    duplicates = pd.concat(duplicates, ignore_index = True) if duplicates else pd.DataFrame(columns = key + ["Table"])
+    return result, duplicates
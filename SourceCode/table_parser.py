@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+## Streaming extractor for the fbref statistic tables
+# The HTML is fed to lxml in chunks and only the <table id=...> we want is kept:
+# - every cell goes straight into its column list, the page is never held as a tree
+# - the header rows repeated inside the table (<tr class="thead">) are skipped while parsing
+# - fbref hides most tables inside HTML comments, a comment containing the id is parsed the same way
+# The columns are then converted once to typed arrays (int, float or text)
+# Attributes of a cell (e.g. the fbref player id in data-append-csv) can be read as extra columns
+# A cell with colspan fills the columns it spans (like pd.read_html), a body row shorter than the header
+# is padded with empty cells and the cells of a longer row past the header are dropped
+
+SKIP_ROW_CLASSES = {"thead", "over_header", "spacer", "partial_table"} # Rows that are not players
+
+
+# Give repeated column names a suffix like pandas does : Gls, Gls.1, Gls.2 ...
+def dedup_columns(names) :
+    seen = {}
+    columns = []
+    for name in names :
+        if name in seen :
+            seen[name] += 1
+            columns.append(f"{name}.{seen[name]}")
+        else :
+            seen[name] = 0
+            columns.append(name)
+    return columns
+
+
+# Convert a list of cell texts to a typed array
+def typed_array(values, thousands = ",") :
+    text = pd.Series(values, dtype = object)
+    empty = text == ""
+    numbers = pd.to_numeric(text.str.replace(thousands, "", regex = False), errors = "coerce")
+    if numbers[~empty].isna().any() : # At least one cell is not a number, keep the text
+        return text.where(~empty, np.nan).to_numpy()
+    if not empty.any() and (numbers == numbers.round()).all() :
+        return numbers.to_numpy(dtype = np.int64)
+    return numbers.to_numpy(dtype = np.float64)
+
+
+def _colspan(cell) :
+    try :
+        return max(int(cell.get("colspan") or 1), 1)
+    except ValueError :
+        return 1
+
+
+def _row_cells(tr) :
+    cells = []
+    for cell in tr :
+        if cell.tag in ("th", "td") :
+            cells += [etree.tostring(cell, method = "text", encoding = str, with_tail = False).strip()] * _colspan(cell)
+    return cells
+
+
+# Value of an attribute of the cell with the given data-stat in a row, "" when there is none
+def _row_attribute(tr, stat, attribute) :
+    for cell in tr :
+        if cell.get("data-stat") == stat :
+            return cell.get(attribute) or ""
+    return ""
+
+
+# Parse the table with the given id, return the column names, the column lists and the attribute lists, or None
+def _parse(chunks, table_id, header_row, attributes) :
+    parser = etree.HTMLPullParser(events = ("start", "end", "comment"))
+    marker = f'id="{table_id}"'
+
+    in_table = False
+    section = None # thead / tbody
+    headers = []
+    columns = None
+    extra = {name : [] for name in attributes}
+
+    for chunk in chunks :
+        parser.feed(chunk)
+        for event, element in parser.read_events() :
+            if event == "comment" :
+                text = element.text or ""
+                if not in_table and marker in text : # The table is hidden inside this comment
+                    found = _parse([text], table_id, header_row, attributes)
+                    if found is not None :
+                        return found
+                continue
+
+            tag = element.tag
+            if event == "start" :
+                if tag == "table" and element.get("id") == table_id :
+                    in_table = True
+                elif in_table and tag in ("thead", "tbody", "tfoot") :
+                    section = tag
+                continue
+
+            # event == "end"
+            if not in_table :
+                if tag != "html" :
+                    element.clear() # Free the parts of the page we do not need
+                continue
+
+            if tag == "tr" :
+                row_classes = set((element.get("class") or "").split())
+                if section == "thead" :
+                    headers.append(_row_cells(element))
+                elif not row_classes & SKIP_ROW_CLASSES :
+                    cells = _row_cells(element)
+                    if columns is None : # As many columns as the header, or as the first row without a header
+                        width = len(headers[min(header_row, len(headers) - 1)]) if headers else len(cells)
+                        columns = [[] for _ in range(width)]
+                    cells = cells[: len(columns)] + [""] * (len(columns) - len(cells))
+                    for values, cell in zip(columns, cells) :
+                        values.append(cell)
+                    for name, (stat, attribute) in attributes.items() :
+                        extra[name].append(_row_attribute(element, stat, attribute))
+                element.clear()
+            elif tag in ("thead", "tbody", "tfoot") :
+                section = None
+            elif tag == "table" :
+                names = headers[min(header_row, len(headers) - 1)] if headers else [str(i) for i in range(len(columns or []))]
+                return names, columns or [[] for _ in names], extra
+    parser.close()
+    return None
+
+
+def _chunks(html, chunk_size) :
+    for start in range(0, len(html), chunk_size) :
+        yield html[start : start + chunk_size]
+
+
+# Read the table <table id=table_id> of a page into a DataFrame
+# header_row : index of the header row to use as column names (fbref has an over-header row first)
+# attributes : {column name : (data-stat of the cell, attribute)}, added as text columns after the table columns
+def read_table(html, table_id, header_row = 1, chunk_size = 1 << 16, attributes = None) :
+    attributes = attributes or {}
+    found = _parse(_chunks(html, chunk_size), table_id, header_row, attributes)
+    if found is None :
+        return None
+    names, columns, extra = found
+    df = pd.DataFrame({name : typed_array(values) for name, values in zip(dedup_columns(names), columns)})
+    for name, values in extra.items() :
+        df[name] = pd.Series(values, dtype = object).replace("", np.nan).to_numpy()
+    return df
@@ -0,0 +1,125 @@
+import os
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+
+## Incremental team statistics of Part2 (results2.csv)
+# Every team keeps mergeable sufficient statistics for each column:
+# - count, mean and M2 (sum of squared deviations), merged with the parallel formula of Chan et al.
+#   this gives the mean and the standard deviation without going back to the players
+# - the sorted non-missing values, merged to get the median
+# The state is saved next to the data with a hash of the rows of every team, so after a partial
+# re-scrape only the teams whose rows changed are recomputed, and the "all" row is obtained by
+# merging the team states instead of scanning the players again.
+
+STATE_PATH = os.path.join("SourceCode", "team_stats.pkl")
+
+
+# Hash of the rows of every team, it does not depend on the order of the rows
+def team_hashes(df, cols, team_col = "Squad") :
+    row_hash = pd.util.hash_pandas_object(df[["Player", team_col] + list(cols)], index = False).to_numpy()
+    hashes = {}
+    for team, rows in df.groupby(team_col, sort = False).indices.items() :
+        hashes[team] = hashlib.sha1(np.sort(row_hash[rows]).tobytes()).hexdigest()
+    return hashes
+
+
+# Sufficient statistics of the given teams, computed in one grouped pass
+# (pandas' compensated sums, so the team rows are the same as groupby(...).agg(["median", "mean", "std"]))
+def team_states(df, cols, teams, team_col = "Squad") :
+    sub = df[df[team_col].isin(teams)]
+    agg = sub.groupby(team_col)[cols].agg(["count", "mean", "std"])
+    groups = sub.groupby(team_col).indices
+    X = sub[cols].to_numpy(dtype = float)
+
+    states = {}
+    for team in teams :
+        count = agg.loc[team, (slice(None), "count")].to_numpy(dtype = np.int64)
+        mean = agg.loc[team, (slice(None), "mean")].to_numpy(dtype = float)
+        std = agg.loc[team, (slice(None), "std")].to_numpy(dtype = float)
+        m2 = np.where(count > 1, np.nan_to_num(std) ** 2 * (count - 1), 0.0)
+        rows = X[groups[team]]
+        values = [np.sort(v[~np.isnan(v)]) for v in rows.T]
+        states[team] = {"count" : count, "mean" : mean, "m2" : m2, "values" : values}
+    return states
+
+
+# Merge the states of several groups
+def merge_states(states) :
+    count = np.zeros_like(states[0]["count"])
+    mean = np.zeros_like(states[0]["mean"])
+    m2 = np.zeros_like(states[0]["m2"])
+    for s in states :
+        n = count + s["count"]
+        with np.errstate(invalid = "ignore", divide = "ignore") :
+            delta = np.nan_to_num(s["mean"]) - mean
+            share = np.where(n > 0, s["count"] / n, 0)
+        mean = mean + delta * share
+        m2 = m2 + s["m2"] + delta ** 2 * count * share
+        count = n
+    mean = np.where(count > 0, mean, np.nan)
+    values = [np.sort(np.concatenate([s["values"][j] for s in states])) for j in range(len(count))]
+    return {"count" : count, "mean" : mean, "m2" : m2, "values" : values}
+
+
+# Median, mean and standard deviation (ddof = 1, like pandas) of a state
+def describe(state) :
+    count = state["count"]
+    median = np.array([np.median(v) if len(v) else np.nan for v in state["values"]])
+    with np.errstate(invalid = "ignore", divide = "ignore") :
+        std = np.where(count > 1, np.sqrt(state["m2"] / (count - 1)), np.nan)
+    return median, state["mean"], std
+
+
+# Update the saved team states with the current data, only the changed teams are recomputed
+# Return the state and the list of recomputed teams
+def update_team_stats(df, cols, path = STATE_PATH, team_col = "Squad") :
+    cols = list(cols)
+    state = None
+    if os.path.exists(path) :
+        with open(path, "rb") as f :
+            state = pickle.load(f)
+    if state is None or state["columns"] != cols : # New columns, everything is recomputed
+        state = {"columns" : cols, "teams" : {}}
+
+    hashes = team_hashes(df, cols, team_col)
+    changed = [team for team in hashes if state["teams"].get(team, {}).get("hash") != hashes[team]]
+    if changed :
+        for team, team_state in team_states(df, cols, changed, team_col).items() :
+            state["teams"][team] = dict(team_state, hash = hashes[team])
+    for team in set(state["teams"]) - set(hashes) : # Teams that are no longer in the data
+        del state["teams"][team]
+
+    if changed :
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f :
+            pickle.dump(state, f)
+        os.replace(tmp_path, path)
+    return state, changed
+
+
+# Table of results2.csv : the "all" row then one row per team (sorted by name)
+# with the columns "Median of x", "Mean of x", "Std of x" for every statistic
+def aggregate_table(state, team_col = "Squad", decimals = 2) :
+    cols = state["columns"]
+    teams = sorted(state["teams"])
+    rows = [("all", merge_states([state["teams"][team] for team in teams]))]
+    rows += [(team, state["teams"][team]) for team in teams]
+
+    names = [f"{stat} of {col}" for col in cols for stat in ("Median", "Mean", "Std")]
+    data = np.empty((len(rows), len(names)))
+    for i, (_, s) in enumerate(rows) :
+        data[i] = np.stack(describe(s), axis = 1).ravel() # median, mean, std of each column
+    table = pd.DataFrame(data, columns = names).round(decimals)
+    table.insert(0, team_col, [name for name, _ in rows])
+    return table
+
+
+# Team with the highest mean of every statistic, from the team rows of the aggregate table
+def best_team_per_stat(table, cols, team_col = "Squad") :
+    teams = table[table[team_col] != "all"]
+    means = teams[[f"Mean of {col}" for col in cols]].to_numpy()
+    best = np.nanargmax(means, axis = 0) # First team in case of a tie, like idxmax
+    return pd.DataFrame({"Statistic" : list(cols), "Team" : teams[team_col].to_numpy()[best],
+                         "Value" : means[best, np.arange(len(cols))]})
@@ -0,0 +1,44 @@
+import pytest
+from fetcher import Fetcher, FetchError, Response
+
+## Tests of the fallback transport of the Fetcher
+# Run : python -m pytest SourceCode
+
+
+class StatusTransport :
+    remote = False
+
+    def __init__(self, status, text = "") :
+        self.status = status
+        self.text = text
+        self.calls = 0
+
+    def get(self, url, headers = None) :
+        self.calls += 1
+        return Response(self.status, self.text, {})
+
+    def close(self) :
+        pass
+
+
+def fetcher(status, fallback) :
+    return Fetcher(StatusTransport(status), fallback, retries = 1, backoff = 0)
+
+
+def test_forbidden_page_goes_to_the_fallback() :
+    fallback = StatusTransport(200, "<html>browser</html>")
+    assert fetcher(403, fallback).fetch("https://fbref.com/en/comps/9/stats") == "<html>browser</html>"
+    assert fallback.calls == 1
+
+
+def test_server_errors_go_to_the_fallback_after_the_retries() :
+    fallback = StatusTransport(200, "ok")
+    assert fetcher(503, fallback).fetch("https://fbref.com/en/comps/9/stats") == "ok"
+
+
+@pytest.mark.parametrize("status", [404, 410])
+def test_missing_page_skips_the_fallback(status) :
+    fallback = StatusTransport(200, "ok")
+    with pytest.raises(FetchError) as error :
+        fetcher(status, fallback).fetch("https://www.footballtransfers.com/en/values/players/most-valuable-players/99")
+    assert error.value.status == status and fallback.calls == 0
@@ -0,0 +1,26 @@
+import os
+import sys
+import subprocess
+import pandas as pd
+from synthetic import write_dataset
+from results_store import write_results
+
+## Part4_1 on synthetic pages : the second run joins the players matched by the first one on their id
+# and must write the same table
+# Run : python -m pytest SourceCode
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Part4_1.py")
+
+
+def test_two_runs_give_the_same_output(tmp_path) :
+    write_dataset(600, tmp_path / "data", seed = 0) # Has names claimed by two players
+    os.makedirs(tmp_path / "SourceCode")
+    results = pd.read_csv(tmp_path / "data" / "results.csv", dtype = str, keep_default_na = False)
+    write_results(results, str(tmp_path / "SourceCode" / "results.parquet"))
+
+    outputs = []
+    for _ in range(2) :
+        subprocess.run([sys.executable, SCRIPT, "--pages", str(tmp_path / "data" / "values"), "--no-cache"],
+                       cwd = tmp_path, check = True, capture_output = True)
+        outputs.append((tmp_path / "SourceCode" / "players_900mins_value.csv").read_text(encoding = "utf-8"))
+    assert outputs[0] == outputs[1]
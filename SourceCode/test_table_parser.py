@@ -0,0 +1,35 @@
+import numpy as np
+from table_parser import read_table
+
+## Tests of the streaming table parser on rows whose width differs from the header
+# Run : python -m pytest SourceCode
+
+HEADER = '<thead><tr><th colspan="3">Over</th></tr><tr><th>Player</th><th>Gls</th><th>Ast</th></tr></thead>'
+
+
+def table(body) :
+    return f'<html><body><table id="stats">{HEADER}<tbody>{body}</tbody></table></body></html>'
+
+
+def test_colspan_and_short_rows_are_padded() :
+    html = table('<tr><td>Saka</td><td>1,234</td><td>3</td></tr>'
+                 '<tr><td colspan="2">Total</td></tr>'
+                 '<tr><td>Rice</td></tr>')
+    df = read_table(html, "stats")
+    assert list(df.columns) == ["Player", "Gls", "Ast"]
+    assert list(df["Player"]) == ["Saka", "Total", "Rice"]
+    assert df["Gls"].tolist()[0] == "1,234" and df["Gls"].tolist()[1] == "Total" # A text cell keeps the column as text
+    assert df["Ast"].iloc[0] == 3 and np.isnan(df["Ast"].iloc[1]) and np.isnan(df["Ast"].iloc[2])
+
+
+def test_cells_past_the_header_are_dropped() :
+    html = table('<tr><td>Saka</td><td>5</td><td>3</td><td>extra</td></tr><tr><td>Rice</td><td>2</td><td>7</td></tr>')
+    df = read_table(html, "stats")
+    assert list(df.columns) == ["Player", "Gls", "Ast"]
+    assert df["Ast"].tolist() == [3, 7]
+
+
+def test_short_first_row_uses_the_header_width() :
+    df = read_table(table('<tr><td>Saka</td></tr><tr><td>Rice</td><td>2</td><td>7</td></tr>'), "stats")
+    assert df.shape == (2, 3)
+    assert df["Gls"].iloc[1] == 2 and np.isnan(df["Gls"].iloc[0])
@@ -0,0 +1,53 @@
+import re
+from bs4 import BeautifulSoup
+
+## Pages of the footballtransfers listing of the most valuable Premier League players
+# The listing is sorted by value, 25 players per page: page 1 is the base url, page n is "{url}/{n}"
+# - parse_value_page reads the players of one page (empty list past the last page)
+# - last_page_number reads the number of the last page from the pagination links, when the page has them
+
+VALUE_URL = "https://www.footballtransfers.com/us/values/players/most-valuable-soccer-players/playing-in-uk-premier-league"
+
+TABLE_CLASS = "table table-hover no-cursor table-striped leaguetable mvp-table mb-0"
+
+UNITS = {"K" : 1e-3, "M" : 1.0, "B" : 1e3} # Values are in millions of euros
+
+
+def page_url(number, url = VALUE_URL) :
+    return url if number == 1 else f"{url}/{number}"
+
+
+# Convert a value like "€12.5M" or "€800K" to millions of euros, None when it is not a value
+def parse_value(text) :
+    found = re.search(r"([\d.,]+)\s*([KMB]?)", text.replace(",", ""))
+    if found is None :
+        return None
+    return float(found.group(1)) * UNITS.get(found.group(2), 1.0)
+
+
+# Number of the last page from the links to the other pages of the listing, None if there is no link
+def last_page_number(html, url = VALUE_URL) :
+    path = re.escape(url.split("footballtransfers.com", 1)[-1])
+    numbers = [int(n) for n in re.findall(path + r"/(\d+)\b", html)]
+    return max(numbers) if numbers else None
+
+
+# Players of one page : name, slug (/us/players/<slug>, it identifies the player), team and value
+def parse_value_page(html) :
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table", class_ = TABLE_CLASS) # Find the table using its class
+    players = []
+    if table is None :
+        return players
+
+    for row in table.find_all("tr") :
+        cols = row.find_all("td")
+        if not cols :
+            continue
+        link = cols[2].find("a") # The player's name is in the <a> tag
+        name = link.text.strip()
+        slug = link.get("href", "").rstrip("/").split("/")[-1] or name
+        team = cols[4].find("span", class_ = "td-team__teamname") # The <span> tag contains the team name
+        players.append({"Player" : name, "Slug" : slug, "Team" : team.text.strip() if team else "Unknown",
+                        "Value" : cols[-1].text.strip()})
+    return players
@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import numpy as np
+
+## Saved valuation model of Part4_2
+# Part4_2 fits the scaler and the linear regression once and saves them as a JSON artifact:
+# the features in order, the values used for missing features (training means), the scaler mean and scale,
+# the coefficients, the intercept and the test metrics.
+# ValuationModel loads it without the training data, sklearn or any plotting library:
+# - the scaler is folded into the coefficients, a prediction is one weighted sum
+# - predict_one prices one player (dict of statistics) in pure Python
+# - predict_frame prices a whole table with one matrix product
+
+MODEL_PATH = os.path.join("SourceCode", "valuation_model.json")
+FORMAT_VERSION = 1
+
+
+# Save a fitted StandardScaler + linear model as an artifact
+def save_model(features, fill_values, scaler, model, metrics = None, path = MODEL_PATH) :
+    artifact = {
+        "format_version" : FORMAT_VERSION,
+        "created" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "target" : "Value", # Millions of euros
+        "features" : list(features),
+        "fill_values" : [float(fill_values[f]) for f in features],
+        "scaler_mean" : [float(v) for v in scaler.mean_],
+        "scaler_scale" : [float(v) for v in scaler.scale_],
+        "coefficients" : [float(v) for v in np.ravel(model.coef_)],
+        "intercept" : float(model.intercept_),
+        "metrics" : {name : float(value) for name, value in (metrics or {}).items()},
+        }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding = "utf-8") as f :
+        json.dump(artifact, f, indent = 1)
+    os.replace(tmp_path, path)
+    return artifact
+
+
+class ValuationModel :
+
+    def __init__(self, artifact) :
+        if artifact.get("format_version") != FORMAT_VERSION :
+            raise ValueError(f"Unsupported valuation model format {artifact.get('format_version')}")
+        self.artifact = artifact
+        self.features = artifact["features"]
+        self.fill_values = artifact["fill_values"]
+        # (x - mean) / scale * coef + intercept = x * weight + bias
+        self.weights = [c / s for c, s in zip(artifact["coefficients"], artifact["scaler_scale"])]
+        self.bias = artifact["intercept"] - sum(w * m for w, m in zip(self.weights, artifact["scaler_mean"]))
+        self._weights = np.array(self.weights)
+        self._fill = np.array(self.fill_values)
+
+    @classmethod
+    def load(cls, path = MODEL_PATH) :
+        with open(path, encoding = "utf-8") as f :
+            return cls(json.load(f))
+
+    @property
+    def metrics(self) :
+        return self.artifact["metrics"]
+
+    # Value of one player, stats is a dict {feature : value}, a missing (or NaN) feature gets its training mean
+    def predict_one(self, stats) :
+        value = self.bias
+        for feature, weight, fill in zip(self.features, self.weights, self.fill_values) :
+            x = stats.get(feature)
+            value += weight * (fill if x is None or x != x else x)
+        return value
+
+    # Values of all the rows of a DataFrame that has the feature columns
+    def predict_frame(self, df) :
+        X = df[self.features].to_numpy(dtype = float)
+        X = np.where(np.isnan(X), self._fill, X)
+        return X @ self._weights + self.bias
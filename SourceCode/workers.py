@@ -0,0 +1,31 @@
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+## Worker pools shared by the analysis scripts
+# The Part scripts run their code at module level, so a "spawn" worker would run the
+# whole script again when it imports __main__. The workers are forked instead when the
+# platform allows it, otherwise threads are used.
+
+
+def default_workers() :
+    return os.cpu_count() or 1
+
+
+def process_pool(max_workers = None) :
+    max_workers = max_workers or default_workers()
+    if "fork" in mp.get_all_start_methods() :
+        return ProcessPoolExecutor(max_workers = max_workers, mp_context = mp.get_context("fork"))
+    return ThreadPoolExecutor(max_workers = max_workers)
+
+
+# Split a list into n chunks of nearly equal size
+def split_chunks(items, n) :
+    n = max(1, min(n, len(items)))
+    size, extra = divmod(len(items), n)
+    chunks, start = [], 0
+    for i in range(n) :
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start : end])
+        start = end
+    return chunks